@@ -0,0 +1,253 @@
+import math
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageSequence
+
+from buffer_pool import BufferPool
+from encoder import normalize_format
+from filters import FilterPipeline
+from metrics import count, span
+from render_engine import get_spec_filters, get_spec_layers, make_text_sprite, draw_sprite
+
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
+ANIMATED_OUTPUTS = (".gif", ".mp4")
+DEFAULT_FRAME_MS = 100
+# найкоротший крок кадру MP4 (50 кадрів/с); коротші кадри GIF/WebP об'єднуються
+MIN_VIDEO_FRAME_MS = 20
+# скільки кадрів на потік може бути в польоті: декодовані, у рендерингу чи в черзі на запис
+FRAMES_PER_WORKER = 2
+
+GIF_LOOP_EXTENSION = b"!\xff\x0bNETSCAPE2.0\x03\x01"
+
+
+def is_video(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def is_animation(path: str) -> bool:
+    # GIF, APNG чи WebP з кількома кадрами, або коротке відео
+    if is_video(path):
+        return True
+    try:
+        with Image.open(path) as image:
+            return getattr(image, "n_frames", 1) > 1
+    except (OSError, ValueError):
+        return False
+
+
+def iter_frames(path: str) -> Iterator[Tuple[np.ndarray, int]]:
+    # (кадр BGR, тривалість у мс); кадри декодуються по одному, коли їх просять
+    if is_video(path):
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"не вдалося відкрити відео: {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        duration = int(round(1000 / fps)) if fps > 0 else DEFAULT_FRAME_MS
+        try:
+            while True:
+                success, frame = capture.read()
+                if not success:
+                    break
+                yield frame, duration
+        finally:
+            capture.release()
+        return
+
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            # WebP оновлює info["duration"] лише після декодування кадру
+            rgb = np.asarray(frame.convert("RGB"))
+            duration = int(frame.info.get("duration") or DEFAULT_FRAME_MS)
+            yield cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), duration
+
+
+def read_first_frame(path: str) -> Optional[np.ndarray]:
+    try:
+        for frame, _ in iter_frames(path):
+            return frame
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def get_loop_count(path: str) -> Optional[int]:
+    # None — джерело без розширення NETSCAPE, тобто програється один раз
+    if is_video(path):
+        return 0
+    with Image.open(path) as image:
+        loop = image.info.get("loop")
+    return None if loop is None else int(loop)
+
+
+def get_frame_durations(path: str) -> List[int]:
+    # ті самі тривалості GIF/WebP, що й у iter_frames, але без перетворення кадрів
+    durations = []
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            frame.load()
+            durations.append(int(frame.info.get("duration") or DEFAULT_FRAME_MS))
+    return durations
+
+
+def get_video_frame_ms(durations: List[int]) -> int:
+    # спільний дільник тривалостей: кожен кадр стає цілим числом кадрів відео
+    return max(math.gcd(*durations), MIN_VIDEO_FRAME_MS) if durations else DEFAULT_FRAME_MS
+
+
+class FrameRenderer:
+    # той самий конвеєр, що й render(), але спрайти підписів будуються один раз
+    # на всю анімацію, а далі лише накладаються на кожен кадр
+    def __init__(self, spec: Dict, size: Optional[Tuple[int, int]] = None):
+        self.pipeline = FilterPipeline(get_spec_filters(spec))
+        # проміжні буфери фільтрів спільні для всіх кадрів
+        self.pool = BufferPool()
+        self.layers = get_spec_layers(spec, size)
+        self.sprites = [make_text_sprite(layer["text"], layer["font"], layer["font_size"], layer["color"],
+                                         layer["outline_width"], layer["outline_color"], layer["shadow"])
+                        for layer in self.layers]
+
+    def render(self, frame: np.ndarray) -> np.ndarray:
+        # кадр належить конвеєру, тож фільтри й текст пишуть просто в нього
+        image = self.pipeline.apply(frame, frame, self.pool) if self.pipeline.steps else frame
+        for layer, sprite in zip(self.layers, self.sprites):
+            draw_sprite(image, sprite, layer["position"], layer["margin"])
+        return image
+
+
+class GifWriter:
+    # кожен кадр квантується й стискається LZW окремо з власною палітрою,
+    # тож у файл він дописується одразу, без збирання всіх кадрів, як у Image.save
+    def __init__(self, target: Union[str, BinaryIO], loop: Optional[int] = 0):
+        self.stream = open(target, "wb") if isinstance(target, str) else target
+        self.owns_stream = isinstance(target, str)
+        self.loop = loop
+        self.size = None
+
+    def prepare(self, image: np.ndarray, duration: int) -> bytes:
+        # викликається з потоків рендерингу
+        frame = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        frame = frame.quantize(256, method=Image.Quantize.FASTOCTREE)
+        return b"".join(GifImagePlugin.getdata(frame, duration=max(duration, 10), include_color_table=True))
+
+    def write(self, data: bytes, size: Tuple[int, int], duration: int) -> None:
+        if self.size is None:
+            self.size = size
+            self.stream.write(b"GIF89a" + struct.pack("<HHBBB", size[0], size[1], 0, 0, 0))
+            # без розширення GIF програється один раз, як і джерело без нього
+            if self.loop is not None:
+                self.stream.write(GIF_LOOP_EXTENSION + struct.pack("<H", self.loop) + b"\x00")
+        self.stream.write(data)
+
+    def close(self) -> None:
+        if self.size is not None:
+            self.stream.write(b";")
+        if self.owns_stream:
+            self.stream.close()
+
+
+class Mp4Writer:
+    # VideoWriter сам кодує кадри по мірі надходження. Частота стала: frame_ms — спільний
+    # крок усіх тривалостей джерела, і кадр повторюється стільки разів, скільки кроків триває.
+    # Повтори рахуються від накопиченого часу, тож округлення не зсуває решту анімації
+    def __init__(self, target: str, fourcc: str = "mp4v", frame_ms: Optional[int] = None):
+        self.path = target
+        self.fourcc = fourcc
+        self.frame_ms = frame_ms
+        self.writer = None
+        self.elapsed_ms = 0
+        self.written = 0
+
+    def prepare(self, image: np.ndarray, duration: int) -> np.ndarray:
+        return image
+
+    def write(self, image: np.ndarray, size: Tuple[int, int], duration: int) -> None:
+        if self.writer is None:
+            # без frame_ms частота береться з першого кадру, як для відео зі сталою частотою
+            self.frame_ms = self.frame_ms or max(duration, 1)
+            fps = 1000 / self.frame_ms
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), fps, size)
+            if not self.writer.isOpened():
+                raise ValueError(f"не вдалося відкрити відео для запису: {self.path}")
+
+        self.elapsed_ms += duration
+        repeats = int(round(self.elapsed_ms / self.frame_ms)) - self.written
+        if self.written == 0:
+            repeats = max(repeats, 1)
+        for _ in range(repeats):
+            self.writer.write(image)
+        self.written += repeats
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.release()
+
+
+def create_writer(output: Union[str, BinaryIO], image_format: Optional[str] = None,
+                  loop: Optional[int] = 0, frame_ms: Optional[int] = None):
+    if image_format is None:
+        image_format = os.path.splitext(output)[1] if isinstance(output, str) else ".gif"
+    image_format = normalize_format(image_format)
+    if image_format == ".gif":
+        return GifWriter(output, loop)
+    if image_format == ".mp4" and isinstance(output, str):
+        return Mp4Writer(output, frame_ms=frame_ms)
+    raise ValueError(f"непідтримуваний формат анімації: {image_format}")
+
+
+def render_animation(source_path: str, output: Union[str, BinaryIO], spec: Dict,
+                     image_format: Optional[str] = None, workers: Optional[int] = None,
+                     window: Optional[int] = None) -> Dict[str, float]:
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * FRAMES_PER_WORKER
+
+    renderer = None
+    frame_ms = None
+    if image_format is None and isinstance(output, str):
+        image_format = os.path.splitext(output)[1]
+    if image_format and normalize_format(image_format) == ".mp4" and not is_video(source_path):
+        # затримки кадрів GIF/WebP різні, а частота MP4 одна на весь файл
+        frame_ms = get_video_frame_ms(get_frame_durations(source_path))
+    writer = create_writer(output, image_format, get_loop_count(source_path), frame_ms)
+
+    def process(frame: np.ndarray, duration: int) -> Tuple[object, Tuple[int, int], int]:
+        with span("animation.frame"):
+            image = renderer.render(frame)
+            return writer.prepare(image, duration), (image.shape[1], image.shape[0]), duration
+
+    start = time.perf_counter()
+    frames = 0
+    # у польоті не більше window кадрів, а записуються вони в порядку надходження
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frames") as executor:
+            for frame, duration in iter_frames(source_path):
+                if renderer is None:
+                    # підписи з "fit" підбираються під розмір кадру, тож спрайти будуються за першим
+                    renderer = FrameRenderer(spec, (frame.shape[1], frame.shape[0]))
+                if len(pending) >= window:
+                    writer.write(*pending.popleft().result())
+                    frames += 1
+                pending.append(executor.submit(process, frame, duration))
+
+            while pending:
+                writer.write(*pending.popleft().result())
+                frames += 1
+    finally:
+        for future in pending:
+            future.cancel()
+        writer.close()
+
+    if frames == 0:
+        raise ValueError(f"не вдалося прочитати жодного кадру: {source_path}")
+
+    elapsed = time.perf_counter() - start
+    count("animation.frames", frames)
+    return {"frames": frames, "seconds": elapsed, "fps": frames / elapsed if elapsed else 0.0}
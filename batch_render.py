@@ -0,0 +1,246 @@
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, ALL_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from animation import ANIMATED_OUTPUTS, is_animation
+from encoder import get_encode_options
+from image_processor import ImageProcessor
+from meme_generator import MemeGenerator
+from render_cache import DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES, get_render_cache
+from utils import DEFAULT_FONTS, parse_color, parse_position, get_file_extension
+
+
+LIST_SEPARATOR = "|"
+DEFAULT_FONT_SIZE = 36
+JOBS_PER_WORKER = 4
+
+_meme_generator = None
+_cache_config = None
+
+
+def _get_meme_generator() -> MemeGenerator:
+    global _meme_generator
+
+    if _meme_generator is None:
+        render_cache = get_render_cache(*_cache_config) if _cache_config else None
+        _meme_generator = MemeGenerator(ImageProcessor(), render_cache)
+    return _meme_generator
+
+
+def _init_worker(cache_dir: Optional[str] = None, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+    global _cache_config
+
+    # Ctrl+C обробляє лише головний процес, щоб пул не зламався посеред задачі
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # stdout воркерів належить потоку результатів, діагностика йде в stderr
+    sys.stdout = sys.stderr
+    # усі воркери ділять один каталог кешу: записи в нього атомарні
+    _cache_config = (cache_dir, cache_max_bytes) if cache_dir else None
+    _get_meme_generator()
+
+
+def _split_list(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return value.split(LIST_SEPARATOR)
+
+
+def read_jobs(jobs_path: str) -> Iterator[Tuple[int, Dict]]:
+    with open(jobs_path, newline="", encoding="utf-8") as jobs_file:
+        if get_file_extension(jobs_path) == ".csv":
+            for index, row in enumerate(csv.DictReader(jobs_file)):
+                job = {key: value for key, value in row.items() if value not in (None, "")}
+                job["texts"] = _split_list(job.get("texts"))
+                if "positions" in job:
+                    job["positions"] = _split_list(job["positions"])
+                if "color" in job and job["color"].startswith("["):
+                    job["color"] = json.loads(job["color"])
+                if "fit" in job:
+                    job["fit"] = job["fit"].lower() in ("1", "true", "yes")
+                yield index, job
+            return
+
+        index = 0
+        for line in jobs_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                job = {"_error": f"некоректний JSON: {e}"}
+            yield index, job
+            index += 1
+
+
+def render_job(job: Dict) -> Dict:
+    meme_generator = _get_meme_generator()
+    start = time.perf_counter()
+
+    if "_error" in job:
+        raise ValueError(job["_error"])
+
+    output_path = job.get("output")
+    if not output_path:
+        raise ValueError("не вказано шлях output")
+
+    texts = job.get("texts") or []
+    font_name = job.get("font", DEFAULT_FONTS[0])
+    font_size = int(job.get("font_size", DEFAULT_FONT_SIZE))
+    color = parse_color(job.get("color", (255, 255, 255)))
+    filter_name = job.get("filter") or None
+    fit = bool(job.get("fit", False))
+
+    if job.get("template"):
+        success = meme_generator.auto_generate_meme(
+            job["template"], texts or None, font_name, font_size, color, filter_name, fit
+        )
+    elif job.get("image") and is_animation(job["image"]) and get_file_extension(output_path) in ANIMATED_OUTPUTS:
+        positions = [parse_position(p) for p in job["positions"]] if job.get("positions") else None
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        # паралельність тут уже між процесами, тож кадри рендеряться в один потік
+        if not meme_generator.generate_animated_meme(job["image"], output_path, texts, positions,
+                                                     font_name, font_size, color, filter_name, workers=1,
+                                                     fit=fit):
+            raise RuntimeError(f"не вдалося згенерувати анімацію {output_path}")
+        return {"output": output_path, "ms": round((time.perf_counter() - start) * 1000, 2)}
+    elif job.get("image"):
+        positions = [parse_position(p) for p in job["positions"]] if job.get("positions") else None
+        success = meme_generator.generate_meme(
+            job["image"], texts, positions, font_name, font_size, color, filter_name, fit
+        )
+    else:
+        raise ValueError("потрібно вказати template або image")
+
+    if not success:
+        raise RuntimeError("не вдалося згенерувати мем")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if not meme_generator.save_meme(output_path, **get_encode_options(job)):
+        raise RuntimeError(f"не вдалося зберегти {output_path}")
+    if meme_generator.last_cache_hit:
+        return {"output": output_path, "ms": round((time.perf_counter() - start) * 1000, 2), "cached": True}
+
+    return {"output": output_path, "ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+def load_state(state_path: str) -> Set[int]:
+    done = set()
+
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as state_file:
+            for line in state_file:
+                line = line.strip()
+                if line.isdigit():
+                    done.add(int(line))
+
+    return done
+
+
+class BatchRenderer:
+    def __init__(self, workers: Optional[int] = None, window: Optional[int] = None, out=None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.workers = workers or os.cpu_count() or 1
+        self.window = window or self.workers * JOBS_PER_WORKER
+        self.out = out or sys.stdout
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _emit(self, record: Dict) -> None:
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+    def _collect(self, pending: Dict, state_file, return_when: str) -> None:
+        done, _ = wait(pending, return_when=return_when)
+
+        for future in done:
+            index, job = pending.pop(future)
+            record = {"index": index}
+            if "id" in job:
+                record["id"] = job["id"]
+
+            try:
+                record.update(future.result())
+                record["status"] = "ok"
+                self.succeeded += 1
+                state_file.write(f"{index}\n")
+            except Exception as e:
+                record["status"] = "error"
+                record["error"] = str(e)
+                self.failed += 1
+
+            self._emit(record)
+
+        state_file.flush()
+
+    def run(self, jobs_path: str, state_path: str) -> int:
+        done = load_state(state_path)
+
+        with open(state_path, "a", encoding="utf-8") as state_file, \
+                ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                    initargs=(self.cache_dir, self.cache_max_bytes)) as pool:
+            pending = {}
+
+            try:
+                # у польоті не більше window задач, тож пам'ять не залежить від довжини файлу
+                for index, job in read_jobs(jobs_path):
+                    if index in done:
+                        self.skipped += 1
+                        continue
+
+                    pending[pool.submit(render_job, job)] = (index, job)
+                    if len(pending) >= self.window:
+                        self._collect(pending, state_file, FIRST_COMPLETED)
+
+                while pending:
+                    self._collect(pending, state_file, ALL_COMPLETED)
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                print(f"перервано; продовжити можна повторним запуском зі станом {state_path}",
+                      file=sys.stderr)
+                return 130
+
+        print(f"готово: {self.succeeded} успішно, {self.failed} з помилками, "
+              f"{self.skipped} пропущено", file=sys.stderr)
+        return 1 if self.failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетна генерація мемів з JSONL або CSV файлу задач")
+    parser.add_argument("jobs", help="файл задач (.jsonl або .csv)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="кількість процесів (типово кількість ядер)")
+    parser.add_argument("--window", type=int, default=None,
+                        help="максимум задач у польоті (типово workers * 4)")
+    parser.add_argument("--state", default=None,
+                        help="файл стану для продовження (типово <jobs>.done)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="каталог кешу рендерів; однакові задачі копіюють готовий файл")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        help="найбільший розмір кешу рендерів у МБ")
+    args = parser.parse_args(argv)
+
+    state_path = args.state or args.jobs + ".done"
+    renderer = BatchRenderer(args.workers, args.window, cache_dir=args.cache_dir,
+                             cache_max_bytes=args.cache_max_mb * 1024 * 1024)
+    return renderer.run(args.jobs, state_path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
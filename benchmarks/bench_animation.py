@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from common import best_of
+from animation import iter_frames, render_animation
+from render_engine import render
+
+
+FRAME_SIZES = [(480, 360), (1280, 720)]
+FRAME_COUNT = 60
+FRAME_MS = 40
+WORKERS = [1, 2, 4]
+SPEC = {"texts": ["Коли реліз у п'ятницю", "і все працює"], "font_size": 48, "filters": ["Сепія"]}
+
+
+def make_clip(path: str, width: int, height: int) -> None:
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 1000 / FRAME_MS, (width, height))
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    for index in range(FRAME_COUNT):
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[:] = gradient[None, :, None]
+        cv2.circle(frame, (index * width // FRAME_COUNT, height // 2), height // 6, (0, 200, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+# як було б без потокового конвеєра: усі кадри в пам'яті, render() з новими спрайтами на кожен кадр
+# і Image.save, який теж збирає всі кадри перед записом
+def legacy_render_gif(source_path: str, output_path: str) -> None:
+    frames = [render(dict(SPEC, image_array=frame)) for frame, _ in iter_frames(source_path)]
+    images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+    images[0].save(output_path, save_all=True, append_images=images[1:], duration=FRAME_MS, loop=0)
+
+
+def main():
+    print(f"{'size':>9} {'output':<6} {'workers':>7} {'fps':>8} {'legacy fps':>11} {'KB':>8}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for width, height in FRAME_SIZES:
+            source_path = os.path.join(temp_dir, f"clip_{width}x{height}.mp4")
+            make_clip(source_path, width, height)
+
+            legacy_path = os.path.join(temp_dir, "legacy.gif")
+            legacy_fps = FRAME_COUNT / best_of(lambda: legacy_render_gif(source_path, legacy_path), 1)
+
+            for output_format in (".gif", ".mp4"):
+                output_path = os.path.join(temp_dir, "out" + output_format)
+                for workers in WORKERS:
+                    stats = render_animation(source_path, output_path, SPEC, workers=workers)
+                    legacy = f"{legacy_fps:>11.1f}" if output_format == ".gif" else f"{'':>11}"
+                    print(f"{width}x{height:<4} {output_format:<6} {workers:>7} {stats['fps']:>8.1f} {legacy} "
+                          f"{os.path.getsize(output_path) / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
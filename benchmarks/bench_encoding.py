@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from common import make_photo, best_of
+from encoder import encode_buffer
+from render_engine import draw_layers, get_spec_layers
+
+
+IMAGE_SIZES_MP = [1, 8]
+# PNG 9 і WebP без втрат на 8 MP кодуються секундами
+REPEATS = 2
+SIZE_TARGET = 500 * 1024
+
+ENCODINGS = [
+    (".jpg", {}),
+    (".jpg", {"quality": 85}),
+    (".jpg", {"quality": 85, "optimize": True}),
+    (".jpg", {"quality": 85, "progressive": True, "optimize": True}),
+    (".jpg", {"max_bytes": SIZE_TARGET}),
+    (".png", {}),
+    (".png", {"compression": 1}),
+    (".png", {"compression": 9}),
+    (".webp", {"quality": 80}),
+    (".webp", {"max_bytes": SIZE_TARGET}),
+    (".webp", {"lossless": True}),
+]
+
+
+def make_captioned_photo(megapixels: float) -> np.ndarray:
+    image = make_photo(megapixels)
+    draw_layers(image, get_spec_layers({"texts": ["Коли код нарешті працює", "з першого разу"],
+                                        "font_size": image.shape[0] // 12}))
+    return image
+
+
+# як сервіси зберігали байти до encode_buffer: imwrite у тимчасовий файл і читання назад
+def legacy_temp_file(image: np.ndarray, image_format: str) -> bytes:
+    fd, path = tempfile.mkstemp(suffix=image_format)
+    os.close(fd)
+    try:
+        cv2.imwrite(path, image)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def describe(options: dict) -> str:
+    return ", ".join(f"{key}={value}" for key, value in options.items()) or "типово"
+
+
+def main():
+    print(f"{'MP':>4} {'format':<6} {'options':<42} {'encode ms':>10} {'KB':>9}")
+
+    for megapixels in IMAGE_SIZES_MP:
+        image = make_captioned_photo(megapixels)
+
+        for image_format, options in ENCODINGS:
+            size = encode_buffer(image, image_format, **options).nbytes
+            encode_time = best_of(lambda: encode_buffer(image, image_format, **options), REPEATS)
+            print(f"{megapixels:>4} {image_format:<6} {describe(options):<42} "
+                  f"{encode_time * 1000:>10.2f} {size / 1024:>9.1f}")
+
+        legacy_time = best_of(lambda: legacy_temp_file(image, ".jpg"), REPEATS)
+        memory_time = best_of(lambda: encode_buffer(image, ".jpg"), REPEATS)
+        print(f"{megapixels:>4} {'.jpg':<6} {'тимчасовий файл → bytes':<42} {legacy_time * 1000:>10.2f} "
+              f"{'':>9} ({legacy_time / memory_time:.2f}x від encode_buffer)")
+
+
+if __name__ == "__main__":
+    main()
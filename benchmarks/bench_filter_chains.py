@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+from common import make_image, best_of
+from filters import FilterPipeline
+
+
+IMAGE_SIZES_MP = [2, 12]
+
+FILTER_CHAINS = [
+    ["Чорно-білий", "Сепія", "Негатив"],
+    ["Сепія", "Негатив"],
+    ["Сепія", "Віньєтка", "Різкість"],
+    ["Вінтаж"],
+]
+
+
+# "Вінтаж" у float32 з повнокадровим масивом шуму, як до реєстру фільтрів
+def legacy_vintage(image: np.ndarray) -> np.ndarray:
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    hsv = hsv.astype(np.float32)
+    hsv[:, :, 1] = hsv[:, :, 1] * 0.6
+    hsv[:, :, 0] = hsv[:, :, 0] * 0.8
+    hsv = np.clip(hsv, 0, 255).astype(np.uint8)
+    result = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    noise = np.zeros(result.shape, np.uint8)
+    cv2.randu(noise, 0, 50)
+    result = cv2.add(result, noise)
+    return cv2.GaussianBlur(result, (3, 3), 0)
+
+
+def main():
+    print(f"{'MP':>4} {'chain':<36} {'steps':>5} {'sequential ms':>14} {'pipeline ms':>12} {'speedup':>8} {'max diff':>8}")
+
+    for megapixels in IMAGE_SIZES_MP:
+        source = make_image(megapixels)
+
+        for chain in FILTER_CHAINS:
+            sequential = FilterPipeline(chain, fuse=False)
+            fused = FilterPipeline(chain)
+
+            cv2.setRNGSeed(0)
+            expected = sequential.apply(source)
+            cv2.setRNGSeed(0)
+            actual = fused.apply(source)
+            max_diff = int(np.abs(expected.astype(np.int16) - actual.astype(np.int16)).max())
+
+            sequential_time = best_of(lambda: sequential.apply(source))
+            fused_time = best_of(lambda: fused.apply(source))
+
+            print(f"{megapixels:>4} {' → '.join(chain):<36} {len(fused.steps):>5} "
+                  f"{sequential_time * 1000:>14.2f} {fused_time * 1000:>12.2f} "
+                  f"{sequential_time / fused_time:>7.1f}x {max_diff:>8}")
+
+        legacy_time = best_of(lambda: legacy_vintage(source))
+        vintage_time = best_of(lambda: FilterPipeline(["Вінтаж"]).apply(source))
+        print(f"{megapixels:>4} {'Вінтаж (float32 до реєстру)':<36} {'':>5} "
+              f"{legacy_time * 1000:>14.2f} {vintage_time * 1000:>12.2f} {legacy_time / vintage_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+
+# вікно не показується, тож дисплей не потрібен
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QApplication, QLabel
+
+from common import make_photo, measure
+from image_processor import ImageProcessor
+from preview_canvas import PreviewCanvas
+from render_worker import render_preview
+from utils import TextPosition
+
+
+SIZES_MP = [2, 12, 48]
+PREVIEW_SIZE = (800, 600)
+REPEATS = 30
+TEXTS = ["Коли змінюєш лише підпис", "а перемальовується тільки він"]
+
+
+def make_spec(index: int):
+    # кожен прогін — нова літера в нижньому підписі, як під час набору
+    return {"layers": [
+        {"text": TEXTS[0], "position": TextPosition.TOP, "font_size": 120},
+        {"text": TEXTS[1][:10 + index % 20], "position": TextPosition.BOTTOM, "font_size": 120},
+    ]}
+
+
+# як було: перетворення в RGB, новий QImage і новий QPixmap на кожне оновлення
+def legacy_show(label: QLabel, image) -> None:
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb_image.shape
+    q_img = QImage(rgb_image.data, w, h, ch * w, QImage.Format_RGB888)
+    label.setPixmap(QPixmap.fromImage(q_img))
+
+
+def main():
+    app = QApplication([])
+    print(f"{'MP':>4} {'path':<8} {'refresh ms':>11} {'show ms':>8}")
+
+    for megapixels in SIZES_MP:
+        processor = ImageProcessor()
+        processor.enable_proxy(*PREVIEW_SIZE)
+        processor.set_image(make_photo(megapixels))
+        document = processor.document
+
+        label, canvas = QLabel(), PreviewCanvas()
+        # віджети показуються, щоб у час входило й малювання, яке Qt виконує в processEvents
+        for widget in (label, canvas):
+            widget.resize(*PREVIEW_SIZE)
+            widget.show()
+        frames = [render_preview(document, make_spec(index), *PREVIEW_SIZE)[2] for index in range(REPEATS)]
+
+        def show_legacy(image):
+            legacy_show(label, image)
+            app.processEvents()
+
+        def show_canvas(image):
+            canvas.show_image(image)
+            app.processEvents()
+
+        for name, show in (("legacy", show_legacy), ("canvas", show_canvas)):
+            counter = iter(range(10 ** 6))
+            refresh = measure(lambda: show(render_preview(document, make_spec(next(counter)), *PREVIEW_SIZE)[2]),
+                              repeats=REPEATS)
+            shown = iter(range(10 ** 6))
+            display = measure(lambda: show(frames[next(shown) % REPEATS]), repeats=REPEATS)
+            print(f"{megapixels:>4} {name:<8} {refresh['median_ms']:>11.2f} {display['median_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
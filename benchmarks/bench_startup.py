@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from common import make_photo
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_REPEATS = 7
+IMAGE_MP = 0.5
+
+# кожен випадок — окремий процес: (назва, імпорт, робота після імпорту)
+SCENARIOS = [
+    ("python", "", ""),
+    ("import render_engine", "import render_engine", ""),
+    ("import image_processor", "import image_processor", ""),
+    ("import meme_generator", "import meme_generator", ""),
+    ("import batch_render", "import batch_render", ""),
+    ("import server", "import server", ""),
+    ("first render()", "from render_engine import render",
+     "render({'image': IMAGE, 'texts': ['Коли код', 'нарешті працює'], 'format': '.jpg'})"),
+    ("first generate_meme()", "from image_processor import ImageProcessor\nfrom meme_generator import MemeGenerator",
+     "MemeGenerator(ImageProcessor()).generate_meme(IMAGE, ['Коли код', 'нарешті працює'])"),
+]
+
+CHILD = """import sys, time
+IMAGE = {image!r}
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+{work}
+done = time.perf_counter()
+print(imported - start, done - imported, any(name.startswith("PyQt5") for name in sys.modules), file=sys.stderr)
+"""
+
+
+def run_child(code: str) -> Tuple[float, float, float, bool]:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True)
+    wall = time.perf_counter() - start
+    # останній рядок stderr — виміри; все до нього — діагностика самого рушія
+    import_s, work_s, qt_loaded = result.stderr.strip().splitlines()[-1].split()
+    return wall, float(import_s), float(work_s), qt_loaded == "True"
+
+
+def measure_scenario(imports: str, work: str, image_path: str, repeats: int) -> Dict:
+    code = CHILD.format(image=image_path, imports=imports, work=work)
+    # перший запуск прогріває кеш байткоду й файлову систему
+    run_child(code)
+    runs = [run_child(code) for _ in range(repeats)]
+    walls, import_times, work_times, qt_flags = zip(*runs)
+    return {
+        "process_ms": float(np.median(walls)) * 1000,
+        "import_ms": float(np.median(import_times)) * 1000,
+        "work_ms": float(np.median(work_times)) * 1000,
+        "qt_loaded": any(qt_flags),
+    }
+
+
+def measure_cli(args: List[str], repeats: int) -> float:
+    command = [sys.executable, os.path.join(ROOT, "main.py")] + args
+    subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Час холодного імпорту й першого мема в новому процесі")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="запусків процесу на випадок")
+    parser.add_argument("--json", dest="json_path", default=None, help="записати результати в JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'case':<26} {'process ms':>11} {'import ms':>10} {'work ms':>9} {'PyQt5':>6}")
+
+    with tempfile.TemporaryDirectory(prefix="meme_startup_") as temp_dir:
+        image_path = os.path.join(temp_dir, "source.jpg")
+        cv2.imwrite(image_path, make_photo(IMAGE_MP))
+        for name, imports, work in SCENARIOS:
+            result = dict(measure_scenario(imports, work, image_path, args.repeats), name=name)
+            results.append(result)
+            print(f"{name:<26} {result['process_ms']:>11.1f} {result['import_ms']:>10.1f} "
+                  f"{result['work_ms']:>9.1f} {'так' if result['qt_loaded'] else 'ні':>6}", flush=True)
+
+    cli_ms = measure_cli(["render", "--help"], args.repeats)
+    results.append({"name": "main.py render --help", "process_ms": cli_ms})
+    print(f"{'main.py render --help':<26} {cli_ms:>11.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, ensure_ascii=False, indent=2)
+
+    # ядро має імпортуватися без Qt; інакше безголові процеси знову потребуватимуть бібліотек Qt
+    leaked = [result["name"] for result in results if result.get("qt_loaded")]
+    if leaked:
+        print(f"PyQt5 завантажено в безголових випадках: {', '.join(leaked)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
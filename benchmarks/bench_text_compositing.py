@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+from common import make_image, best_of
+from font_registry import get_font_registry
+from image_processor import ImageProcessor
+from utils import TextPosition
+
+
+IMAGE_SIZES_MP = [0.3, 2, 12]
+FONT_SIZES = [36, 120, 300]
+
+
+# повнокадровий шлях з п'ятьма draw.text, яким add_text був до рендерингу в спрайт
+def legacy_add_text(image: np.ndarray, text: str, position: TextPosition, font_name: str,
+                    font_size: int, color) -> np.ndarray:
+    height, width = image.shape[:2]
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    pil_image = Image.fromarray(image_rgb)
+    draw = ImageDraw.Draw(pil_image)
+    font = get_font_registry().get_font(font_name, font_size)
+
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    text_width = right - left
+    text_height = bottom - top
+
+    x = (width - text_width) // 2
+    if position == TextPosition.TOP:
+        y = 10
+    elif position == TextPosition.BOTTOM:
+        y = height - text_height - 10
+    else:
+        y = (height - text_height) // 2
+
+    outline_width = max(2, font_size // 30)
+    for offset_x, offset_y in [(-outline_width, -outline_width),
+                               (-outline_width, outline_width),
+                               (outline_width, -outline_width),
+                               (outline_width, outline_width)]:
+        draw.text((x + offset_x, y + offset_y), text, font=font, fill=(0, 0, 0))
+    draw.text((x, y), text, font=font, fill=color)
+
+    return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+
+
+def main():
+    processor = ImageProcessor()
+    text = "Коли код нарешті працює"
+
+    print(f"{'MP':>6} {'size':>11} {'font':>5} {'legacy ms':>10} {'roi ms':>8} {'speedup':>8}")
+
+    for megapixels in IMAGE_SIZES_MP:
+        source = make_image(megapixels)
+        height, width = source.shape[:2]
+
+        for font_size in FONT_SIZES:
+            processor.height, processor.width = height, width
+
+            legacy_time = best_of(lambda: legacy_add_text(
+                source, text, TextPosition.BOTTOM, "Impact", font_size, (255, 255, 255)))
+
+            def roi_add_text():
+                processor.image = source.copy()
+                processor.add_text(text, TextPosition.BOTTOM, "Impact", font_size, (255, 255, 255))
+
+            copy_time = best_of(lambda: source.copy())
+            roi_time = best_of(roi_add_text) - copy_time
+
+            print(f"{megapixels:>6} {width:>5}x{height:<5} {font_size:>5} {legacy_time * 1000:>10.2f} "
+                  f"{roi_time * 1000:>8.2f} {legacy_time / roi_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
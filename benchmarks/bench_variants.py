@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+
+import cv2
+
+from common import make_photo
+from image_processor import ImageProcessor
+from meme_generator import MemeGenerator
+from utils import MEME_TEMPLATES
+
+
+SIZES_MP = [2, 12]
+VARIANTS = 48
+FILTER = "Сепія"
+IMAGE_FORMAT = ".jpg"
+
+
+def make_captions(count: int):
+    # A/B-тест підписів: кожен набір — нові верх і низ
+    return [[f"Варіант {index}: коли тест нарешті зелений", f"а реліз у п'ятницю #{index}"]
+            for index in range(count)]
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cpu_count})
+    print(f"ядер: {cpu_count}, варіантів: {VARIANTS}, фільтр: {FILTER}")
+    print(f"{'MP':>4} {'path':<22} {'total ms':>10} {'variants/s':>11} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory(prefix="meme_variants_") as temp_dir:
+        template_name = next(iter(MEME_TEMPLATES))
+        template_path = os.path.join(temp_dir, template_name + ".jpg")
+        captions = make_captions(VARIANTS)
+
+        for megapixels in SIZES_MP:
+            cv2.imwrite(template_path, make_photo(megapixels))
+            generator = MemeGenerator(ImageProcessor())
+            generator.templates_dir = temp_dir
+
+            # як раніше: шаблон і фільтр заново для кожного варіанта
+            def sequential():
+                for texts in captions:
+                    generator.auto_generate_meme(template_name, texts, filter_name=FILTER)
+                    generator.encode_meme(IMAGE_FORMAT)
+
+            def fan_out(workers: int):
+                for _ in generator.auto_generate_variants(template_name, captions, filter_name=FILTER,
+                                                          image_format=IMAGE_FORMAT, workers=workers):
+                    pass
+
+            # розігрів: кеш шаблонів і спрайтів, щоб обидва шляхи міряли рендеринг, а не перший запуск
+            sequential()
+
+            start = time.perf_counter()
+            sequential()
+            baseline = time.perf_counter() - start
+            print(f"{megapixels:>4} {'auto_generate_meme':<22} {baseline * 1000:>10.1f} "
+                  f"{VARIANTS / baseline:>11.1f} {1.0:>7.2f}x")
+
+            for workers in worker_counts:
+                start = time.perf_counter()
+                fan_out(workers)
+                elapsed = time.perf_counter() - start
+                print(f"{megapixels:>4} {f'variants[workers={workers}]':<22} {elapsed * 1000:>10.1f} "
+                      f"{VARIANTS / elapsed:>11.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
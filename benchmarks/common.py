@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+REPEATS = 5
+
+
+def make_image(megapixels: float, seed: int = 0) -> np.ndarray:
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def make_photo(megapixels: float, seed: int = 0) -> np.ndarray:
+    # шум не стискається й не схожий на фото; розмитий шум поверх градієнта ближчий до реальних кадрів
+    image = cv2.GaussianBlur(make_image(megapixels, seed), (0, 0), 3)
+    gradient = np.linspace(0, 96, image.shape[1], dtype=np.uint8)
+    return cv2.add(image, np.broadcast_to(gradient[None, :, None], image.shape).copy())
+
+
+def best_of(func: Callable, repeats: int = REPEATS) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(func: Callable, setup: Optional[Callable] = None, repeats: int = REPEATS, warmup: int = 1,
+            budget: float = 10.0, min_repeats: int = 3) -> Dict[str, float]:
+    # setup не входить у час; після min_repeats повторів зупиняємось, щойно вичерпано budget секунд
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        func()
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeats:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        if len(timings) >= min_repeats and time.perf_counter() - started > budget:
+            break
+
+    # пам'ять окремим прогоном, бо tracemalloc сповільнює виконання;
+    # масиви numpy і OpenCV виділяються через numpy і теж відстежуються.
+    # peak — найбільше виділеного одночасно під час прогону, retained — що лишилось після нього
+    # (кеші, історія, буфери пулів); після розігріву це стала пам'ять на один рендер
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        "median_ms": float(np.median(timings_ms)),
+        "p95_ms": float(np.percentile(timings_ms, 95)),
+        "min_ms": float(timings_ms.min()),
+        "runs": len(timings),
+        "peak_mb": peak / 1024 / 1024,
+        "retained_mb": retained / 1024 / 1024,
+    }
@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import PIL
+
+from common import make_photo, measure
+from filters import get_filter_names
+from image_processor import ImageProcessor
+from meme_generator import MemeGenerator
+from render_cache import RenderCache
+from sprite_cache import get_sprite_cache
+from utils import DEFAULT_FONTS, MEME_TEMPLATES, TextPosition
+
+
+SIZES_MP = [0.3, 2, 12, 48]
+FONT_SIZES = [36, 120, 300]
+SAVE_FORMATS = [".jpg", ".png", ".webp"]
+PREVIEW_SIZE = (800, 600)
+DEFAULT_REPEATS = 15
+DEFAULT_BUDGET = 10.0
+DEFAULT_THRESHOLD = 0.15
+# різниця, меншу за яку таймер і планувальник не дозволяють вважати регресією
+MIN_DELTA_MS = 0.5
+# еталонний запуск у репозиторії; оновлюється через --json benchmarks/baseline.json
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+TEXT = "Коли код нарешті працює"
+FONT = DEFAULT_FONTS[0]
+COLOR = (255, 255, 255)
+
+Case = Tuple[str, Callable, Optional[Callable]]
+
+
+def iter_cases(image: np.ndarray, temp_dir: str) -> Iterator[Case]:
+    # (назва, що вимірюється, підготовка поза часом)
+    processor = ImageProcessor()
+    processor.set_image(image)
+
+    source_path = os.path.join(temp_dir, "source.jpg")
+    cv2.imwrite(source_path, image)
+    loader = ImageProcessor()
+    yield "load_image", lambda: loader.load_image(source_path), None
+
+    for font_size in FONT_SIZES:
+        yield (f"add_text[font={font_size}]",
+               lambda font_size=font_size: processor.add_text(TEXT, TextPosition.BOTTOM, FONT, font_size, COLOR),
+               processor.reset_image)
+
+    # без кешу спрайтів: растеризація щоразу, як для підпису, що ще не траплявся
+    def reset_uncached():
+        processor.reset_image()
+        get_sprite_cache().clear()
+
+    yield ("add_text[font=120,uncached]",
+           lambda: processor.add_text(TEXT, TextPosition.BOTTOM, FONT, 120, COLOR),
+           reset_uncached)
+
+    # довгий підпис, що не вміщується без перенесення: бісекція розміру плюс рендеринг
+    yield ("add_text[fit]",
+           lambda: processor.add_text(" ".join([TEXT] * 3), TextPosition.BOTTOM, FONT, 300, COLOR, fit=True),
+           processor.reset_image)
+
+    generator = MemeGenerator(processor)
+    for font_size in FONT_SIZES:
+        yield (f"add_caption[font={font_size}]",
+               lambda font_size=font_size: generator.add_caption("Верх", "Низ", FONT, font_size, COLOR),
+               processor.reset_image)
+
+    for filter_name in get_filter_names():
+        yield (f"apply_filter[{filter_name}]",
+               lambda filter_name=filter_name: processor.apply_filter(filter_name),
+               processor.reset_image)
+
+    yield "resize_image", lambda: processor.resize_image(*PREVIEW_SIZE), None
+
+    processor.reset_image()
+    processor.add_text(TEXT, TextPosition.BOTTOM, FONT, 120, COLOR)
+    for image_format in SAVE_FORMATS:
+        save_path = os.path.join(temp_dir, "out" + image_format)
+        yield f"save_image[{image_format}]", lambda save_path=save_path: processor.save_image(save_path), None
+
+    # шаблон — той самий синтетичний кадр у власному каталозі шаблонів
+    templates_dir = os.path.join(temp_dir, "templates")
+    os.makedirs(templates_dir, exist_ok=True)
+    template_name = next(iter(MEME_TEMPLATES))
+    cv2.imwrite(os.path.join(templates_dir, template_name + ".jpg"), image)
+    meme_generator = MemeGenerator(ImageProcessor())
+    meme_generator.templates_dir = templates_dir
+    yield "auto_generate_meme", lambda: meme_generator.auto_generate_meme(template_name), None
+
+    # повторний запит з кешем рендерів: хеш ключа й копія готового файлу замість рендерингу
+    cached_generator = MemeGenerator(ImageProcessor(), RenderCache(os.path.join(temp_dir, "render_cache")))
+    cached_generator.templates_dir = templates_dir
+    cached_path = os.path.join(temp_dir, "cached.jpg")
+    yield ("auto_generate_meme+save[cached]",
+           lambda: cached_generator.auto_generate_meme(template_name) and cached_generator.save_meme(cached_path),
+           None)
+
+
+def run_suite(sizes: List[float], repeats: int, budget: float, selected: Optional[str] = None) -> List[Dict]:
+    results = []
+
+    for megapixels in sizes:
+        image = make_photo(megapixels)
+        height, width = image.shape[:2]
+
+        with tempfile.TemporaryDirectory(prefix="meme_bench_") as temp_dir:
+            for name, func, setup in iter_cases(image, temp_dir):
+                if selected and selected not in name:
+                    continue
+
+                # методи процесора пишуть діагностику в stdout, а stdout належить таблиці
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = measure(func, setup, repeats=repeats, budget=budget)
+
+                result = dict(stats, name=name, megapixels=megapixels, size=f"{width}x{height}",
+                              throughput_mp_s=megapixels / (stats["median_ms"] / 1000))
+                results.append(result)
+                print(format_result(result), flush=True)
+
+    return results
+
+
+def get_key(result: Dict) -> str:
+    return f"{result['name']}@{result['megapixels']}MP"
+
+
+def format_result(result: Dict) -> str:
+    return (f"{result['megapixels']:>5} {result['name']:<34} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+            f"{result['throughput_mp_s']:>9.1f} {result['peak_mb']:>9.1f} {result['retained_mb']:>9.1f} "
+            f"{result['runs']:>4}")
+
+
+def get_environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pillow": PIL.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float,
+            min_delta_ms: float = MIN_DELTA_MS) -> List[Tuple[str, float]]:
+    # регресія — медіана повільніша за базову більш ніж на threshold і на min_delta_ms
+    previous = {get_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+
+    environment = baseline.get("environment", {})
+    print(f"\nпорівняння з базою ({environment.get('timestamp', '?')}), поріг +{threshold:.0%}")
+    # еталон з іншої машини чи версій бібліотек порівнюється лише приблизно
+    current = get_environment()
+    changed = [key for key in ("platform", "cpu_count", "numpy", "opencv", "pillow")
+               if environment.get(key) != current[key]]
+    if changed:
+        print(f"увага: база знята в іншому середовищі ({', '.join(changed)})", file=sys.stderr)
+    for result in results:
+        base = previous.get(get_key(result))
+        if base is None:
+            continue
+        ratio = result["median_ms"] / base["median_ms"]
+        significant = abs(result["median_ms"] - base["median_ms"]) >= min_delta_ms
+        mark = ""
+        if significant and ratio > 1 + threshold:
+            mark = "РЕГРЕСІЯ"
+            regressions.append((get_key(result), ratio))
+        elif significant and ratio < 1 - threshold:
+            mark = "швидше"
+        print(f"{get_key(result):<44} {base['median_ms']:>10.2f} → {result['median_ms']:>10.2f} "
+              f"{(ratio - 1) * 100:>+7.1f}% {mark}")
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки гарячих шляхів генератора мемів")
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES_MP, help="розміри зображень у мегапікселях")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="найбільше повторів на випадок")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="секунд на випадок, після яких повтори припиняються (але не менше трьох)")
+    parser.add_argument("-k", dest="selected", default=None, help="лише випадки, назва яких містить рядок")
+    parser.add_argument("--json", dest="json_path", default=None, help="записати результати в JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="JSON попереднього запуску для порівняння (типово benchmarks/baseline.json; "
+                             "порожній рядок вимикає порівняння)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустиме сповільнення медіани (0.15 = 15%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=MIN_DELTA_MS,
+                        help="менші зміни медіани не вважаються регресією")
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>5} {'case':<34} {'median ms':>10} {'p95 ms':>10} {'MP/s':>9} {'peak MB':>9} {'kept MB':>9} {'runs':>4}")
+    results = run_suite(args.sizes, args.repeats, args.budget, args.selected)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"environment": get_environment(), "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} регресій понад поріг", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class BufferPool:
+    # вільні масиви за формою й типом; проміжні буфери фільтрів і повнорозмірні кадри
+    # беруться звідси замість нового виділення на кожну операцію.
+    # Понад max_bytes вільних буферів найдавніше повернуті форми звільняються
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_held = 0
+        self.bytes_allocated = 0
+
+        self._lock = threading.Lock()
+        self._free = OrderedDict()
+
+    @staticmethod
+    def _key(shape: Tuple[int, ...], dtype) -> Tuple:
+        return tuple(shape), np.dtype(dtype).str
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        # вміст буфера довільний, як у np.empty
+        key = self._key(shape, dtype)
+        with self._lock:
+            buffers = self._free.get(key)
+            if buffers:
+                buffer = buffers.pop()
+                if not buffers:
+                    del self._free[key]
+                self.bytes_held -= buffer.nbytes
+                self.hits += 1
+                return buffer
+            self.misses += 1
+
+        buffer = np.empty(shape, dtype)
+        with self._lock:
+            self.bytes_allocated += buffer.nbytes
+        return buffer
+
+    def release(self, buffer: np.ndarray) -> None:
+        # повертаються лише власні неперервні масиви, а не вигляди чужих
+        if buffer.base is not None or not buffer.flags.c_contiguous or not buffer.flags.writeable:
+            return
+        if buffer.nbytes > self.max_bytes:
+            return
+
+        key = self._key(buffer.shape, buffer.dtype)
+        with self._lock:
+            self._free.setdefault(key, []).append(buffer)
+            self._free.move_to_end(key)
+            self.bytes_held += buffer.nbytes
+
+            while self.bytes_held > self.max_bytes:
+                oldest = next(iter(self._free))
+                buffers = self._free[oldest]
+                self.bytes_held -= buffers.pop(0).nbytes
+                self.evictions += 1
+                if not buffers:
+                    del self._free[oldest]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._free.clear()
+            self.bytes_held = 0
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "free_buffers": sum(len(buffers) for buffers in self._free.values()),
+                "bytes_held": self.bytes_held,
+                "bytes_allocated": self.bytes_allocated,
+                "max_bytes": self.max_bytes,
+            }
+
+
+@contextmanager
+def borrow(pool: Optional[BufferPool], shape: Tuple[int, ...], dtype=np.uint8) -> Iterator[np.ndarray]:
+    # тимчасовий буфер на час блоку; без пулу — звичайний масив
+    if pool is None:
+        yield np.empty(shape, dtype)
+        return
+
+    buffer = pool.acquire(shape, dtype)
+    try:
+        yield buffer
+    finally:
+        pool.release(buffer)
@@ -0,0 +1,188 @@
+import os
+import struct
+from typing import BinaryIO, Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+
+from metrics import count, span
+
+
+DEFAULT_JPEG_QUALITY = 95
+DEFAULT_WEBP_QUALITY = 90
+MIN_QUALITY = 5
+MAX_QUALITY = 100
+
+LOSSY_FORMATS = (".jpg", ".jpeg", ".webp")
+ENCODE_OPTION_KEYS = ("quality", "progressive", "optimize", "compression", "lossless", "strip_metadata",
+                      "max_bytes")
+ENCODE_INT_OPTIONS = ("quality", "compression", "max_bytes")
+
+# APP0..APP15 і коментар; таблиці, кадр і скани лишаються
+JPEG_METADATA_MARKERS = set(range(0xE0, 0xF0)) | {0xFE}
+# допоміжні чанки, які не впливають на пікселі
+PNG_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME", b"eXIf", b"pHYs"}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def normalize_format(image_format: str) -> str:
+    image_format = image_format.lower()
+    if not image_format.startswith("."):
+        image_format = "." + image_format
+    return image_format
+
+
+def _parse_flag(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def get_encode_options(spec: Dict) -> Dict:
+    # значення з рядка запиту чи CSV приходять рядками
+    options = {}
+    for key in ENCODE_OPTION_KEYS:
+        value = spec.get(key)
+        if value is None or value == "":
+            continue
+        options[key] = int(value) if key in ENCODE_INT_OPTIONS else _parse_flag(value)
+    return options
+
+
+def get_encode_params(image_format: str, quality: Optional[int] = None, progressive: bool = False,
+                      optimize: bool = False, compression: Optional[int] = None,
+                      lossless: bool = False) -> List[int]:
+    image_format = normalize_format(image_format)
+
+    if image_format in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality or DEFAULT_JPEG_QUALITY),
+                cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive),
+                cv2.IMWRITE_JPEG_OPTIMIZE, int(optimize)]
+
+    if image_format == ".png":
+        # без рівня лишається типове стиснення OpenCV
+        if compression is None:
+            return []
+        if not 0 <= compression <= 9:
+            raise ValueError(f"рівень стиснення PNG має бути від 0 до 9: {compression}")
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(compression)]
+
+    if image_format == ".webp":
+        # якість понад 100 вмикає в libwebp режим без втрат
+        return [cv2.IMWRITE_WEBP_QUALITY, 101 if lossless else int(quality or DEFAULT_WEBP_QUALITY)]
+
+    return []
+
+
+def strip_jpeg_metadata(data: memoryview) -> bytes:
+    parts = [data[:2]]
+    offset = 2
+    while offset + 4 <= len(data) and data[offset] == 0xFF:
+        marker = data[offset + 1]
+        # після SOS іде ентропійний потік, далі маркерів метаданих немає
+        if marker == 0xDA:
+            break
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        if marker not in JPEG_METADATA_MARKERS:
+            parts.append(data[offset:offset + 2 + length])
+        offset += 2 + length
+    parts.append(data[offset:])
+    return b"".join(parts)
+
+
+def strip_png_metadata(data: memoryview) -> bytes:
+    parts = [data[:len(PNG_SIGNATURE)]]
+    offset = len(PNG_SIGNATURE)
+    while offset + 8 <= len(data):
+        length = struct.unpack(">I", data[offset:offset + 4])[0]
+        chunk_end = offset + 12 + length
+        if bytes(data[offset + 4:offset + 8]) not in PNG_METADATA_CHUNKS:
+            parts.append(data[offset:chunk_end])
+        offset = chunk_end
+    return b"".join(parts)
+
+
+def remove_metadata(data: Union[bytes, memoryview], image_format: str) -> Union[bytes, memoryview]:
+    data = memoryview(data)
+    image_format = normalize_format(image_format)
+
+    if image_format in (".jpg", ".jpeg") and bytes(data[:2]) == b"\xff\xd8":
+        return strip_jpeg_metadata(data)
+    if image_format == ".png" and bytes(data[:len(PNG_SIGNATURE)]) == PNG_SIGNATURE:
+        return strip_png_metadata(data)
+    return data
+
+
+def _encode(image: np.ndarray, image_format: str, params: List[int]) -> np.ndarray:
+    success, encoded = cv2.imencode(image_format, image, params)
+    if not success:
+        raise ValueError(f"не вдалося закодувати зображення у {image_format}")
+    return encoded
+
+
+def _encode_to_size(image: np.ndarray, image_format: str, max_bytes: int, options: Dict) -> np.ndarray:
+    if image_format not in LOSSY_FORMATS or options.get("lossless"):
+        # без втрат розмір від якості не залежить, лишається лише найсильніше стиснення
+        if image_format == ".png":
+            options = dict(options, compression=9)
+        encoded = _encode(image, image_format, get_encode_params(image_format, **options))
+        if encoded.nbytes > max_bytes:
+            raise ValueError(f"зображення не вміщується у {max_bytes} байт у форматі {image_format}")
+        return encoded
+
+    # розмір монотонно зростає з якістю, тож бінарний пошук найвищої якості, що вміщується;
+    # спершу пробуємо саму верхню межу, бо часто вміщується вже вона
+    high = min(MAX_QUALITY, int(options.get("quality") or MAX_QUALITY))
+    encoded = _encode(image, image_format, get_encode_params(image_format, **dict(options, quality=high)))
+    if encoded.nbytes <= max_bytes:
+        return encoded
+
+    low, high = MIN_QUALITY, high - 1
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        encoded = _encode(image, image_format, get_encode_params(image_format, **dict(options, quality=quality)))
+        if encoded.nbytes <= max_bytes:
+            best = encoded
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best is None:
+        raise ValueError(f"зображення не вміщується у {max_bytes} байт навіть з якістю {MIN_QUALITY}")
+    return best
+
+
+def encode_buffer(image: np.ndarray, image_format: str = ".png", max_bytes: Optional[int] = None,
+                  strip_metadata: bool = False, **options) -> memoryview:
+    # memoryview над буфером енкодера, без копії в bytes
+    image_format = normalize_format(image_format)
+
+    with span("encode" + image_format):
+        if max_bytes is not None:
+            encoded = _encode_to_size(image, image_format, max_bytes, options)
+        else:
+            encoded = _encode(image, image_format, get_encode_params(image_format, **options))
+    count("bytes_encoded", encoded.nbytes)
+
+    data = memoryview(encoded).cast("B")
+    if strip_metadata:
+        data = memoryview(remove_metadata(data, image_format))
+    return data
+
+
+def encode_image(image: np.ndarray, image_format: str = ".png", **options) -> bytes:
+    return encode_buffer(image, image_format, **options).tobytes()
+
+
+def write_image(image: np.ndarray, target: Union[str, BinaryIO], image_format: Optional[str] = None,
+                **options) -> int:
+    # target — шлях або будь-який двійковий потік; формат для шляху береться з розширення
+    if isinstance(target, str):
+        data = encode_buffer(image, image_format or os.path.splitext(target)[1] or ".png", **options)
+        with open(target, "wb") as f:
+            f.write(data)
+    else:
+        data = encode_buffer(image, image_format or ".png", **options)
+        target.write(data)
+    return data.nbytes
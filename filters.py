@@ -0,0 +1,398 @@
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool, borrow
+from metrics import count, span
+
+
+def scale_kernel_size(kernel_size: int, scale: float) -> int:
+    return max(1, int(round(kernel_size * scale)) | 1)
+
+
+class ImageFilter:
+    name = ""
+    # скільки пікселів навколо потрібно, щоб порахувати піксель так само, як на цілому кадрі
+    halo = 0
+    # False — OpenCV, отримавши dst = image, сам копіює вхід у свіжу пам'ять
+    in_place = True
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        # dst — буфер результату тієї ж форми, зокрема сам image; pool дає проміжні буфери
+        raise NotImplementedError
+
+    def apply_region(self, image: np.ndarray, origin: Tuple[int, int], full_size: Tuple[int, int]) -> np.ndarray:
+        # image — фрагмент кадру розміру full_size (ширина, висота) з лівим верхнім кутом origin
+        return self.apply(image)
+
+    def scaled(self, scale: float) -> "ImageFilter":
+        # версія фільтра для копії кадру, зменшеної в scale разів
+        return self
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+
+def apply_step(image_filter: ImageFilter, image: np.ndarray, dst: Optional[np.ndarray],
+               pool: Optional[BufferPool]) -> np.ndarray:
+    # фільтр, що не пише поверх входу, читає його копію з пулу, а не з нової пам'яті
+    if dst is image and not image_filter.in_place:
+        with borrow(pool, image.shape, image.dtype) as source:
+            np.copyto(source, image)
+            return image_filter.apply(source, dst, pool)
+    return image_filter.apply(image, dst, pool)
+
+
+class ColorMatrixFilter(ImageFilter):
+    # поточкове афінне перетворення BGR: out = matrix @ pixel + offset;
+    # сусідні такі фільтри у ланцюжку зливаються в одну матрицю
+    in_place = False
+
+    def __init__(self, name: str, matrix, offset=(0.0, 0.0, 0.0)):
+        self.name = name
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        if not self.offset.any():
+            return cv2.transform(image, self.matrix, dst=dst)
+        return cv2.transform(image, np.hstack([self.matrix, self.offset[:, None]]), dst=dst)
+
+    def stays_in_range(self) -> bool:
+        # чи лишається результат у [0, 255] для будь-якого пікселя: тоді uint8 між кроками
+        # нічого не обрізає, і злиття з наступною матрицею відрізняється лише округленням
+        low = self.offset + np.minimum(self.matrix, 0).sum(axis=1) * 255
+        high = self.offset + np.maximum(self.matrix, 0).sum(axis=1) * 255
+        return bool((low >= 0).all() and (high <= 255).all())
+
+    def then(self, other: "ColorMatrixFilter") -> "ColorMatrixFilter":
+        return ColorMatrixFilter(f"{self.name} → {other.name}",
+                                 other.matrix @ self.matrix,
+                                 other.matrix @ self.offset + other.offset)
+
+
+class GrayscaleFilter(ColorMatrixFilter):
+    in_place = True
+
+    def __init__(self):
+        # ваги BT.601, як у cv2.COLOR_BGR2GRAY, у кожному вихідному каналі
+        super().__init__("Чорно-білий", [[0.114, 0.587, 0.299]] * 3)
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        with borrow(pool, image.shape[:2]) as gray:
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+            return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=dst)
+
+
+class SepiaFilter(ColorMatrixFilter):
+    def __init__(self):
+        super().__init__("Сепія", [[0.272, 0.534, 0.131],
+                                   [0.349, 0.686, 0.168],
+                                   [0.393, 0.769, 0.189]])
+
+
+class NegativeFilter(ColorMatrixFilter):
+    in_place = True
+
+    def __init__(self):
+        super().__init__("Негатив", -np.eye(3), (255.0, 255.0, 255.0))
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        return cv2.bitwise_not(image, dst=dst)
+
+
+class GaussianBlurFilter(ImageFilter):
+    in_place = False
+
+    def __init__(self, kernel_size: int = 15, name: str = "Розмиття"):
+        self.name = name
+        self.kernel_size = kernel_size
+
+    @property
+    def halo(self) -> int:
+        return self.kernel_size // 2
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        return cv2.GaussianBlur(image, (self.kernel_size, self.kernel_size), 0, dst=dst)
+
+    def scaled(self, scale: float) -> "GaussianBlurFilter":
+        return GaussianBlurFilter(scale_kernel_size(self.kernel_size, scale), self.name)
+
+
+class SharpenFilter(ImageFilter):
+    name = "Різкість"
+    halo = 1
+
+    def __init__(self):
+        self.kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        return cv2.filter2D(image, -1, self.kernel, dst=dst)
+
+
+class EdgesFilter(ImageFilter):
+    name = "Виділення країв"
+    # Собель і придушення немаксимумів; гістерезис нелокальний і в тайлах робиться окремо
+    halo = 2
+
+    def __init__(self, low_threshold: int = 100, high_threshold: int = 200):
+        self.low_threshold = low_threshold
+        self.high_threshold = high_threshold
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        with borrow(pool, image.shape[:2]) as gray, borrow(pool, image.shape[:2]) as edges:
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+            cv2.Canny(gray, self.low_threshold, self.high_threshold, edges=edges)
+            return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR, dst=dst)
+
+
+class HsvScaleFilter(ImageFilter):
+    def __init__(self, hue: float = 1.0, saturation: float = 1.0, value: float = 1.0,
+                 name: str = "Насиченість"):
+        self.name = name
+        # таблиці відтворюють float32-множення з відкиданням дробу,
+        # але все лишається в uint8 і виконується одним cv2.LUT
+        levels = np.arange(256, dtype=np.float32)
+        tables = [np.clip(levels * np.float32(scale), 0, 255).astype(np.uint8)
+                  for scale in (hue, saturation, value)]
+        self.lut = np.stack(tables, axis=-1).reshape(256, 1, 3)
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        # HSV живе в самому буфері результату
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=dst)
+        cv2.LUT(hsv, self.lut, dst=hsv)
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=hsv)
+
+
+class NoiseFilter(ImageFilter):
+    # шум з фіксованого зерна: повтор операції з історії дає той самий кадр, що й перший рендер
+    def __init__(self, amount: int = 50, name: str = "Шум", seed: int = 0):
+        self.name = name
+        self.amount = amount
+        self.seed = seed
+
+    def _fill(self, noise: np.ndarray, seed: int) -> None:
+        # генератор OpenCV свій у кожного потоку, тож зерно не зачіпає інші потоки
+        cv2.setRNGSeed(seed)
+        cv2.randu(noise, 0, self.amount)
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        if dst is None:
+            noise = np.empty(image.shape, np.uint8)
+            self._fill(noise, self.seed)
+            return cv2.add(image, noise, dst=noise)
+
+        with borrow(pool, image.shape) as noise:
+            self._fill(noise, self.seed)
+            return cv2.add(image, noise, dst=dst)
+
+    def apply_region(self, image: np.ndarray, origin: Tuple[int, int], full_size: Tuple[int, int]) -> np.ndarray:
+        # власне зерно для кожного тайла, щоб візерунок шуму не повторювався
+        noise = np.empty(image.shape, np.uint8)
+        self._fill(noise, hash((self.seed,) + tuple(origin)) & 0x7FFFFFFF)
+        return cv2.add(image, noise, dst=noise)
+
+
+class VignetteFilter(ImageFilter):
+    name = "Віньєтка"
+
+    def __init__(self, strength: float = 0.5):
+        self.strength = max(strength, 1e-3)
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        mask = _get_vignette_mask(height, width, channels, self.strength)
+        return cv2.multiply(image, mask, dst=dst, scale=1 / 255)
+
+    def apply_region(self, image: np.ndarray, origin: Tuple[int, int], full_size: Tuple[int, int]) -> np.ndarray:
+        x, y = origin
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        mask = _build_vignette_mask(full_size[1], full_size[0], channels, self.strength,
+                                    (x, y, x + width, y + height))
+        return cv2.multiply(image, mask, scale=1 / 255)
+
+
+_vignette_masks = {}
+_vignette_masks_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _get_vignette_kernels(height: int, width: int, strength: float) -> Tuple[np.ndarray, np.ndarray]:
+    column = cv2.getGaussianKernel(height, height * strength).astype(np.float32)
+    row = cv2.getGaussianKernel(width, width * strength).astype(np.float32)
+    return column, row
+
+
+def _build_vignette_mask(height: int, width: int, channels: int, strength: float,
+                         rect: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+    column, row = _get_vignette_kernels(height, width, strength)
+    # максимум добутку — добуток максимумів, тож фрагмент маски не потребує цілої маски
+    scale = 255 / (column.max() * row.max())
+
+    x0, y0, x1, y1 = rect or (0, 0, width, height)
+    weights = column[y0:y1] @ row[x0:x1].T
+    weights *= scale
+    mask = weights.astype(np.uint8)
+    if channels > 1:
+        mask = cv2.merge([mask] * channels)
+    return mask
+
+
+def _get_vignette_mask(height: int, width: int, channels: int, strength: float) -> np.ndarray:
+    key = (height, width, channels, strength)
+    with _vignette_masks_lock:
+        mask = _vignette_masks.get(key)
+
+    if mask is None:
+        mask = _build_vignette_mask(height, width, channels, strength)
+        mask.setflags(write=False)
+
+        # маска залежить лише від розміру кадру, тож тримаємо останні кілька
+        with _vignette_masks_lock:
+            if len(_vignette_masks) >= 4:
+                _vignette_masks.pop(next(iter(_vignette_masks)))
+            _vignette_masks[key] = mask
+
+    return mask
+
+
+class VintageFilter(ImageFilter):
+    name = "Вінтаж"
+
+    def __init__(self, hue: float = 0.8, saturation: float = 0.6, noise: int = 50, blur: int = 3):
+        self.params = {"hue": hue, "saturation": saturation, "noise": noise, "blur": blur}
+        self.steps = [
+            HsvScaleFilter(hue, saturation),
+            NoiseFilter(noise),
+            GaussianBlurFilter(blur),
+        ]
+
+    @property
+    def halo(self) -> int:
+        return sum(step.halo for step in self.steps)
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        # перший крок пише в dst, решта працюють у ньому на місці
+        for step in self.steps:
+            image = dst = apply_step(step, image, dst, pool)
+        return image
+
+    def apply_region(self, image: np.ndarray, origin: Tuple[int, int], full_size: Tuple[int, int]) -> np.ndarray:
+        for step in self.steps:
+            image = step.apply_region(image, origin, full_size)
+        return image
+
+    def scaled(self, scale: float) -> "VintageFilter":
+        return VintageFilter(**dict(self.params, blur=scale_kernel_size(self.params["blur"], scale)))
+
+
+FILTER_REGISTRY: Dict[str, Callable[..., ImageFilter]] = {}
+
+FILTER_ALIASES = {
+    "grayscale": "Чорно-білий",
+    "blur": "Розмиття",
+    "sharpen": "Різкість",
+    "sepia": "Сепія",
+    "edges": "Виділення країв",
+    "negative": "Негатив",
+    "vintage": "Вінтаж",
+    "vignette": "Віньєтка",
+}
+
+
+def register_filter(name: str, factory: Callable[..., ImageFilter]) -> None:
+    FILTER_REGISTRY[name] = factory
+
+
+register_filter("Чорно-білий", GrayscaleFilter)
+register_filter("Розмиття", GaussianBlurFilter)
+register_filter("Різкість", SharpenFilter)
+register_filter("Сепія", SepiaFilter)
+register_filter("Виділення країв", EdgesFilter)
+register_filter("Негатив", NegativeFilter)
+register_filter("Вінтаж", VintageFilter)
+register_filter("Віньєтка", VignetteFilter)
+
+
+def get_filter_names() -> List[str]:
+    return list(FILTER_REGISTRY)
+
+
+def resolve_filter_name(name: str) -> str:
+    return FILTER_ALIASES.get(name, name)
+
+
+def create_filter(name: str, **params) -> ImageFilter:
+    factory = FILTER_REGISTRY.get(resolve_filter_name(name))
+    if factory is None:
+        raise ValueError(f"невідомий фільтр: {name}")
+    return factory(**params)
+
+
+FilterSpec = Union[str, Dict, ImageFilter]
+
+
+def create_filter_from_spec(spec: FilterSpec) -> ImageFilter:
+    if isinstance(spec, ImageFilter):
+        return spec
+    if isinstance(spec, dict):
+        return create_filter(spec["name"], **spec.get("params", {}))
+    return create_filter(spec)
+
+
+class FilterPipeline:
+    def __init__(self, filters: List[FilterSpec], fuse: bool = True, scale: float = 1.0):
+        self.filters = [create_filter_from_spec(spec) for spec in filters]
+        if scale != 1.0:
+            self.filters = [image_filter.scaled(scale) for image_filter in self.filters]
+        self.steps = self._fuse(self.filters) if fuse else list(self.filters)
+
+    @staticmethod
+    def _fuse(filters: List[ImageFilter]) -> List[ImageFilter]:
+        steps = []
+
+        for image_filter in filters:
+            previous = steps[-1] if steps else None
+            if isinstance(image_filter, ColorMatrixFilter) and isinstance(previous, ColorMatrixFilter) \
+                    and previous.stays_in_range():
+                # один прохід cv2.transform замість кількох повнокадрових; після кроку, що
+                # виходить за [0, 255] (сепія), обрізання між кроками змінює результат, тож без злиття
+                steps[-1] = previous.then(image_filter)
+            else:
+                steps.append(image_filter)
+
+        return steps
+
+    def apply(self, image: np.ndarray, dst: Optional[np.ndarray] = None,
+              pool: Optional[BufferPool] = None) -> np.ndarray:
+        # без dst новий кадр виділяє лише перший крок, наступні пишуть у нього на місці;
+        # dst може бути самим image, якщо вхідний кадр можна перезаписати
+        for step in self.steps:
+            with span("filter." + step.name):
+                result = apply_step(step, image, dst, pool)
+            if result is not dst:
+                count("bytes_allocated.filter", result.nbytes)
+            image = dst = result
+        return image
+
+
+def apply_filter_chain(image: np.ndarray, filters: List[FilterSpec], fuse: bool = True,
+                       scale: float = 1.0, dst: Optional[np.ndarray] = None,
+                       pool: Optional[BufferPool] = None) -> np.ndarray:
+    return FilterPipeline(filters, fuse, scale).apply(image, dst, pool)
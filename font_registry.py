@@ -0,0 +1,221 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from PIL import ImageFont
+
+from metrics import get_metrics
+
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+PROJECT_FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+# файли, якими можна замінити кожну родину з DEFAULT_FONTS на різних ОС,
+# у порядку пріоритету; перший знайдений у індексі виграє
+FONT_FAMILY_FILES = {
+    "Arial": [
+        "arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf",
+        "DejaVuSans.ttf", "FreeSans.ttf", "Helvetica.ttc",
+    ],
+    "Impact": [
+        "impact.ttf", "Impact.ttf", "Anton-Regular.ttf",
+        "LiberationSansNarrow-Bold.ttf", "DejaVuSans-Bold.ttf", "FreeSansBold.ttf",
+    ],
+    "Comic Sans MS": [
+        "comic.ttf", "Comic Sans MS.ttf", "ComicNeue-Regular.ttf",
+        "DejaVuSans.ttf", "FreeSans.ttf",
+    ],
+    "Times New Roman": [
+        "times.ttf", "Times New Roman.ttf", "LiberationSerif-Regular.ttf",
+        "DejaVuSerif.ttf", "FreeSerif.ttf", "Times.ttc",
+    ],
+    "Courier New": [
+        "cour.ttf", "Courier New.ttf", "LiberationMono-Regular.ttf",
+        "DejaVuSansMono.ttf", "FreeMono.ttf", "Courier.ttc",
+    ],
+}
+
+# шрифти з кирилицею для випадку, коли потрібну родину не знайдено
+CYRILLIC_FALLBACK_FILES = [
+    "arial.ttf", "arialbd.ttf", "times.ttf", "segoeui.ttf", "tahoma.ttf",
+    "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "FreeSans.ttf",
+    "Arial.ttf", "Times New Roman.ttf", "Helvetica.ttc",
+]
+
+
+def get_system_font_dirs() -> List[str]:
+    home = os.path.expanduser("~")
+
+    if os.name == 'nt':
+        windir = os.environ.get('WINDIR', 'C:\\Windows')
+        dirs = [os.path.join(windir, 'Fonts')]
+        local_appdata = os.environ.get('LOCALAPPDATA')
+        if local_appdata:
+            dirs.append(os.path.join(local_appdata, 'Microsoft', 'Windows', 'Fonts'))
+        return dirs
+
+    if sys.platform == 'darwin':
+        return [
+            '/Library/Fonts',
+            '/System/Library/Fonts',
+            '/System/Library/Fonts/Supplemental',
+            os.path.join(home, 'Library', 'Fonts'),
+        ]
+
+    return [
+        '/usr/share/fonts',
+        '/usr/local/share/fonts',
+        os.path.join(home, '.fonts'),
+        os.path.join(home, '.local', 'share', 'fonts'),
+    ]
+
+
+class FontRegistry:
+    def __init__(self, font_dirs: Optional[List[str]] = None, max_faces: int = 64):
+        # шрифти проєкту скануються першими, щоб ними можна було підмінити системні
+        self.font_dirs = font_dirs if font_dirs is not None else [PROJECT_FONTS_DIR] + get_system_font_dirs()
+        self.max_faces = max_faces
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._resolved = {}
+        self._faces = OrderedDict()
+        self._default_font_path = None
+        self._default_resolved = False
+
+    def _scan(self) -> Dict[str, str]:
+        index = {}
+
+        for font_dir in self.font_dirs:
+            if not os.path.isdir(font_dir):
+                continue
+
+            for root, _, files in os.walk(font_dir):
+                for file_name in sorted(files):
+                    if not file_name.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    index.setdefault(file_name.lower(), os.path.join(root, file_name))
+
+        return index
+
+    def _get_index(self) -> Dict[str, str]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._scan()
+        return self._index
+
+    def rescan(self) -> None:
+        with self._lock:
+            self._index = None
+            self._resolved.clear()
+            self._faces.clear()
+            self._default_font_path = None
+            self._default_resolved = False
+
+    def _find_first(self, file_names: List[str]) -> Optional[str]:
+        index = self._get_index()
+
+        for file_name in file_names:
+            path = index.get(file_name.lower())
+            if path:
+                return path
+
+        return None
+
+    def default_font_path(self) -> Optional[str]:
+        if not self._default_resolved:
+            self._default_font_path = self._find_first(CYRILLIC_FALLBACK_FILES)
+            self._default_resolved = True
+        return self._default_font_path
+
+    def resolve(self, font_name: Optional[str]) -> Optional[str]:
+        if not font_name:
+            return self.default_font_path()
+
+        path = self._resolved.get(font_name)
+        if path is not None or font_name in self._resolved:
+            return path
+
+        if os.path.isfile(font_name):
+            path = font_name
+        elif font_name in FONT_FAMILY_FILES:
+            path = self._find_first(FONT_FAMILY_FILES[font_name])
+        else:
+            base_name = os.path.basename(font_name)
+            stem, ext = os.path.splitext(base_name)
+            if ext.lower() in FONT_EXTENSIONS:
+                candidates = [base_name]
+            else:
+                candidates = [stem + font_ext for font_ext in FONT_EXTENSIONS]
+
+            for family, family_files in FONT_FAMILY_FILES.items():
+                if family.lower() == stem.lower():
+                    candidates += family_files
+
+            path = self._find_first(candidates)
+
+        if path is None:
+            path = self.default_font_path()
+
+        self._resolved[font_name] = path
+        return path
+
+    def get_font(self, font_name: Optional[str], font_size: int) -> ImageFont.ImageFont:
+        path = self.resolve(font_name)
+        key = (path, font_size)
+
+        with self._lock:
+            font = self._faces.get(key)
+            if font is not None:
+                self._faces.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+
+        try:
+            if path is None:
+                raise IOError("no font file")
+            font = ImageFont.truetype(path, font_size)
+        except IOError:
+            print(f"шрифт не знайдено, використовуємо стандартний")
+            font = ImageFont.load_default()
+
+        with self._lock:
+            self._faces[key] = font
+            self._faces.move_to_end(key)
+            while len(self._faces) > self.max_faces:
+                self._faces.popitem(last=False)
+
+        return font
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "faces": len(self._faces),
+                "max_faces": self.max_faces,
+                "indexed_files": len(self._index) if self._index is not None else 0,
+            }
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_font_registry() -> FontRegistry:
+    global _default_registry
+
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = FontRegistry()
+                get_metrics().register_collector("font_registry", _default_registry.get_stats)
+
+    return _default_registry
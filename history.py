@@ -0,0 +1,260 @@
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from render_engine import replay_operations
+
+
+DEFAULT_HISTORY_BYTES = 256 * 1024 * 1024
+DEFAULT_UNDO_TARGET_MS = 50.0
+DEFAULT_MAX_STEPS = 200
+CALIBRATION_BYTES = 1024 * 1024
+
+
+def _compress(pixels: np.ndarray) -> bytes:
+    return zlib.compress(np.ascontiguousarray(pixels).data, 1)
+
+
+def _decompress(data: bytes, shape: Tuple[int, ...], dtype) -> np.ndarray:
+    return np.frombuffer(bytearray(zlib.decompress(data)), dtype=dtype).reshape(shape)
+
+
+def get_dirty_rect(previous: np.ndarray, current: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    # рамка всіх змінених пікселів; канали розгортаються в рядок, тож зміна будь-якого каналу помітна
+    height, width = current.shape[:2]
+    diff = cv2.absdiff(previous, current).reshape(height, -1)
+    x, y, w, h = cv2.boundingRect(diff)
+    if w == 0 or h == 0:
+        return None
+    channels = current.shape[2] if current.ndim == 3 else 1
+    return x // channels, y, -(-(x + w) // channels), y + h
+
+
+def get_delta(previous: np.ndarray, current: np.ndarray) -> Optional[List]:
+    # пікселі previous під зміненою рамкою — дельта для push, коли current отримано не операцією на місці
+    if previous is None or previous.shape != current.shape:
+        return None
+    rect = get_dirty_rect(previous, current)
+    if rect is None:
+        return []
+    x0, y0, x1, y1 = rect
+    return [(rect, previous[y0:y1, x0:x1])]
+
+
+def _writable(image: np.ndarray) -> np.ndarray:
+    return image if image.flags.writeable else image.copy()
+
+
+class Checkpoint:
+    # стиснутий кадр, від якого можна повторювати операції
+    def __init__(self, image: np.ndarray):
+        self.shape = image.shape
+        self.dtype = image.dtype
+        self.data = _compress(image)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def decode(self) -> np.ndarray:
+        return _decompress(self.data, self.shape, self.dtype)
+
+
+class Delta:
+    # стиснуті пікселі під прямокутниками, які перемалювала операція
+    def __init__(self, regions: List[Tuple[Tuple[int, int, int, int], np.ndarray]]):
+        self.regions = [(rect, pixels.shape, pixels.dtype, _compress(pixels)) for rect, pixels in regions]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(data) for _, _, _, data in self.regions)
+
+    def revert(self, image: np.ndarray) -> np.ndarray:
+        # у зворотному порядку, бо прямокутники шарів можуть перекриватись
+        for (x0, y0, x1, y1), shape, dtype, data in reversed(self.regions):
+            image[y0:y1, x0:x1] = _decompress(data, shape, dtype)
+        return image
+
+
+class HistoryState:
+    def __init__(self, operations: Tuple[Dict, ...], cost_ms: float = 0.0):
+        self.operations = operations
+        # оцінка часу повтору операцій від найближчого чекпойнта
+        self.cost_ms = cost_ms
+        self.checkpoint = None
+        # як повернутись до попереднього стану без повтору операцій
+        self.delta = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(item.nbytes for item in (self.checkpoint, self.delta) if item is not None)
+
+    def extends(self, other: "HistoryState") -> bool:
+        if len(other.operations) > len(self.operations):
+            return False
+        return all(a is b for a, b in zip(other.operations, self.operations))
+
+
+class EditHistory:
+    # крок історії — це список операцій, а не кадр. Назад по операції з Delta
+    # повертаються відновленням прямокутників, вперед — повтором однієї операції,
+    # а решта станів будується повтором від найближчого чекпойнта.
+    # Чекпойнт робиться лише тоді, коли повтор довший за target_ms і за розпакування
+    # самого чекпойнта; найстаріші дані витісняються понад max_bytes
+    def __init__(self, max_bytes: int = DEFAULT_HISTORY_BYTES, target_ms: float = DEFAULT_UNDO_TARGET_MS,
+                 max_steps: int = DEFAULT_MAX_STEPS):
+        self.max_bytes = max_bytes
+        self.target_ms = target_ms
+        self.max_steps = max_steps
+
+        self.states = [HistoryState(())]
+        self.position = 0
+        self.bytes_held = 0
+        # кадр змінено поза історією, і він не відповідає поточному стану
+        self.detached = False
+        self.restore_ms_per_byte = None
+
+    @property
+    def current(self) -> HistoryState:
+        return self.states[self.position]
+
+    def can_undo(self) -> bool:
+        return self.position > 0 or self.detached
+
+    def can_redo(self) -> bool:
+        return self.position < len(self.states) - 1
+
+    def clear(self) -> None:
+        self.states = [HistoryState(())]
+        self.position = 0
+        self.bytes_held = 0
+        self.detached = False
+
+    def detach(self) -> None:
+        self.detached = True
+
+    def _calibrate(self, image: np.ndarray) -> None:
+        # швидкість стиснення на шматку кадру; розпакування не повільніше, тож це оцінка зверху
+        sample = np.ascontiguousarray(image).reshape(-1)[:CALIBRATION_BYTES]
+        start = time.perf_counter()
+        _compress(sample)
+        self.restore_ms_per_byte = (time.perf_counter() - start) * 1000 / max(1, sample.nbytes)
+
+    def _should_checkpoint(self, cost_ms: float, image: np.ndarray) -> bool:
+        if cost_ms <= self.target_ms:
+            return False
+        if self.restore_ms_per_byte is None:
+            self._calibrate(image)
+        return cost_ms > image.nbytes * self.restore_ms_per_byte
+
+    def push(self, operations: List[Dict], image: np.ndarray, cost_ms: Optional[float] = None,
+             delta: Optional[List] = None) -> HistoryState:
+        operations = tuple(operations)
+        current = self.current
+        self.detached = False
+        if len(operations) == len(current.operations) and current.extends(HistoryState(operations)):
+            return current
+
+        # нова гілка скасовує всі кроки для повторення
+        for state in self.states[self.position + 1:]:
+            self.bytes_held -= state.nbytes
+        del self.states[self.position + 1:]
+
+        state = HistoryState(operations)
+        parent = current if state.extends(current) and len(operations) == len(current.operations) + 1 else None
+        # delta — пікселі кадру поточного стану під зміненими прямокутниками;
+        # її рахує той, хто знає цей кадр, тож операції не мусять продовжувати попередні
+        if delta:
+            state.delta = Delta(delta)
+
+        if operations:
+            # невідома вартість (None) означає, що кадр краще одразу зберегти
+            if cost_ms is None:
+                state.cost_ms = float("inf")
+            else:
+                state.cost_ms = cost_ms + (parent.cost_ms if parent is not None else 0.0)
+
+            if self._should_checkpoint(state.cost_ms, image):
+                state.checkpoint = Checkpoint(image)
+                state.cost_ms = 0.0
+
+        self.bytes_held += state.nbytes
+        self.states.append(state)
+        self.position += 1
+        self._trim()
+        return state
+
+    def _drop(self, state: HistoryState) -> None:
+        self.bytes_held -= state.nbytes
+        state.checkpoint = None
+        state.delta = None
+
+    def _trim(self) -> None:
+        while len(self.states) > self.max_steps:
+            self._drop(self.states.pop(0))
+            self.position -= 1
+
+        # найстаріші дані йдуть першими; поточний стан не чіпаємо
+        for state in self.states:
+            if self.bytes_held <= self.max_bytes:
+                break
+            if state is not self.current:
+                self._drop(state)
+
+    def build_image(self, state: HistoryState, base: np.ndarray, scale: float = 1.0) -> np.ndarray:
+        # найдовший префікс операцій, для якого є збережений кадр
+        start, nearest = 0, None
+        for candidate in self.states:
+            if candidate.checkpoint is not None and len(candidate.operations) >= start \
+                    and state.extends(candidate):
+                start, nearest = len(candidate.operations), candidate
+
+        if nearest is None:
+            image = base.copy()
+        else:
+            decode_start = time.perf_counter()
+            image = nearest.checkpoint.decode()
+            self.restore_ms_per_byte = (time.perf_counter() - decode_start) * 1000 / image.nbytes
+
+        return replay_operations(image, state.operations[start:], scale)
+
+    def undo(self, image: np.ndarray, base: np.ndarray, scale: float = 1.0) -> Optional[np.ndarray]:
+        if self.detached:
+            # спершу відкидаємо незафіксовані зміни
+            self.detached = False
+            return self.build_image(self.current, base, scale)
+
+        if not self.can_undo():
+            return None
+
+        state = self.current
+        self.position -= 1
+        if state.delta is not None:
+            return state.delta.revert(_writable(image))
+        return self.build_image(self.current, base, scale)
+
+    def redo(self, image: np.ndarray, base: np.ndarray, scale: float = 1.0) -> Optional[np.ndarray]:
+        if not self.can_redo():
+            return None
+
+        previous = self.current
+        self.position += 1
+        state = self.current
+        if not self.detached and state.extends(previous):
+            return replay_operations(_writable(image), state.operations[len(previous.operations):], scale)
+
+        self.detached = False
+        return self.build_image(state, base, scale)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "steps": len(self.states),
+            "position": self.position,
+            "checkpoints": sum(1 for state in self.states if state.checkpoint is not None),
+            "deltas": sum(1 for state in self.states if state.delta is not None),
+            "bytes_held": self.bytes_held,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,9 +1,38 @@
 import cv2
 import numpy as np
-import os
-from PIL import Image, ImageDraw, ImageFont
-from typing import Tuple, List, Dict, Optional, Union
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Tuple, List, Dict, Optional, Union
 from utils import TextPosition
+from buffer_pool import BufferPool
+from font_registry import get_font_registry
+from filters import FILTER_REGISTRY, resolve_filter_name
+from render_engine import (decode_image, load_template, render, replay_operations,
+                           get_spec_filters, get_spec_layers, draw_layers)
+from meme_document import MemeDocument
+from history import EditHistory, get_delta
+from image_source import ImageSource, open_preview
+from encoder import encode_buffer, write_image
+from metrics import span, trace
+
+
+def build_proxy(image: np.ndarray, proxy_size: Optional[Tuple[int, int]],
+                full_width: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    # image може бути вже зменшеним декодером; масштаб рахується від повної ширини
+    h, w = image.shape[:2]
+    full_width = full_width or w
+    
+    if proxy_size is None:
+        return image, w / full_width
+    
+    fit = min(proxy_size[0] / w, proxy_size[1] / h)
+    if fit >= 1:
+        return image, w / full_width
+    
+    new_width, new_height = max(1, int(w * fit)), max(1, int(h * fit))
+    with span("resize.proxy"):
+        proxy = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    return proxy, new_width / full_width
 
 
 class ImageProcessor:
@@ -13,191 +42,285 @@ class ImageProcessor:
         self.height = 0
         self.width = 0
         
+        self.source = None
+        self.operations = []
+        self.proxy_size = None
+        self.proxy_scale = 1.0
+        self.document = MemeDocument()
+        self.history = EditHistory()
+        # кадр поточного стану історії, поки поверх нього показуються незафіксовані перегляди
+        self._recorded_image = None
+        # проміжні буфери фільтрів і повнорозмірні кадри для збереження
+        self.buffer_pool = BufferPool()
+        
+        self.font_registry = get_font_registry()
         self.default_font_path = self.get_system_font_with_cyrillic()
 
     def get_system_font_with_cyrillic(self) -> str:
-        font_paths = []
-        
-        if os.name == 'nt':
-            font_paths = [
-                os.path.join(os.environ['WINDIR'], 'Fonts', 'arial.ttf'),
-                os.path.join(os.environ['WINDIR'], 'Fonts', 'arialbd.ttf'),
-                os.path.join(os.environ['WINDIR'], 'Fonts', 'times.ttf'),
-                os.path.join(os.environ['WINDIR'], 'Fonts', 'segoeui.ttf'),
-                os.path.join(os.environ['WINDIR'], 'Fonts', 'tahoma.ttf'),
-            ]
-        elif os.name == 'posix':
-            font_paths = [
-                '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-                '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
-                '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
-            ]
-        elif os.name == 'mac':
-            font_paths = [
-                '/Library/Fonts/Arial.ttf',
-                '/Library/Fonts/Times New Roman.ttf',
-                '/System/Library/Fonts/Helvetica.ttc',
-            ]
-        
-        for path in font_paths:
-            if os.path.exists(path):
-                return path
+        return self.font_registry.default_font_path()
+
+    @property
+    def source_image(self) -> Optional[np.ndarray]:
+        # повний кадр; якщо він ще декодується у фоні, чекаємо на нього
+        return self.source.get() if self.source is not None else None
+
+    def enable_proxy(self, max_width: int, max_height: int) -> None:
+        self.proxy_size = (max_width, max_height)
+        if self.source is not None:
+            self._rebuild_working_copy()
+
+    def disable_proxy(self) -> None:
+        self.proxy_size = None
+        if self.source is not None:
+            self._rebuild_working_copy()
+
+    def _rebuild_working_copy(self, preview: Optional[np.ndarray] = None) -> None:
+        if preview is None:
+            preview = self.source_image
+        image, scale = build_proxy(preview, self.proxy_size, self.width)
+        self.proxy_scale = scale
+        self.original_image = image
+        self.document.set_base(image, scale)
+        self.image = self._replay(image.copy(), scale)
         
-        return None
+        # збережені кадри історії мають розмір попередньої робочої копії
+        self.history.clear()
+        if self.operations:
+            self.history.push(self.operations, self.image)
+
+    def _replay(self, image: np.ndarray, scale: float) -> np.ndarray:
+        return replay_operations(image, self.operations, scale, self.buffer_pool)
+
+    def set_source(self, source: ImageSource, preview: Optional[np.ndarray] = None) -> None:
+        # preview — зменшена версія того ж кадру, з якої будується робоча копія,
+        # поки повний кадр ще декодується
+        self.source = source
+        self.operations = []
+        self.width, self.height = source.width, source.height
+        self._rebuild_working_copy(preview)
+
+    def set_image(self, image: np.ndarray) -> None:
+        self.set_source(ImageSource.from_array(image))
 
     def load_image(self, image_path: str) -> bool:
         try:
-            self.image = cv2.imread(image_path)
-            if self.image is None:
+            if self.proxy_size is not None:
+                opened = open_preview(image_path, *self.proxy_size)
+                if opened is not None:
+                    self.set_source(*opened)
+                    return True
+            
+            image = decode_image(image_path)
+            if image is None:
                 return False
             
-            self.original_image = self.image.copy()
-            self.height, self.width = self.image.shape[:2]
+            self.set_image(image)
             return True
         except Exception as e:
             print(f"помилка завантаження зображення: {e}")
             return False
 
+    def load_template(self, template_path: str) -> bool:
+        try:
+            image = load_template(template_path)
+            if image is None:
+                return False
+            
+            self.set_image(image)
+            return True
+        except Exception as e:
+            print(f"помилка завантаження шаблону: {e}")
+            return False
+
+    def clear_image(self) -> None:
+        # зображення ще не завантажене: старий кадр не можна прочитати як новий результат
+        self.image = None
+        self.original_image = None
+        self.source = None
+        self.operations = []
+        self._recorded_image = None
+        self.width = self.height = 0
+
     def reset_image(self) -> None:
         if self.original_image is not None:
-            self.image = self.original_image.copy()
+            self.operations = []
+            # робоча копія перезаписується на місці, якщо вона власна й того ж розміру
+            image = self.image
+            if image is not None and image.shape == self.original_image.shape and image.flags.writeable \
+                    and not np.may_share_memory(image, self.original_image):
+                np.copyto(image, self.original_image)
+            else:
+                self.image = self.original_image.copy()
+            self.history.push(self.operations, self.image)
 
-    def add_text(self, text: str, position: TextPosition, font_name: str, 
-                 font_size: int, color: Tuple[int, int, int]) -> bool:
+    def apply_spec(self, spec: Dict) -> bool:
         if self.image is None:
             return False
-
+        
         try:
-            image_rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(image_rgb)
-            draw = ImageDraw.Draw(pil_image)
-            font_path = self.default_font_path
-            try:
-                if os.name == 'nt' and font_name in ["Arial", "Times New Roman", "Comic Sans MS", "Courier New", "Impact"]:
-                    system_font = {
-                        "Arial": "arial.ttf",
-                        "Times New Roman": "times.ttf",
-                        "Comic Sans MS": "comic.ttf",
-                        "Courier New": "cour.ttf",
-                        "Impact": "impact.ttf"
-                    }
-                    font_file = system_font.get(font_name)
-                    if font_file:
-                        system_path = os.path.join(os.environ['WINDIR'], 'Fonts', font_file)
-                        if os.path.exists(system_path):
-                            font_path = system_path
-                
-                font = ImageFont.truetype(font_path, font_size)
-            except IOError:
-                print(f"шрифт не знайдено, використовуємо стандартний")
-                font = ImageFont.load_default()
-
-            left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
-            text_width = right - left
-            text_height = bottom - top
-            
-            x = (self.width - text_width) // 2
-            
-            if position == TextPosition.TOP:
-                y = 10
-            elif position == TextPosition.BOTTOM:
-                y = self.height - text_height - 10
-            else:
-                y = (self.height - text_height) // 2
-
-            outline_width = max(2, font_size // 30)
-            
-            for offset_x, offset_y in [(-outline_width, -outline_width), 
-                                       (-outline_width, outline_width), 
-                                       (outline_width, -outline_width), 
-                                       (outline_width, outline_width)]:
-                draw.text((x + offset_x, y + offset_y), text, font=font, fill=(0, 0, 0))
-            
-            draw.text((x, y), text, font=font, fill=color)
-            
-            self.image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            return True
-            
+            with trace("apply_spec"):
+                return self._apply_spec(spec)
         except Exception as e:
-            print(f"помилка додавання тексту: {e}")
+            print(f"помилка рендерингу: {e}")
             return False
 
+    def _apply_spec(self, spec: Dict) -> bool:
+        start = time.perf_counter()
+        undo = None
+        # у режимі проксі операція виконується над зменшеною копією,
+        # а запис у operations дозволяє повторити її в повній роздільності
+        if not get_spec_filters(spec) and self.image.flags.writeable:
+            # лише текст: запам'ятовуємо пікселі під ним, щоб скасування було миттєвим;
+            # поверх незафіксованого перегляду ці пікселі не належать жодному стану історії
+            undo = [] if not self.history.detached else None
+            height, width = self.image.shape[:2]
+            draw_layers(self.image, get_spec_layers(dict(spec, scale=self.proxy_scale), (width, height)), undo)
+        else:
+            self.image = render(dict(spec, image_array=self.image, scale=self.proxy_scale, in_place=True,
+                                     pool=self.buffer_pool))
+        self.operations.append(spec)
+        with span("history.push"):
+            self.history.push(self.operations, self.image, (time.perf_counter() - start) * 1000, undo)
+        return True
+
+    def set_rendered(self, spec: Dict, image: np.ndarray, record: bool = False,
+                     cost_ms: Optional[float] = None) -> None:
+        # результат render(spec) над original_image, отриманий поза процесором;
+        # cost_ms — час рендерингу з нуля: повний кадр в історії зберігається лише тоді,
+        # коли повтор spec повільніший за ціль скасування, інакше крок — це дельта змінених пікселів
+        if not self.history.detached:
+            self._recorded_image = self.image
+        self.operations = [spec]
+        self.image = image
+        if record:
+            delta = get_delta(self._recorded_image, image)
+            self.history.push(self.operations, self.image, cost_ms, delta)
+            self._recorded_image = None
+        else:
+            self.history.detach()
+
+    def can_undo(self) -> bool:
+        return self.history.can_undo()
+
+    def can_redo(self) -> bool:
+        return self.history.can_redo()
+
+    def undo(self) -> bool:
+        if self.image is None:
+            return False
+        
+        image = self.history.undo(self.image, self.original_image, self.proxy_scale)
+        if image is None:
+            return False
+        
+        self.image = image
+        self.operations = list(self.history.current.operations)
+        return True
+
+    def redo(self) -> bool:
+        if self.image is None:
+            return False
+        
+        image = self.history.redo(self.image, self.original_image, self.proxy_scale)
+        if image is None:
+            return False
+        
+        self.image = image
+        self.operations = list(self.history.current.operations)
+        return True
+
+    def add_text(self, text: str, position: TextPosition, font_name: str, 
+                 font_size: int, color: Tuple[int, int, int], outline_width: Optional[int] = None,
+                 outline_color: Tuple[int, int, int] = (0, 0, 0), shadow: bool = False,
+                 fit: bool = False) -> bool:
+        if self.image is None:
+            return False
+
+        return self.apply_spec({"layers": [{
+            "text": text,
+            "position": position,
+            "font": font_name,
+            "font_size": font_size,
+            "color": color,
+            "outline_width": outline_width,
+            "outline_color": outline_color,
+            "shadow": shadow,
+            "fit": fit,
+        }]})
+
     def apply_filter(self, filter_name: str) -> bool:
         if self.image is None:
             print("помилка: зображення не завантажено")
             return False
         
-        try:
-            print(f"застосовую фільтр: {filter_name}")
-            
-            if filter_name == "Чорно-білий":
-                gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-                self.image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-                
-            elif filter_name == "Розмиття":
-                self.image = cv2.GaussianBlur(self.image, (15, 15), 0)
-                
-            elif filter_name == "Різкість":
-                kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
-                self.image = cv2.filter2D(self.image, -1, kernel)
-                
-            elif filter_name == "Сепія":
-                sepia_kernel = np.array([[0.272, 0.534, 0.131],
-                                         [0.349, 0.686, 0.168],
-                                         [0.393, 0.769, 0.189]])
-                self.image = cv2.transform(self.image, sepia_kernel)
-                
-            elif filter_name == "Виділення країв":
-                gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-                edges = cv2.Canny(gray, 100, 200)
-                self.image = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
-                
-            elif filter_name == "Негатив":
-                self.image = cv2.bitwise_not(self.image)
-                
-            elif filter_name == "Вінтаж":
-                hsv = cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV)
-                hsv = hsv.astype(np.float32)
-                hsv[:, :, 1] = hsv[:, :, 1] * 0.6
-                
-                hsv[:, :, 0] = hsv[:, :, 0] * 0.8
-                hsv = np.clip(hsv, 0, 255).astype(np.uint8)
-                
-                self.image = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-                
-                noise = np.zeros(self.image.shape, np.uint8)
-                cv2.randu(noise, 0, 50)
-                self.image = cv2.add(self.image, noise)
-                
-                self.image = cv2.GaussianBlur(self.image, (3, 3), 0)
-            else:
-                print(f"невідомий фільтр: {filter_name}")
-                return False
-            
-            print(f"фільтр {filter_name} успішно застосовано")
-            return True
-            
-        except Exception as e:
-            print(f"помилка застосування фільтру: {e}")
-            import traceback
-            traceback.print_exc()
+        if resolve_filter_name(filter_name) not in FILTER_REGISTRY:
+            print(f"невідомий фільтр: {filter_name}")
             return False
+        
+        return self.apply_spec({"filters": [filter_name]})
 
-    def save_image(self, save_path: str) -> bool:
+    def apply_filters(self, filter_names: List[str]) -> bool:
+        if self.image is None:
+            print("помилка: зображення не завантажено")
+            return False
+        
+        return self.apply_spec({"filters": list(filter_names)})
+
+    def render_full_image(self) -> Optional[np.ndarray]:
+        if self.image is None:
+            return None
+        
+        if self.proxy_scale == 1.0:
+            return self.image
+        
+        return self._replay(self.source_image.copy(), 1.0)
+
+    @contextmanager
+    def _full_image(self) -> Iterator[np.ndarray]:
+        # для збереження: повний кадр у буфері з пулу, який повертається після кодування
+        if self.proxy_scale == 1.0:
+            yield self.image
+            return
+
+        source = self.source_image
+        buffer = self.buffer_pool.acquire(source.shape, source.dtype)
+        try:
+            np.copyto(buffer, source)
+            yield self._replay(buffer, 1.0)
+        finally:
+            self.buffer_pool.release(buffer)
+
+    def save_image(self, save_path: Union[str, BinaryIO], image_format: Optional[str] = None,
+                   **options) -> bool:
+        # save_path — шлях або двійковий потік; options — параметри енкодера (quality, max_bytes, ...)
         if self.image is None:
             return False
             
         try:
-            return cv2.imwrite(save_path, self.image)
+            with self._full_image() as image:
+                write_image(image, save_path, image_format, **options)
+            return True
         except Exception as e:
             print(f"помилка збереження зображення: {e}")
             return False
 
+    def encode_image(self, image_format: str = ".png", **options) -> Optional[memoryview]:
+        if self.image is None:
+            return None
+
+        try:
+            with self._full_image() as image:
+                return encode_buffer(image, image_format, **options)
+        except Exception as e:
+            print(f"помилка кодування зображення: {e}")
+            return None
+
     def get_image_for_qt(self) -> np.ndarray:
         if self.image is None:
             return np.zeros((100, 100, 3), dtype=np.uint8)
             
-        return cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        with span("convert"):
+            return cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
 
     def resize_image(self, max_width: int, max_height: int) -> np.ndarray:
         if self.image is None:
@@ -209,13 +332,14 @@ class ImageProcessor:
             
             scale = min(max_width / w, max_height / h)
             
+            resized = self.image
             if scale < 1:
                 new_width = int(w * scale)
                 new_height = int(h * scale)
-                resized = cv2.resize(self.image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+                with span("resize"):
+                    resized = cv2.resize(self.image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+            with span("convert"):
                 return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-            else:
-                return cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
         except Exception as e:
             print(f"помилка зміни розміру зображення: {e}")
             import traceback
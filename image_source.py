@@ -0,0 +1,114 @@
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from metrics import span
+from render_engine import decode_image
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+
+EXIF_ORIENTATION = 0x0112
+# орієнтації EXIF, за яких ширина й висота міняються місцями
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+_decode_executor = None
+_decode_executor_lock = threading.Lock()
+
+
+def _get_decode_executor() -> "ThreadPoolExecutor":
+    global _decode_executor
+
+    with _decode_executor_lock:
+        if _decode_executor is None:
+            # concurrent.futures тягне logging; потрібен лише при першому фоновому декодуванні
+            from concurrent.futures import ThreadPoolExecutor
+            _decode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decode")
+        return _decode_executor
+
+
+def probe_image(image_path: str) -> Optional[Tuple[int, int]]:
+    # лише заголовок: розміри з урахуванням EXIF-орієнтації, як їх поверне cv2.imread
+    try:
+        with Image.open(image_path) as image:
+            width, height = image.size
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    except (OSError, ValueError):
+        return None
+
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def get_reduction_factor(width: int, height: int, min_width: int, min_height: int) -> int:
+    # найбільше зменшення декодера, після якого кадр ще не менший за потрібний
+    for factor in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if width // factor >= min_width and height // factor >= min_height:
+            return factor
+    return 1
+
+
+def decode_reduced(image_path: str, factor: int) -> Optional[np.ndarray]:
+    # для JPEG зменшення відбувається ще в DCT, тож повний кадр не декодується
+    with span("decode.reduced"):
+        return cv2.imread(image_path, REDUCED_DECODE_FLAGS[factor])
+
+
+class ImageSource:
+    # повнорозмірне зображення, яке може декодуватись у фоні лише тоді, коли знадобиться
+    def __init__(self, image_path: Optional[str] = None, image: Optional[np.ndarray] = None,
+                 size: Optional[Tuple[int, int]] = None):
+        self.image_path = image_path
+        self._image = image
+        self._future: Optional["Future"] = None
+
+        if image is not None:
+            size = (image.shape[1], image.shape[0])
+        self.width, self.height = size or (0, 0)
+
+    @classmethod
+    def from_array(cls, image: np.ndarray) -> "ImageSource":
+        return cls(image=image)
+
+    def start(self) -> None:
+        if self._image is None and self._future is None:
+            self._future = _get_decode_executor().submit(decode_image, self.image_path)
+
+    def is_ready(self) -> bool:
+        return self._image is not None or (self._future is not None and self._future.done())
+
+    def get(self) -> Optional[np.ndarray]:
+        if self._image is not None:
+            return self._image
+        self.start()
+        return self._future.result()
+
+
+def open_preview(image_path: str, max_width: int, max_height: int) -> Optional[Tuple[ImageSource, np.ndarray]]:
+    size = probe_image(image_path)
+    if size is None:
+        return None
+
+    width, height = size
+    fit = min(1.0, max_width / width, max_height / height)
+    factor = get_reduction_factor(width, height, int(width * fit), int(height * fit))
+
+    preview = decode_reduced(image_path, factor)
+    if preview is None:
+        return None
+
+    source = ImageSource(image_path, size=size)
+    source.start()
+    return source, preview
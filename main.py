@@ -1,16 +1,28 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtGui import QFontDatabase
-
-from ui import MemeGeneratorUI
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        from batch_render import main as render_main
+        sys.exit(render_main(sys.argv[2:]))
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from server import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "tiled":
+        from tiled import main as tiled_main
+        sys.exit(tiled_main(sys.argv[2:]))
+    
     templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
     if not os.path.exists(templates_dir):
         os.makedirs(templates_dir)
     
+    # PyQt5 потрібен лише вікну; render, serve і tiled запускаються без нього
+    from PyQt5.QtWidgets import QApplication
+    from ui import MemeGeneratorUI
+    
     app = QApplication(sys.argv)
     
     
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from filters import FilterSpec, ImageFilter
+from render_engine import apply_filters, get_spec_filters, get_spec_layers, make_text_sprite, draw_sprite
+from metrics import count, trace
+from text_renderer import TextSprite
+
+
+SPRITE_KEYS = ("text", "font", "font_size", "color", "outline_width", "outline_color", "shadow")
+
+
+def get_filter_key(spec: FilterSpec):
+    if isinstance(spec, ImageFilter):
+        return id(spec)
+    if isinstance(spec, dict):
+        return json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    return spec
+
+
+def get_sprite_key(layer: Dict) -> Tuple:
+    return tuple(tuple(value) if isinstance(value, list) else value
+                 for value in (layer[key] for key in SPRITE_KEYS))
+
+
+class MemeDocument:
+    # стек шарів: основа -> ланцюжок фільтрів -> текстові шари.
+    # результат фільтрів кешується за версією основи й параметрами фільтрів,
+    # спрайти тексту — лише за власними параметрами, тож редагування підпису
+    # не перезапускає фільтри, а зміна фільтра не перемальовує текст
+    def __init__(self):
+        self.base = None
+        self.base_version = 0
+        self.scale = 1.0
+
+        self.filters = []
+        self.text_layers = []
+
+        self.filter_runs = 0
+        self.filter_hits = 0
+        self.sprite_builds = 0
+        self.sprite_hits = 0
+        # скільки коштував би останній рендер без кешів — оцінка повтору для історії
+        self.last_cost_ms = 0.0
+
+        self._lock = threading.Lock()
+        self._filtered = None
+        self._filtered_key = None
+        self._filtered_ms = 0.0
+        self._sprites = {}
+
+    def set_base(self, image: np.ndarray, scale: float = 1.0) -> None:
+        # власний вигляд лише для читання, щоб кеш не змінився через чужий масив
+        base = image.view()
+        base.setflags(write=False)
+
+        with self._lock:
+            self.base = base
+            self.base_version += 1
+            if scale != self.scale:
+                self._sprites.clear()
+            self.scale = scale
+            self._filtered = None
+            self._filtered_key = None
+
+    def set_filters(self, filters: List[FilterSpec]) -> None:
+        with self._lock:
+            self.filters = list(filters)
+
+    def set_text_layers(self, layers: List[Dict]) -> None:
+        # шари вже розв'язані get_spec_layers з урахуванням масштабу
+        with self._lock:
+            self.text_layers = list(layers)
+
+    def _get_filtered(self) -> np.ndarray:
+        key = (self.base_version, self.scale, tuple(get_filter_key(f) for f in self.filters))
+        if key == self._filtered_key:
+            self.filter_hits += 1
+            count("document.filter_hits")
+            return self._filtered
+
+        filtered = self.base
+        start = time.perf_counter()
+        if self.filters:
+            filtered = apply_filters(self.base, self.filters, self.scale)
+            filtered.setflags(write=False)
+            self.filter_runs += 1
+            count("document.filter_runs")
+
+        self._filtered = filtered
+        self._filtered_key = key
+        self._filtered_ms = (time.perf_counter() - start) * 1000
+        return filtered
+
+    def _get_sprite(self, layer: Dict, sprites: Dict[Tuple, TextSprite]) -> TextSprite:
+        key = get_sprite_key(layer)
+        sprite = sprites.get(key) or self._sprites.get(key)
+
+        if sprite is None:
+            sprite = make_text_sprite(layer["text"], layer["font"], layer["font_size"], layer["color"],
+                                      layer["outline_width"], layer["outline_color"], layer["shadow"])
+            self.sprite_builds += 1
+            count("document.sprite_builds")
+        elif key not in sprites:
+            self.sprite_hits += 1
+            count("document.sprite_hits")
+
+        sprites[key] = sprite
+        return sprite
+
+    def _render(self) -> Optional[np.ndarray]:
+        if self.base is None:
+            return None
+
+        start = time.perf_counter()
+        filtered_runs = self.filter_runs
+        filtered = self._get_filtered()
+        # фільтри з кешу коштують стільки, скільки коштував їхній останній прогін
+        cached_ms = self._filtered_ms if self.filter_runs == filtered_runs else 0.0
+        if not self.text_layers:
+            self.last_cost_ms = (time.perf_counter() - start) * 1000 + cached_ms
+            return filtered
+
+        image = filtered.copy()
+        count("bytes_allocated.copy", image.nbytes)
+        sprites = {}
+        for layer in self.text_layers:
+            draw_sprite(image, self._get_sprite(layer, sprites), layer["position"], layer["margin"])
+
+        # лишаємо тільки спрайти поточних шарів
+        self._sprites = sprites
+        self.last_cost_ms = (time.perf_counter() - start) * 1000 + cached_ms
+        return image
+
+    def render(self) -> Optional[np.ndarray]:
+        with self._lock:
+            return self._render()
+
+    def render_spec(self, spec: Dict) -> Optional[np.ndarray]:
+        filters = get_spec_filters(spec)
+        base = self.base
+        image_size = (base.shape[1], base.shape[0]) if base is not None else None
+        layers = get_spec_layers(dict(spec, scale=self.scale), image_size)
+
+        with self._lock, trace("document.render"):
+            self.filters = filters
+            self.text_layers = layers
+            return self._render()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "filter_runs": self.filter_runs,
+                "filter_hits": self.filter_hits,
+                "sprite_builds": self.sprite_builds,
+                "sprite_hits": self.sprite_hits,
+                "cached_sprites": len(self._sprites),
+            }
@@ -1,75 +1,336 @@
 import os
 import random
-from typing import List, Dict, Tuple, Optional
+import threading
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Dict, Tuple, Optional, Union
+
+import numpy as np
+from encoder import normalize_format
+from filters import FilterPipeline
 from image_processor import ImageProcessor
-from utils import TextPosition, MEME_TEMPLATES
+from image_source import probe_image
+from render_cache import RenderCache, get_template_source_key, hash_file
+from render_engine import (get_template_path, load_template, decode_image, apply_filters, get_spec_filters,
+                           get_spec_layers, map_bounded, render_variant)
+from template_store import get_template_store
+from utils import TextPosition, MEME_TEMPLATES, DEFAULT_FONTS
 
 
 class MemeGenerator:
-    def __init__(self, image_processor: ImageProcessor):
+    def __init__(self, image_processor: ImageProcessor, render_cache: Optional[RenderCache] = None):
         self.image_processor = image_processor
         self.custom_texts = []
         self.templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
         
+        # з кешем рендерів generate_meme і auto_generate_meme лише запам'ятовують, що рендерити,
+        # а save_meme на влучанні копіює готовий файл, не декодуючи джерело
+        self.render_cache = render_cache
+        self.last_cache_hit = False
+        self._cache_source = None
+        self._pending_load = None
+        
         if not os.path.exists(self.templates_dir):
             os.makedirs(self.templates_dir)
 
     def add_text_to_meme(self, text: str, position: TextPosition, font_path: str, 
-                        font_size: int, color: Tuple[int, int, int]) -> bool:
-        return self.image_processor.add_text(text, position, font_path, font_size, color)
+                        font_size: int, color: Tuple[int, int, int], outline_width: Optional[int] = None,
+                        outline_color: Tuple[int, int, int] = (0, 0, 0), shadow: bool = False,
+                        fit: bool = False) -> bool:
+        if not self._materialize():
+            return False
+        self._cache_source = None
+        return self.image_processor.add_text(text, position, font_path, font_size, color,
+                                             outline_width, outline_color, shadow, fit)
     
     def add_caption(self, top_text: str = "", bottom_text: str = "", font_path: str = "", 
-                   font_size: int = 120, color: Tuple[int, int, int] = (255, 255, 255)) -> bool:
+                   font_size: int = 120, color: Tuple[int, int, int] = (255, 255, 255),
+                   outline_width: Optional[int] = None, outline_color: Tuple[int, int, int] = (0, 0, 0),
+                   shadow: bool = False, fit: bool = False) -> bool:
         success = True
         
         if top_text:
             success = success and self.add_text_to_meme(
-                top_text, TextPosition.TOP, font_path, font_size, color
+                top_text, TextPosition.TOP, font_path, font_size, color,
+                outline_width, outline_color, shadow, fit
             )
             
         if bottom_text:
             success = success and self.add_text_to_meme(
-                bottom_text, TextPosition.BOTTOM, font_path, font_size, color
+                bottom_text, TextPosition.BOTTOM, font_path, font_size, color,
+                outline_width, outline_color, shadow, fit
             )
             
         return success
     
     def get_template_path(self, template_name: str) -> Optional[str]:
-        template_extensions = [".jpg", ".jpeg", ".png"]
+        return get_template_path(template_name, self.templates_dir)
+    
+    def get_template_cache_stats(self) -> Dict[str, float]:
+        return get_template_store(self.templates_dir).get_stats()
+    
+    def render_on_processor(self, spec: Dict) -> bool:
+        if not self._materialize():
+            return False
+        self._cache_source = None
         
-        for ext in template_extensions:
-            path = os.path.join(self.templates_dir, f"{template_name}{ext}")
-            if os.path.exists(path):
-                return path
+        if self.image_processor.original_image is None:
+            return False
         
-        return None
+        self.image_processor.reset_image()
+        return self.image_processor.apply_spec(spec)
     
-    def auto_generate_meme(self, template_name: str, custom_texts: List[str] = None) -> bool:
-        template_path = self.get_template_path(template_name)
+    def _defer(self, source_key: str, image_path: str, load, spec: Dict) -> bool:
+        # помилки специфікації мають проявитись тут, як і без кешу, а не лише при збереженні
+        # розмір із заголовка потрібен підбору підписів ("fit"); без нього перевіряються лише шари
+        try:
+            get_spec_layers(spec, probe_image(image_path))
+            FilterPipeline(get_spec_filters(spec))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"помилка рендерингу: {e}")
+            return False
         
-        if not template_path or template_name not in MEME_TEMPLATES:
+        # попереднє зображення процесора не є результатом цього рендеру
+        self.image_processor.clear_image()
+        self._cache_source = (source_key, spec)
+        self._pending_load = load
+        return True
+    
+    def _materialize(self) -> bool:
+        # рендер, відкладений до першої потреби в самому зображенні
+        load, self._pending_load = self._pending_load, None
+        if load is None:
+            return True
+        
+        cache_source = self._cache_source
+        if not load() or not self.render_on_processor(cache_source[1]):
             return False
+        self._cache_source = cache_source
+        return True
+    
+    def _encode_cached(self, image_format: str, options: Dict) -> Optional[bytes]:
+        source_key, spec = self._cache_source
+        key = self.render_cache.make_key(source_key, spec, image_format, options)
+        data = self.render_cache.get(key)
+        self.last_cache_hit = data is not None
+        if data is not None:
+            return data
+        
+        if not self._materialize():
+            return None
+        data = self.image_processor.encode_image(image_format, **options)
+        if data is None:
+            return None
+        try:
+            self.render_cache.put(key, data)
+        except OSError as e:
+            print(f"не вдалося записати в кеш рендерів: {e}")
+        return data
+    
+    def auto_generate_meme(self, template_name: str, custom_texts: List[str] = None,
+                           font_name: str = DEFAULT_FONTS[0], font_size: int = 36,
+                           color: Tuple[int, int, int] = (255, 255, 255),
+                           filter_name: Optional[str] = None, fit: bool = False) -> bool:
+        template_path = self.get_template_path(template_name)
         
-        if not self.image_processor.load_image(template_path):
+        if not template_path or template_name not in MEME_TEMPLATES:
             return False
         
         template_info = MEME_TEMPLATES[template_name]
-        template_positions = template_info["positions"]
         
-        texts = custom_texts if custom_texts else template_info["template_text"]
+        spec = {
+            "texts": custom_texts if custom_texts else template_info["template_text"],
+            "positions": template_info["positions"],
+            "font": font_name,
+            "font_size": font_size,
+            "color": color,
+            "filter": filter_name,
+            "fit": fit,
+        }
         
-        if len(texts) != len(template_positions):
+        if self.render_cache is not None:
+            try:
+                source_key = get_template_source_key(template_name, template_path)
+            except OSError:
+                return False
+            return self._defer(source_key, template_path,
+                               lambda: self.image_processor.load_template(template_path), spec)
+        
+        if not self.image_processor.load_template(template_path):
             return False
         
-        for i, (text, position) in enumerate(zip(texts, template_positions)):
-            success = self.add_text_to_meme(
-                text, position, "Arial.ttf", 36, (255, 255, 255)
-            )
-            if not success:
+        return self.render_on_processor(spec)
+    
+    def generate_meme(self, image_path: str, texts: List[str], positions: List[TextPosition] = None,
+                      font_name: str = DEFAULT_FONTS[0], font_size: int = 36,
+                      color: Tuple[int, int, int] = (255, 255, 255),
+                      filter_name: Optional[str] = None, fit: bool = False) -> bool:
+        spec = {
+            "texts": texts,
+            "positions": positions,
+            "font": font_name,
+            "font_size": font_size,
+            "color": color,
+            "filter": filter_name,
+            "fit": fit,
+        }
+        
+        if self.render_cache is not None:
+            try:
+                source_key = hash_file(image_path)
+            except OSError:
                 return False
+            return self._defer(source_key, image_path, lambda: self.image_processor.load_image(image_path), spec)
         
-        return True
+        if not self.image_processor.load_image(image_path):
+            return False
+        
+        return self.render_on_processor(spec)
     
+    def generate_animated_meme(self, source_path: str, output_path: str, texts: List[str],
+                               positions: List[TextPosition] = None,
+                               font_name: str = DEFAULT_FONTS[0], font_size: int = 36,
+                               color: Tuple[int, int, int] = (255, 255, 255),
+                               filter_name: Optional[str] = None, workers: Optional[int] = None,
+                               fit: bool = False) -> bool:
+        # кадри проходять той самий конвеєр потоково, ImageProcessor не задіяний
+        spec = {
+            "texts": texts,
+            "positions": positions,
+            "font": font_name,
+            "font_size": font_size,
+            "color": color,
+            "filter": filter_name,
+            "fit": fit,
+        }
+        # модуль анімацій тягне плагіни PIL, які потрібні лише тут
+        from animation import render_animation
+        try:
+            render_animation(source_path, output_path, spec, workers=workers)
+            return True
+        except (ValueError, OSError) as e:
+            print(f"помилка рендерингу анімації: {e}")
+            return False
+
+    def auto_generate_variants(self, template_name: str, caption_sets: Iterable[List[str]],
+                               font_name: str = DEFAULT_FONTS[0], font_size: int = 36,
+                               color: Tuple[int, int, int] = (255, 255, 255),
+                               filter_name: Optional[str] = None, fit: bool = False,
+                               image_format: str = ".jpg", workers: Optional[int] = None,
+                               **options) -> Iterator[Optional[bytes]]:
+        # той самий мем, що й auto_generate_meme, для кожного набору підписів; закодовані файли
+        # віддаються в порядку caption_sets, None — варіант, який не вдалося згенерувати
+        template_path = self.get_template_path(template_name)
+        if not template_path or template_name not in MEME_TEMPLATES:
+            print(f"невідомий шаблон: {template_name}")
+            return
+        
+        template_info = MEME_TEMPLATES[template_name]
+        spec = {
+            "positions": template_info["positions"],
+            "font": font_name,
+            "font_size": font_size,
+            "color": color,
+            "filter": filter_name,
+            "fit": fit,
+        }
+        specs = (dict(spec, texts=list(texts) if texts else template_info["template_text"])
+                 for texts in caption_sets)
+        
+        source_key = None
+        if self.render_cache is not None:
+            try:
+                source_key = get_template_source_key(template_name, template_path)
+            except OSError:
+                return
+        
+        yield from self._render_variants(lambda: load_template(template_path), source_key, specs,
+                                         image_format, workers, options)
+    
+    def generate_variants(self, image_path: str, caption_sets: Iterable[List[str]],
+                          positions: List[TextPosition] = None,
+                          font_name: str = DEFAULT_FONTS[0], font_size: int = 36,
+                          color: Tuple[int, int, int] = (255, 255, 255),
+                          filter_name: Optional[str] = None, fit: bool = False,
+                          image_format: str = ".jpg", workers: Optional[int] = None,
+                          **options) -> Iterator[Optional[bytes]]:
+        spec = {
+            "positions": positions,
+            "font": font_name,
+            "font_size": font_size,
+            "color": color,
+            "filter": filter_name,
+            "fit": fit,
+        }
+        specs = (dict(spec, texts=list(texts)) for texts in caption_sets)
+        
+        source_key = None
+        if self.render_cache is not None:
+            try:
+                source_key = hash_file(image_path)
+            except OSError:
+                return
+        
+        yield from self._render_variants(lambda: decode_image(image_path), source_key, specs,
+                                         image_format, workers, options)
+    
+    def _render_variants(self, load: Callable[[], Optional[np.ndarray]], source_key: Optional[str],
+                         specs: Iterable[Dict], image_format: str, workers: Optional[int],
+                         options: Dict) -> Iterator[Optional[bytes]]:
+        # джерело декодується й фільтрується один раз, при першому промаху кешу; далі всі потоки
+        # малюють підписи на копіях цієї основи лише для читання, не чіпаючи image_processor
+        image_format = normalize_format(image_format)
+        pool = self.image_processor.buffer_pool
+        base_lock = threading.Lock()
+        base = {}
+        
+        def get_base(spec: Dict) -> np.ndarray:
+            with base_lock:
+                if "image" not in base:
+                    image = load()
+                    filters = get_spec_filters(spec)
+                    # декодований кадр фільтрується на місці; шаблон із кешу лише для читання,
+                    # тож його результат пишеться в буфер пулу
+                    base["owned"] = image is not None and image.flags.writeable
+                    if image is not None and filters:
+                        dst = image if base["owned"] else pool.acquire(image.shape, image.dtype)
+                        image = apply_filters(image, filters, dst=dst, pool=pool)
+                        base["owned"] = True
+                    if image is not None:
+                        image.setflags(write=False)
+                    base["image"] = image
+                if base["image"] is None:
+                    raise ValueError("не вдалося завантажити зображення")
+                return base["image"]
+        
+        def render(spec: Dict) -> Optional[bytes]:
+            key = None
+            if source_key is not None:
+                key = self.render_cache.make_key(source_key, spec, image_format, options)
+                data = self.render_cache.get(key)
+                if data is not None:
+                    return data
+            
+            try:
+                data = render_variant(get_base(spec), dict(spec, format=image_format, **options), pool)
+            except Exception as e:
+                print(f"помилка рендерингу варіанта: {e}")
+                return None
+            
+            if key is not None:
+                try:
+                    self.render_cache.put(key, data)
+                except OSError as e:
+                    print(f"не вдалося записати в кеш рендерів: {e}")
+            return data
+        
+        try:
+            yield from map_bounded(render, specs, workers)
+        finally:
+            # map_bounded дочекався потоків, тож основа більше ніким не читається
+            image = base.get("image")
+            if image is not None and base["owned"]:
+                image.setflags(write=True)
+                pool.release(image)
+
     def generate_random_meme(self, custom_texts: List[str] = None) -> bool:
         if not MEME_TEMPLATES:
             return False
@@ -77,5 +338,31 @@ class MemeGenerator:
         template_name = random.choice(list(MEME_TEMPLATES.keys()))
         return self.auto_generate_meme(template_name, custom_texts)
     
-    def save_meme(self, output_path: str) -> bool:
-        return self.image_processor.save_image(output_path) 
\ No newline at end of file
+    def save_meme(self, output_path: Union[str, BinaryIO], image_format: Optional[str] = None,
+                  **options) -> bool:
+        self.last_cache_hit = False
+        if self.render_cache is None or self._cache_source is None:
+            return self._materialize() and self.image_processor.save_image(output_path, image_format, **options)
+        
+        if image_format is None and isinstance(output_path, str):
+            image_format = os.path.splitext(output_path)[1]
+        data = self._encode_cached(normalize_format(image_format or ".png"), options)
+        if data is None:
+            return False
+        
+        try:
+            if isinstance(output_path, str):
+                with open(output_path, "wb") as f:
+                    f.write(data)
+            else:
+                output_path.write(data)
+            return True
+        except OSError as e:
+            print(f"помилка збереження зображення: {e}")
+            return False
+
+    def encode_meme(self, image_format: str = ".png", **options) -> Optional[Union[memoryview, bytes]]:
+        self.last_cache_hit = False
+        if self.render_cache is None or self._cache_source is None:
+            return self.image_processor.encode_image(image_format, **options) if self._materialize() else None
+        return self._encode_cached(normalize_format(image_format), options) 
\ No newline at end of file
@@ -0,0 +1,267 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+
+# межі кошиків гістограм у мілісекундах
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+METRICS_ENV = "MEME_METRICS"
+TRACE_SLOW_ENV = "MEME_TRACE_SLOW_MS"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        # останній кошик — усе, що довше за найбільшу межу
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def cumulative(self) -> List[int]:
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def to_dict(self) -> Dict:
+        cumulative = self.cumulative()
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 3),
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets_ms": {str(le): cumulative[i] for i, le in enumerate(self.buckets)},
+        }
+
+
+class _NullSpan:
+    # вимкнені метрики віддають один спільний об'єкт, який нічого не робить
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> "Span":
+        self.metrics._enter()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        end = time.perf_counter()
+        self.metrics._exit(self.name, self.start, end)
+        return False
+
+
+class Trace:
+    # усі відрізки одного рендерингу в цьому потоці; друкується, якщо рендеринг повільніший за slow_ms
+    def __init__(self, metrics: "Metrics", name: str, slow_ms: float, stream: Optional[TextIO]):
+        self.metrics = metrics
+        self.name = name
+        self.slow_ms = slow_ms
+        self.stream = stream
+        self.spans = []
+        self.total_ms = 0.0
+
+    def __enter__(self) -> "Trace":
+        self.metrics._local.trace = self
+        self.metrics._local.depth = 0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+        self.metrics._local.trace = None
+        self.metrics._observe(self.name, self.total_ms)
+        if self.total_ms >= self.slow_ms:
+            print(self.format(), file=self.stream or sys.stderr)
+        return False
+
+    def format(self) -> str:
+        lines = [f"трасування {self.name}: {self.total_ms:.2f} мс"]
+        # відрізки закриваються зсередини назовні, тож упорядковуємо за початком
+        for name, offset_ms, duration_ms, depth in sorted(self.spans, key=lambda span: (span[1], span[3])):
+            lines.append(f"{'  ' * (depth + 1)}{name:<{40 - 2 * depth}} +{offset_ms:>9.2f} {duration_ms:>9.2f} мс")
+        return "\n".join(lines)
+
+
+class Metrics:
+    # гістограми тривалості етапів, лічильники й зовнішні get_stats() в одному місці процесу
+    def __init__(self, enabled: bool = False, trace_slow_ms: Optional[float] = None):
+        self.enabled = enabled
+        self.trace_slow_ms = trace_slow_ms
+
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = {}
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, trace_slow_ms: Optional[float] = None) -> None:
+        self.enabled = True
+        if trace_slow_ms is not None:
+            self.trace_slow_ms = trace_slow_ms
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name)
+
+    def trace(self, name: str, slow_ms: Optional[float] = None, stream: Optional[TextIO] = None):
+        # вкладене трасування стає частиною зовнішнього
+        slow_ms = self.trace_slow_ms if slow_ms is None else slow_ms
+        if not self.enabled or slow_ms is None or getattr(self._local, "trace", None) is not None:
+            return self.span(name)
+        return Trace(self, name, slow_ms, stream)
+
+    def _enter(self) -> None:
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+
+    def _exit(self, name: str, start: float, end: float) -> None:
+        ms = (end - start) * 1000
+        depth = self._local.depth = self._local.depth - 1
+
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.spans.append((name, (start - trace.start) * 1000, ms, depth))
+        self._observe(name, ms)
+
+    def _observe(self, name: str, ms: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]]) -> None:
+        # collect — get_stats() кешу чи реєстру; викликається лише під час експорту
+        with self._lock:
+            self.collectors[name] = collect
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            histograms = {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+            counters = dict(sorted(self.counters.items()))
+            collectors = dict(self.collectors)
+
+        return {
+            "enabled": self.enabled,
+            "stages": histograms,
+            "counters": counters,
+            "components": {name: collect() for name, collect in sorted(collectors.items())},
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.get_stats(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self, prefix: str = "meme") -> str:
+        stats = self.get_stats()
+        with self._lock:
+            histograms = [(name, histogram.buckets, histogram.cumulative(), histogram.sum_ms)
+                          for name, histogram in sorted(self.histograms.items())]
+
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        for name, buckets, cumulative, sum_ms in histograms:
+            label = _escape_label(name)
+            for le, count in zip(buckets, cumulative):
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{label}",le="{le / 1000:g}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {cumulative[-1]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{label}"}} {sum_ms / 1000:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{label}"}} {cumulative[-1]}')
+
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in stats["counters"].items():
+            lines.append(f'{prefix}_events_total{{event="{_escape_label(name)}"}} {value}')
+
+        lines.append(f"# TYPE {prefix}_component_stat gauge")
+        for component, values in stats["components"].items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{prefix}_component_stat{{component="{_escape_label(component)}",'
+                                 f'stat="{_escape_label(key)}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _read_slow_ms() -> Optional[float]:
+    value = os.environ.get(TRACE_SLOW_ENV)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+_metrics = Metrics(enabled=os.environ.get(METRICS_ENV) == "1" or _read_slow_ms() is not None,
+                   trace_slow_ms=_read_slow_ms())
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def span(name: str):
+    return _metrics.span(name)
+
+
+def trace(name: str, slow_ms: Optional[float] = None, stream: Optional[TextIO] = None):
+    return _metrics.trace(name, slow_ms, stream)
+
+
+def count(name: str, value: int = 1) -> None:
+    if _metrics.enabled:
+        _metrics.count(name, value)
+
+
+def timed(name: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _metrics.enabled:
+                return func(*args, **kwargs)
+            with Span(_metrics, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,81 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from PyQt5.QtCore import QPoint, QRect, QSize
+from PyQt5.QtGui import QImage, QPainter, QPixmap
+from PyQt5.QtWidgets import QLabel
+
+from history import get_dirty_rect
+
+
+class PreviewCanvas(QLabel):
+    # кадр перегляду лежить у постійному буфері BGR, а QImage загортає його без копії й без cvtColor;
+    # QPixmap створюється раз на розмір перегляду, далі в нього перемальовується лише змінена область
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.buffer = None
+        self.qimage = None
+        self.surface = None
+
+        self.full_updates = 0
+        self.partial_updates = 0
+        self.skipped_updates = 0
+
+    def _allocate(self, width: int, height: int) -> None:
+        self.buffer = np.empty((height, width, 3), np.uint8)
+        self.qimage = QImage(self.buffer.data, width, height, self.buffer.strides[0], QImage.Format_BGR888)
+        self.surface = QPixmap(width, height)
+        self.setText("")
+        self.updateGeometry()
+
+    def show_image(self, image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        # image — BGR розміру перегляду; повертає перемальовану область або None, якщо нічого не змінилось
+        height, width = image.shape[:2]
+        if self.buffer is None or self.buffer.shape != image.shape:
+            self._allocate(width, height)
+            dirty = 0, 0, width, height
+            self.full_updates += 1
+        else:
+            dirty = get_dirty_rect(self.buffer, image)
+            if dirty is None:
+                self.skipped_updates += 1
+                return None
+            self.partial_updates += 1
+
+        x0, y0, x1, y1 = dirty
+        np.copyto(self.buffer[y0:y1, x0:x1], image[y0:y1, x0:x1])
+
+        rect = QRect(x0, y0, x1 - x0, y1 - y0)
+        painter = QPainter(self.surface)
+        painter.drawImage(rect.topLeft(), self.qimage, rect)
+        painter.end()
+
+        self.update(rect.translated(self._get_offset()))
+        return dirty
+
+    def _get_offset(self) -> QPoint:
+        # кадр по центру, як у QLabel з AlignCenter
+        contents = self.contentsRect()
+        return QPoint(contents.x() + max(contents.width() - self.surface.width(), 0) // 2,
+                      contents.y() + max(contents.height() - self.surface.height(), 0) // 2)
+
+    def pixmap(self) -> Optional[QPixmap]:
+        return self.surface
+
+    def sizeHint(self) -> QSize:
+        if self.surface is None:
+            return super().sizeHint()
+        return self.surface.size()
+
+    def paintEvent(self, event) -> None:
+        super().paintEvent(event)
+        if self.surface is None:
+            return
+
+        offset = self._get_offset()
+        target = event.rect().intersected(QRect(offset, self.surface.size()))
+        if target.isEmpty():
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(target, self.surface, target.translated(-offset))
+        painter.end()
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from enum import Enum
+from typing import Dict, Optional
+
+from encoder import normalize_format
+from metrics import get_metrics
+from render_engine import ENGINE_VERSION
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# після витіснення лишається така частка бюджету, щоб не чистити на кожному записі
+EVICT_TO = 0.9
+# інші процеси теж пишуть у каталог, тож власний підрахунок час від часу звіряється з диском
+RESCAN_INTERVAL = 60.0
+TEMP_SUFFIX = ".tmp"
+# тимчасові файли старші за це лишилися від процесів, що впали посеред запису
+STALE_TEMP_SECONDS = 3600
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return "sha256:" + digest.hexdigest()
+
+
+def get_template_source_key(template_name: str, template_path: str) -> str:
+    # шаблони не хешуються щоразу: назви й версії файлу досить
+    stat = os.stat(template_path)
+    return f"template:{template_name}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _json_default(value):
+    if isinstance(value, Enum):
+        return value.name
+    raise TypeError(f"значення не серіалізується в ключ кешу: {value!r}")
+
+
+class RenderCache:
+    # закодовані результати рендерингу на диску за хешем джерела, специфікації, формату й версії рушія;
+    # файли пишуться атомарно через os.replace, тож каталог можуть ділити кілька процесів
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.bytes_held = None
+
+        self._lock = threading.Lock()
+        self._scanned_at = 0.0
+
+    def make_key(self, source_key: str, spec: Dict, image_format: str, options: Dict) -> str:
+        payload = json.dumps({
+            "engine": ENGINE_VERSION,
+            "source": source_key,
+            "spec": spec,
+            "format": normalize_format(image_format),
+            "options": options,
+        }, sort_keys=True, ensure_ascii=False, default=_json_default)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def contains(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # час зміни — мітка останнього використання для витіснення
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data) -> None:
+        # файл, більший за весь бюджет, лише витіснив би решту
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        shard_dir = os.path.dirname(path)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=shard_dir, suffix=TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.writes += 1
+            stale = self.bytes_held is None or time.monotonic() - self._scanned_at > RESCAN_INTERVAL
+            if not stale:
+                self.bytes_held += len(data)
+            over_budget = not stale and self.bytes_held > self.max_bytes
+
+        if stale or over_budget:
+            self.evict()
+
+    def _scan(self):
+        entries = []
+        now = time.time()
+        try:
+            shards = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        except OSError:
+            return entries
+
+        for shard in shards:
+            try:
+                files = list(os.scandir(shard))
+            except OSError:
+                continue
+            for entry in files:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(TEMP_SUFFIX):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        _remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> int:
+        # найдавніше використані файли видаляються, доки розмір не впаде до EVICT_TO бюджету
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TO
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                if _remove(path):
+                    removed += 1
+                total -= size
+
+        with self._lock:
+            self.bytes_held = total
+            self._scanned_at = time.monotonic()
+            self.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        for _, _, path in self._scan():
+            _remove(path)
+        with self._lock:
+            self.bytes_held = 0
+            self._scanned_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "bytes_held": self.bytes_held or 0,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _remove(path: str) -> bool:
+    # файл міг уже видалити інший процес
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_render_cache(cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES) -> RenderCache:
+    cache_dir = os.path.abspath(cache_dir)
+
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = RenderCache(cache_dir, max_bytes)
+            _caches[cache_dir] = cache
+            get_metrics().register_collector(f"render_cache:{cache_dir}", cache.get_stats)
+        return cache
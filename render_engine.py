@@ -0,0 +1,304 @@
+import os
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool, borrow
+from encoder import encode_image, get_encode_options
+from metrics import count, span, timed, trace
+from filters import FilterSpec, FilterPipeline, create_filter, get_filter_names
+from font_registry import get_font_registry
+from sprite_cache import get_sprite_cache
+from template_store import get_template_store
+from text_layout import fit_layer
+from text_renderer import TEXT_MARGIN, TextSprite, build_text_sprite, get_text_origin, get_outline_width, get_sprite_rect, composite_sprite
+from utils import TextPosition, MEME_TEMPLATES, DEFAULT_FONTS, parse_color, parse_position, get_default_positions
+
+
+# збільшується, коли змінюється результат рендерингу: старі записи кешу рендерів стають недійсними
+ENGINE_VERSION = 2
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+DEFAULT_FONT_SIZE = 36
+DEFAULT_TEXT_COLOR = (255, 255, 255)
+DEFAULT_OUTLINE_COLOR = (0, 0, 0)
+
+# скільки задач на потік тримає в польоті map_bounded
+TASKS_PER_WORKER = 4
+
+FILTER_NAMES = get_filter_names()
+NO_FILTER = "Оригінал"
+
+
+def get_template_path(template_name: str, templates_dir: str = TEMPLATES_DIR) -> Optional[str]:
+    return get_template_store(templates_dir).get_path(template_name)
+
+
+def decode_image(image_path: str) -> Optional[np.ndarray]:
+    with span("decode"):
+        image = cv2.imread(image_path)
+    if image is not None:
+        count("bytes_allocated.decode", image.nbytes)
+    return image
+
+
+def decode_image_bytes(data: bytes) -> Optional[np.ndarray]:
+    with span("decode"):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        count("bytes_allocated.decode", image.nbytes)
+    return image
+
+
+def load_template(template_path: str) -> Optional[np.ndarray]:
+    return get_template_store(os.path.dirname(template_path)).load(template_path)
+
+
+def make_text_sprite(text: str, font_name: str, font_size: int, color: Tuple[int, int, int],
+                     outline_width: Optional[int] = None,
+                     outline_color: Tuple[int, int, int] = DEFAULT_OUTLINE_COLOR,
+                     shadow: bool = False) -> TextSprite:
+    registry = get_font_registry()
+    if outline_width is None:
+        outline_width = get_outline_width(font_size)
+
+    # ключ за файлом шрифту: різні назви одного файлу ділять спрайт
+    key = (text, registry.resolve(font_name), font_size, tuple(color), outline_width, tuple(outline_color), shadow)
+    cache = get_sprite_cache()
+    sprite = cache.get(key)
+    if sprite is None:
+        with span("text.rasterize"):
+            font = registry.get_font(font_name, font_size)
+            sprite = build_text_sprite(text, font, color, outline_width, outline_color, shadow)
+        cache.put(key, sprite)
+    return sprite
+
+
+@timed("text.composite")
+def draw_sprite(image: np.ndarray, sprite: TextSprite, position: TextPosition,
+                margin: int = TEXT_MARGIN, undo: Optional[List] = None) -> Optional[Tuple[int, int, int, int]]:
+    height, width = image.shape[:2]
+    x, y = get_text_origin(width, height, sprite, position, margin)
+
+    # undo отримує (rect, пікселі під спрайтом до малювання)
+    if undo is not None:
+        rect = get_sprite_rect(image, sprite, x, y)
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            undo.append((rect, image[y0:y1, x0:x1].copy()))
+
+    return composite_sprite(image, sprite, x, y)
+
+
+def draw_text(image: np.ndarray, text: str, position: TextPosition, font_name: str, font_size: int,
+              color: Tuple[int, int, int], outline_width: Optional[int] = None,
+              outline_color: Tuple[int, int, int] = DEFAULT_OUTLINE_COLOR,
+              shadow: bool = False, margin: int = TEXT_MARGIN,
+              undo: Optional[List] = None) -> Optional[Tuple[int, int, int, int]]:
+    sprite = make_text_sprite(text, font_name, font_size, color, outline_width, outline_color, shadow)
+    return draw_sprite(image, sprite, position, margin, undo)
+
+
+def draw_layers(image: np.ndarray, layers: List[Dict], undo: Optional[List] = None) -> None:
+    for layer in layers:
+        draw_text(image, layer["text"], layer["position"], layer["font"], layer["font_size"],
+                  layer["color"], layer["outline_width"], layer["outline_color"], layer["shadow"],
+                  layer["margin"], undo)
+
+
+def apply_filter(image: np.ndarray, filter_name: str) -> np.ndarray:
+    return create_filter(filter_name).apply(image)
+
+
+def apply_filters(image: np.ndarray, filters: List[FilterSpec], scale: float = 1.0,
+                  dst: Optional[np.ndarray] = None, pool: Optional[BufferPool] = None) -> np.ndarray:
+    return FilterPipeline(filters, scale=scale).apply(image, dst, pool)
+
+
+def get_spec_filters(spec: Dict) -> List[FilterSpec]:
+    filters = spec.get("filters")
+    if filters is None:
+        filters = [spec["filter"]] if spec.get("filter") else []
+    return [f for f in filters if f and f != NO_FILTER]
+
+
+def scale_layer(layer: Dict, scale: float) -> None:
+    # товщина обведення рахується від повнорозмірного шрифту, щоб зменшена
+    # копія виглядала як остаточний результат, а не як текст меншого кегля
+    if layer["outline_width"] is None:
+        layer["outline_width"] = get_outline_width(layer["font_size"])
+    layer["outline_width"] = max(1, int(round(layer["outline_width"] * scale))) if layer["outline_width"] else 0
+    layer["font_size"] = max(1, int(round(layer["font_size"] * scale)))
+    layer["margin"] = int(round(layer["margin"] * scale))
+
+
+def get_spec_layers(spec: Dict, image_size: Optional[Tuple[int, int]] = None) -> List[Dict]:
+    # image_size (ширина, висота) потрібен шарам з "fit": підпис переноситься й
+    # зменшується, щоб уміститися в рамку своєї позиції
+    scale = spec.get("scale", 1.0)
+    defaults = {
+        "font": spec.get("font", DEFAULT_FONTS[0]),
+        "font_size": spec.get("font_size", DEFAULT_FONT_SIZE),
+        "color": spec.get("color", DEFAULT_TEXT_COLOR),
+        "outline_width": spec.get("outline_width"),
+        "outline_color": spec.get("outline_color", DEFAULT_OUTLINE_COLOR),
+        "shadow": spec.get("shadow", False),
+        "fit": spec.get("fit", False),
+        "max_lines": spec.get("max_lines"),
+    }
+
+    if "layers" in spec:
+        layers = spec["layers"]
+    else:
+        texts = spec.get("texts") or []
+        positions = spec.get("positions")
+
+        template_info = MEME_TEMPLATES.get(spec.get("template"))
+        if template_info is not None:
+            texts = texts or template_info["template_text"]
+            positions = positions or template_info["positions"]
+        if positions is None:
+            positions = get_default_positions(len(texts))
+
+        if len(texts) != len(positions):
+            raise ValueError("кількість текстів не збігається з кількістю позицій")
+
+        layers = [{"text": text, "position": position} for text, position in zip(texts, positions)]
+
+    resolved = []
+    for layer in layers:
+        if not layer.get("text"):
+            continue
+        merged = dict(defaults)
+        merged.update(layer)
+        merged["position"] = parse_position(merged.get("position", TextPosition.BOTTOM))
+        merged["color"] = parse_color(merged["color"])
+        merged["outline_color"] = parse_color(merged["outline_color"])
+        merged["font_size"] = int(merged["font_size"])
+        merged["margin"] = TEXT_MARGIN
+        if merged["fit"] and image_size is not None:
+            # підбір у повній роздільності, щоб проксі й збережений файл переносили однаково
+            fit_layer(merged, int(round(image_size[0] / scale)), int(round(image_size[1] / scale)))
+        if scale != 1.0:
+            scale_layer(merged, scale)
+        resolved.append(merged)
+
+    return resolved
+
+
+def load_source(spec: Dict) -> np.ndarray:
+    if spec.get("image_array") is not None:
+        image = spec["image_array"]
+    elif spec.get("image_bytes") is not None:
+        image = decode_image_bytes(spec["image_bytes"])
+    elif spec.get("image"):
+        image = decode_image(spec["image"])
+    elif spec.get("template"):
+        template_name = spec["template"]
+        if template_name not in MEME_TEMPLATES:
+            raise ValueError(f"невідомий шаблон: {template_name}")
+        template_path = get_template_path(template_name, spec.get("templates_dir", TEMPLATES_DIR))
+        if template_path is None:
+            raise FileNotFoundError(f"файл шаблону не знайдено: {template_name}")
+        image = load_template(template_path)
+    else:
+        raise ValueError("потрібно вказати template, image, image_bytes або image_array")
+
+    if image is None:
+        raise ValueError("не вдалося декодувати зображення")
+    return image
+
+
+def render(spec: Dict) -> Union[np.ndarray, bytes]:
+    with trace("render"):
+        return _render(spec)
+
+
+def _render(spec: Dict) -> Union[np.ndarray, bytes]:
+    # spec лише читається, а спільні ресурси (шрифти, шаблони) незмінні,
+    # тож render можна викликати з багатьох потоків одночасно
+    image = load_source(spec)
+    # "scale" < 1 означає, що джерело — зменшена копія для попереднього перегляду,
+    # і розміри шрифтів, обведень, відступів та ядер фільтрів зменшуються так само
+    scale = spec.get("scale", 1.0)
+
+    # in_place дозволяє перезаписати переданий image_array: фільтри пишуть у нього ж,
+    # а "pool" дає їм проміжні буфери без нових виділень
+    in_place = spec.get("in_place", False) and image is spec.get("image_array") and image.flags.writeable
+
+    filters = get_spec_filters(spec)
+    if filters:
+        image = apply_filters(image, filters, scale, image if in_place else None, spec.get("pool"))
+
+    owned = in_place or image is not spec.get("image_array")
+
+    layers = get_spec_layers(spec, (image.shape[1], image.shape[0]))
+    if layers and (not image.flags.writeable or not owned):
+        image = image.copy()
+        owned = True
+        count("bytes_allocated.copy", image.nbytes)
+
+    draw_layers(image, layers)
+
+    if spec.get("format"):
+        return encode_image(image, spec["format"], **get_encode_options(spec))
+
+    if not image.flags.writeable or not owned:
+        image = image.copy()
+    return image
+
+
+def replay_operations(image: np.ndarray, operations: List[Dict], scale: float = 1.0,
+                      pool: Optional[BufferPool] = None) -> np.ndarray:
+    for operation in operations:
+        image = render(dict(operation, image_array=image, scale=scale, in_place=True, pool=pool))
+    return image
+
+
+def render_many(specs: Iterable[Dict], max_workers: Optional[int] = None) -> Iterator[Union[np.ndarray, bytes]]:
+    # concurrent.futures тягне logging, а одиночному render() пул не потрібен
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        yield from executor.map(render, specs)
+
+
+def render_variant(base: np.ndarray, spec: Dict, pool: Optional[BufferPool] = None) -> Union[np.ndarray, bytes]:
+    # base — уже відфільтрований кадр, спільний для всіх варіантів і лише для читання;
+    # зі spec беруться тільки підписи, які малюються на власній копії кадру
+    layers = get_spec_layers(spec, (base.shape[1], base.shape[0]))
+    if not spec.get("format"):
+        image = base.copy()
+        draw_layers(image, layers)
+        return image
+
+    # копія потрібна лише до кінця кодування, тож береться з пулу
+    with borrow(pool, base.shape, base.dtype) as image:
+        np.copyto(image, base)
+        draw_layers(image, layers)
+        return encode_image(image, spec["format"], **get_encode_options(spec))
+
+
+def map_bounded(func: Callable, items: Iterable, max_workers: Optional[int] = None,
+                window: Optional[int] = None) -> Iterator:
+    # як executor.map, але в польоті не більше window задач: items може бути довгим генератором,
+    # а результати віддаються в порядку items, щойно готові. Якщо споживач зупиняється,
+    # задачі, що ще не почались, скасовуються
+    from concurrent.futures import ThreadPoolExecutor
+    max_workers = max_workers or os.cpu_count() or 1
+    window = window or max_workers * TASKS_PER_WORKER
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render") as executor:
+        try:
+            for item in items:
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,174 @@
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from animation import is_animation, read_first_frame, render_animation
+from encoder import write_image
+from image_processor import build_proxy
+from image_source import ImageSource, open_preview
+from meme_document import MemeDocument
+from metrics import span
+from render_engine import decode_image, replay_operations
+
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class BackgroundTask(QRunnable):
+    def __init__(self, job_id: int, func: Callable, args: tuple, is_stale: Callable[[int], bool]):
+        super().__init__()
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.is_stale = is_stale
+        self.signals = TaskSignals()
+
+    def run(self) -> None:
+        # задача могла застаріти, поки чекала в черзі
+        if self.is_stale(self.job_id):
+            return
+
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+
+        self.signals.finished.emit(self.job_id, result)
+
+
+class BackgroundWorker(QObject):
+    # виконує задачі поза потоком GUI; кожна нова задача робить попередні
+    # застарілими, і їхні результати відкидаються замість показу.
+    # З drop_stale=False задачі виконуються по черці і кожна повідомляє свій результат
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent: Optional[QObject] = None, drop_stale: bool = True):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.drop_stale = drop_stale
+        self.latest_job = 0
+        self.cancelled_job = 0
+        self.pending = 0
+        self.busy = False
+
+    def is_stale(self, job_id: int) -> bool:
+        if job_id <= self.cancelled_job:
+            return True
+        return self.drop_stale and job_id != self.latest_job
+
+    def submit(self, func: Callable, *args) -> int:
+        self.latest_job += 1
+        if self.drop_stale:
+            # задачі, які ще не почались, просто прибираємо з черги
+            self.pool.clear()
+            self.pending = 0
+
+        task = BackgroundTask(self.latest_job, func, args, self.is_stale)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+
+        self.pending += 1
+        self._set_busy(True)
+        self.pool.start(task)
+        return self.latest_job
+
+    def cancel(self) -> None:
+        self.cancelled_job = self.latest_job
+        self.pool.clear()
+        self.pending = 0
+        self._set_busy(False)
+
+    def wait(self, msecs: int = -1) -> bool:
+        return self.pool.waitForDone(msecs)
+
+    def _set_busy(self, busy: bool) -> None:
+        if busy != self.busy:
+            self.busy = busy
+            self.busy_changed.emit(busy)
+
+    def _on_done(self) -> None:
+        self.pending -= 1
+        self._set_busy(self.pending > 0)
+
+    def _on_finished(self, job_id: int, result) -> None:
+        if self.is_stale(job_id):
+            return
+        self._on_done()
+        self.finished.emit(result)
+
+    def _on_failed(self, job_id: int, message: str) -> None:
+        if self.is_stale(job_id):
+            return
+        self._on_done()
+        self.failed.emit(message)
+
+
+def to_preview(image: np.ndarray, max_width: int, max_height: int) -> np.ndarray:
+    # лишається BGR: PreviewCanvas показує його через QImage.Format_BGR888 без перетворення
+    h, w = image.shape[:2]
+    scale = min(max_width / w, max_height / h)
+
+    if scale < 1:
+        with span("resize.preview"):
+            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def load_preview_source(image_path: str, proxy_size: Optional[Tuple[int, int]]) -> Tuple[ImageSource, np.ndarray]:
+    # для анімації редагується перший кадр, а решта кадрів рендериться лише при збереженні
+    if is_animation(image_path):
+        image = read_first_frame(image_path)
+        if image is None:
+            raise ValueError(f"не вдалося прочитати анімацію: {image_path}")
+        source = ImageSource.from_array(image)
+        source.image_path = image_path
+        return source, build_proxy(image, proxy_size)[0]
+
+    # спершу зменшене декодування для перегляду; повний кадр декодується у фоні
+    if proxy_size is not None:
+        opened = open_preview(image_path, *proxy_size)
+        if opened is not None:
+            return opened
+
+    image = decode_image(image_path)
+    if image is None:
+        raise ValueError(f"не вдалося завантажити зображення: {image_path}")
+    return ImageSource.from_array(image), build_proxy(image, proxy_size)[0]
+
+
+def render_preview(document: MemeDocument, spec: Dict,
+                   max_width: int, max_height: int) -> Tuple[Dict, np.ndarray, np.ndarray, float]:
+    # документ перераховує лише шари, параметри яких змінились; last_cost_ms — скільки
+    # коштував би рендер без його кешів, тобто повтор операції з історії
+    image = document.render_spec(spec)
+    return spec, image, to_preview(image, max_width, max_height), document.last_cost_ms
+
+
+def save_full_image(source: ImageSource, operations: List[Dict], save_path: str, **options) -> str:
+    image = source.get()
+    if image is None:
+        raise ValueError(f"не вдалося декодувати {source.image_path} для {save_path}")
+    image = replay_operations(image.copy(), operations)
+    try:
+        write_image(image, save_path, **options)
+    except OSError as e:
+        raise ValueError(f"не вдалося зберегти зображення: {save_path}: {e}")
+    return save_path
+
+
+def save_animation(source_path: str, spec: Dict, save_path: str) -> str:
+    try:
+        render_animation(source_path, save_path, spec)
+    except (ValueError, OSError) as e:
+        raise ValueError(f"не вдалося зберегти анімацію: {save_path}: {e}")
+    return save_path
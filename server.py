@@ -0,0 +1,468 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from filters import FILTER_REGISTRY, resolve_filter_name
+from metrics import get_metrics
+from render_engine import NO_FILTER, render
+from utils import MEME_TEMPLATES
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_TIMEOUT = 30.0
+MAX_BODY_SIZE = 32 * 1024 * 1024
+MAX_HEADER_LINES = 100
+# таймаут лише перестає чекати на рендер, а потік рендерингу працює далі,
+# тож завеликі запити відхиляються ще до постановки в чергу
+MAX_FONT_SIZE = 1000
+MAX_TEXTS = 16
+MAX_TEXT_LENGTH = 1000
+MAX_LINES = 16
+MAX_FILTERS = 16
+MAX_KERNEL_SIZE = 99
+# параметри фільтрів, які можна задати через HTTP, і їхні межі; ядра розмиття лише непарні
+FILTER_PARAM_LIMITS = {
+    "Розмиття": {"kernel_size": (1, MAX_KERNEL_SIZE)},
+    "Виділення країв": {"low_threshold": (0, 1000), "high_threshold": (0, 1000)},
+    "Віньєтка": {"strength": (0.0, 1.0)},
+    "Вінтаж": {"hue": (0.0, 4.0), "saturation": (0.0, 4.0), "noise": (0, 255), "blur": (1, MAX_KERNEL_SIZE)},
+}
+KERNEL_PARAMS = {"kernel_size", "blur"}
+
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+}
+
+STATUS_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    504: "Gateway Timeout",
+}
+
+LIST_PARAMS = {"texts", "positions", "filters"}
+INT_PARAMS = {"font_size", "outline_width", "max_lines"}
+BOOL_PARAMS = {"shadow", "fit"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ServiceMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = {}
+        self.rejected = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.render_seconds_sum = 0.0
+        self.render_count = 0
+
+    def count_response(self, path: str, status: int) -> None:
+        key = (path, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def to_dict(self, capacity: int) -> Dict:
+        return {
+            "requests": {f"{path} {status}": count for (path, status), count in sorted(self.requests.items())},
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "capacity": capacity,
+            "render_seconds_sum": round(self.render_seconds_sum, 6),
+            "render_count": self.render_count,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+        }
+
+    def to_prometheus(self, capacity: int) -> str:
+        lines = [
+            "# TYPE meme_http_requests_total counter",
+        ]
+        for (path, status), count in sorted(self.requests.items()):
+            lines.append(f'meme_http_requests_total{{path="{path}",status="{status}"}} {count}')
+        lines += [
+            "# TYPE meme_render_rejected_total counter",
+            f"meme_render_rejected_total {self.rejected}",
+            "# TYPE meme_render_timeouts_total counter",
+            f"meme_render_timeouts_total {self.timeouts}",
+            "# TYPE meme_render_in_flight gauge",
+            f"meme_render_in_flight {self.in_flight}",
+            "# TYPE meme_render_capacity gauge",
+            f"meme_render_capacity {capacity}",
+            "# TYPE meme_render_seconds summary",
+            f"meme_render_seconds_sum {self.render_seconds_sum:.6f}",
+            f"meme_render_seconds_count {self.render_count}",
+            "# TYPE meme_uptime_seconds gauge",
+            f"meme_uptime_seconds {time.time() - self.started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _timed_render(spec: Dict) -> Tuple[bytes, float]:
+    start = time.perf_counter()
+    data = render(spec)
+    return data, time.perf_counter() - start
+
+
+def parse_query_spec(query: str) -> Dict:
+    spec = {}
+
+    for key, values in parse_qs(query).items():
+        if key in LIST_PARAMS:
+            spec[key] = values
+        elif key in INT_PARAMS:
+            try:
+                spec[key] = int(values[-1])
+            except ValueError:
+                raise HttpError(400, f"некоректний {key}: {values[-1]}")
+        elif key in BOOL_PARAMS:
+            spec[key] = values[-1].lower() in ("1", "true", "yes")
+        else:
+            spec[key] = values[-1]
+
+    return spec
+
+
+def _check_size(spec: Dict, key: str, low: int, high: int) -> None:
+    value = spec.get(key)
+    if value is None:
+        return
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise HttpError(400, f"{key} має бути цілим числом від {low} до {high}")
+
+
+def _check_list(spec: Dict, key: str, limit: int) -> list:
+    value = spec.get(key)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise HttpError(400, f"{key} має бути списком")
+    if len(value) > limit:
+        raise HttpError(400, f"{key}: не більше {limit} елементів")
+    return value
+
+
+def _check_text(text, name: str) -> None:
+    if text is not None and not isinstance(text, str):
+        raise HttpError(400, f"{name} має бути рядком")
+    if text and len(text) > MAX_TEXT_LENGTH:
+        raise HttpError(400, f"{name}: не більше {MAX_TEXT_LENGTH} символів")
+
+
+def _check_filter(image_filter) -> None:
+    if isinstance(image_filter, str):
+        name, params = image_filter, {}
+    elif isinstance(image_filter, dict):
+        name, params = image_filter.get("name"), image_filter.get("params", {})
+        if not isinstance(name, str) or not isinstance(params, dict):
+            raise HttpError(400, "фільтр задається як {\"name\": рядок, \"params\": об'єкт}")
+    else:
+        raise HttpError(400, "filters має містити назви або об'єкти")
+
+    name = resolve_filter_name(name)
+    if name == NO_FILTER and not params:
+        return
+    if name not in FILTER_REGISTRY:
+        raise HttpError(400, f"невідомий фільтр: {name}")
+
+    limits = FILTER_PARAM_LIMITS.get(name, {})
+    for key, value in params.items():
+        if key not in limits:
+            raise HttpError(400, f"невідомий параметр фільтра {name}: {key}")
+        low, high = limits[key]
+        number_types = int if isinstance(low, int) else (int, float)
+        if isinstance(value, bool) or not isinstance(value, number_types) or not low <= value <= high:
+            raise HttpError(400, f"{name}: {key} має бути числом від {low} до {high}")
+        if key in KERNEL_PARAMS and value % 2 == 0:
+            raise HttpError(400, f"{name}: {key} має бути непарним")
+
+
+def check_spec_limits(spec: Dict) -> None:
+    # типи полів JSON і межі, від яких залежить час рендерингу
+    for key in ("template", "font", "filter"):
+        _check_text(spec.get(key), key)
+    _check_size(spec, "font_size", 1, MAX_FONT_SIZE)
+    _check_size(spec, "outline_width", 0, MAX_FONT_SIZE)
+    _check_size(spec, "max_lines", 1, MAX_LINES)
+
+    for text in _check_list(spec, "texts", MAX_TEXTS):
+        _check_text(text, "texts")
+    _check_list(spec, "positions", MAX_TEXTS)
+    for layer in _check_list(spec, "layers", MAX_TEXTS):
+        if not isinstance(layer, dict):
+            raise HttpError(400, "layers має містити об'єкти")
+        _check_text(layer.get("text"), "text")
+        _check_text(layer.get("font"), "font")
+        _check_size(layer, "font_size", 1, MAX_FONT_SIZE)
+        _check_size(layer, "outline_width", 0, MAX_FONT_SIZE)
+        _check_size(layer, "max_lines", 1, MAX_LINES)
+    for image_filter in _check_list(spec, "filters", MAX_FILTERS):
+        _check_filter(image_filter)
+    if spec.get("filter"):
+        _check_filter(spec["filter"])
+
+
+def build_render_spec(query: str, headers: Dict[str, str], body: bytes) -> Dict:
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type == "application/json":
+        try:
+            spec = json.loads(body.decode("utf-8"))
+        except ValueError as e:
+            raise HttpError(400, f"некоректний JSON: {e}")
+        if not isinstance(spec, dict):
+            raise HttpError(400, "очікується JSON-об'єкт")
+        if "image_base64" in spec:
+            try:
+                spec["image_bytes"] = base64.b64decode(spec.pop("image_base64"))
+            except (ValueError, TypeError) as e:
+                raise HttpError(400, f"некоректний image_base64: {e}")
+    else:
+        spec = parse_query_spec(query)
+        if body:
+            spec["image_bytes"] = body
+
+    # клієнт не може читати довільні файли сервера чи задавати внутрішні параметри рушія
+    for key in ("image", "image_array", "templates_dir", "in_place", "pool", "scale"):
+        spec.pop(key, None)
+    check_spec_limits(spec)
+
+    if "image_bytes" not in spec:
+        template_name = spec.get("template")
+        if not template_name:
+            raise HttpError(400, "потрібно вказати template або передати зображення")
+        if template_name not in MEME_TEMPLATES:
+            raise HttpError(400, f"невідомий шаблон: {template_name}")
+
+    image_format = spec.get("format") or ".png"
+    if not isinstance(image_format, str):
+        raise HttpError(400, "format має бути рядком")
+    if not image_format.startswith("."):
+        image_format = "." + image_format
+    if image_format.lower() not in CONTENT_TYPES:
+        raise HttpError(400, f"непідтримуваний формат: {image_format}")
+    spec["format"] = image_format.lower()
+
+    return spec
+
+
+class RenderServer:
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: Optional[int] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 use_processes: bool = False):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + queue_size
+        self.timeout = timeout
+        self.use_processes = use_processes
+
+        self.metrics = ServiceMetrics()
+        self.executor = None
+        self.server = None
+
+    def _create_executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+
+    async def start(self) -> None:
+        self.executor = self._create_executor()
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        print(f"сервер рендерингу слухає http://{self.host}:{self.port}", file=sys.stderr)
+        async with self.server:
+            await self.server.serve_forever()
+
+    def _release(self, future: asyncio.Future) -> None:
+        self.metrics.in_flight -= 1
+        if not future.cancelled():
+            future.exception()
+
+    async def _render(self, spec: Dict) -> bytes:
+        if self.metrics.in_flight >= self.capacity:
+            self.metrics.rejected += 1
+            raise HttpError(429, "черга рендерингу переповнена")
+
+        loop = asyncio.get_running_loop()
+        self.metrics.in_flight += 1
+        # слот звільняється, коли воркер справді закінчив, а не коли клієнт отримав таймаут
+        future = loop.run_in_executor(self.executor, _timed_render, spec)
+        future.add_done_callback(self._release)
+
+        try:
+            data, elapsed = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            raise HttpError(504, "час рендерингу вичерпано")
+        except (ValueError, TypeError, KeyError, FileNotFoundError) as e:
+            raise HttpError(400, str(e))
+
+        self.metrics.render_seconds_sum += elapsed
+        self.metrics.render_count += 1
+        return data
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str],
+                        body: bytes) -> Tuple[int, str, bytes]:
+        url = urlsplit(target)
+
+        if url.path == "/render":
+            if method != "POST":
+                raise HttpError(405, "використовуйте POST")
+            spec = build_render_spec(url.query, headers, body)
+            data = await self._render(spec)
+            return 200, CONTENT_TYPES[spec["format"]], data
+
+        if url.path == "/metrics":
+            # етапи рендерингу видно лише в режимі потоків: процеси пулу мають власні метрики
+            if parse_qs(url.query).get("format") == ["json"]:
+                payload = dict(get_metrics().get_stats(), service=self.metrics.to_dict(self.capacity))
+                return 200, "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            text = self.metrics.to_prometheus(self.capacity) + get_metrics().to_prometheus()
+            return 200, "text/plain; version=0.0.4", text.encode("utf-8")
+
+        if url.path == "/templates":
+            payload = json.dumps(sorted(MEME_TEMPLATES), ensure_ascii=False)
+            return 200, "application/json", payload.encode("utf-8")
+
+        raise HttpError(404, f"невідомий шлях: {url.path}")
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        try:
+            method, target, version = request_line.decode("latin-1").strip().split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "некоректний рядок запиту")
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HttpError(400, "забагато заголовків")
+
+        length = headers.get("content-length", "0") or "0"
+        # лише десяткові цифри: int() прийняв би і "-1", і " +5"
+        if not length.isascii() or not length.isdigit():
+            raise HttpError(400, f"некоректний Content-Length: {length}")
+        length = int(length)
+        if length > MAX_BODY_SIZE:
+            raise HttpError(413, "завеликий запит")
+        body = await reader.readexactly(length) if length else b""
+
+        return method.upper(), target, version, headers, body
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, content_type: str,
+                              body: bytes, keep_alive: bool) -> None:
+        head = [
+            f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 429:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                path = "-"
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, target, version, headers, body = request
+                    path = urlsplit(target).path
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                    status, content_type, payload = await self._dispatch(method, target, headers, body)
+                except HttpError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": e.message}, ensure_ascii=False).encode("utf-8")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+
+                self.metrics.count_response(path, status)
+                await self._write_response(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP-сервіс рендерингу мемів")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="розмір пулу рендерингу (типово кількість ядер)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="скільки запитів може чекати понад зайняті воркери до відповіді 429")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="таймаут одного рендерингу в секундах")
+    parser.add_argument("--processes", action="store_true",
+                        help="рендерити в пулі процесів замість потоків")
+    parser.add_argument("--no-stage-metrics", action="store_true",
+                        help="не збирати тривалість етапів рендерингу для /metrics")
+    parser.add_argument("--trace-slow-ms", type=float, default=None,
+                        help="друкувати в stderr трасування рендерингів, довших за стільки мілісекунд")
+    args = parser.parse_args(argv)
+
+    if not args.no_stage_metrics:
+        get_metrics().enable(args.trace_slow_ms)
+
+    server = RenderServer(args.host, args.port, args.workers, args.queue_size, args.timeout, args.processes)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from metrics import get_metrics
+from text_renderer import TextSprite
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class SpriteCache:
+    # готові спрайти підписів за текстом, файлом шрифту, розміром, кольором і обведенням;
+    # шаблонні підписи й слогани, що повторюються, растеризуються один раз
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_held = 0
+
+        self._lock = threading.Lock()
+        self._sprites = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[TextSprite]:
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is None:
+                self.misses += 1
+                return None
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+    def put(self, key: Hashable, sprite: TextSprite) -> None:
+        # спрайт, більший за весь бюджет, лише витіснив би решту
+        if sprite.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            stale = self._sprites.pop(key, None)
+            if stale is not None:
+                self.bytes_held -= stale.nbytes
+
+            self._sprites[key] = sprite
+            self.bytes_held += sprite.nbytes
+
+            while self.bytes_held > self.max_bytes:
+                _, evicted = self._sprites.popitem(last=False)
+                self.bytes_held -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sprites.clear()
+            self.bytes_held = 0
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._sprites),
+                "bytes_held": self.bytes_held,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_sprite_cache() -> SpriteCache:
+    global _default_cache
+
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = SpriteCache()
+                get_metrics().register_collector("sprite_cache", _default_cache.get_stats)
+
+    return _default_cache
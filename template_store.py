@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from metrics import get_metrics
+
+
+TEMPLATE_EXTENSIONS = [".jpg", ".jpeg", ".png"]
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_REVALIDATE_INTERVAL = 1.0
+
+
+class TemplateStore:
+    def __init__(self, templates_dir: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 revalidate_interval: float = DEFAULT_REVALIDATE_INTERVAL):
+        self.templates_dir = templates_dir
+        self.max_bytes = max_bytes
+        self.revalidate_interval = revalidate_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_held = 0
+
+        self._lock = threading.Lock()
+        self._index = {}
+        self._dir_mtime = None
+        self._checked_at = 0.0
+        self._images = OrderedDict()
+
+    def _scan(self) -> Dict[str, str]:
+        found = {}
+
+        try:
+            entries = list(os.scandir(self.templates_dir))
+        except OSError:
+            return {}
+
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            name, ext = os.path.splitext(entry.name)
+            if ext.lower() in TEMPLATE_EXTENSIONS:
+                found.setdefault(name, {})[ext.lower()] = entry.path
+
+        # той самий пріоритет розширень, що й у послідовних перевірках os.path.exists
+        index = {}
+        for name, paths in found.items():
+            for ext in TEMPLATE_EXTENSIONS:
+                if ext in paths:
+                    index[name] = paths[ext]
+                    break
+        return index
+
+    def _refresh_index(self) -> None:
+        now = time.monotonic()
+        if self._dir_mtime is not None and now - self._checked_at < self.revalidate_interval:
+            return
+
+        try:
+            dir_mtime = os.stat(self.templates_dir).st_mtime_ns
+        except OSError:
+            dir_mtime = -1
+
+        with self._lock:
+            self._checked_at = now
+            if dir_mtime != self._dir_mtime:
+                self._index = self._scan()
+                self._dir_mtime = dir_mtime
+
+    def get_path(self, template_name: str) -> Optional[str]:
+        self._refresh_index()
+        return self._index.get(template_name)
+
+    def list_templates(self) -> List[str]:
+        self._refresh_index()
+        return sorted(self._index)
+
+    def load(self, template_path: str) -> Optional[np.ndarray]:
+        try:
+            stat = os.stat(template_path)
+        except OSError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._images.get(template_path)
+            if cached is not None and cached[0] == version:
+                self._images.move_to_end(template_path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        image = cv2.imread(template_path)
+        if image is None:
+            return None
+        # закешований кадр спільний для всіх рендерів, тож лише для читання
+        image.setflags(write=False)
+
+        with self._lock:
+            stale = self._images.pop(template_path, None)
+            if stale is not None:
+                self.bytes_held -= stale[1].nbytes
+
+            if image.nbytes <= self.max_bytes:
+                self._images[template_path] = (version, image)
+                self.bytes_held += image.nbytes
+
+            while self.bytes_held > self.max_bytes:
+                _, (_, evicted) = self._images.popitem(last=False)
+                self.bytes_held -= evicted.nbytes
+
+        return image
+
+    def get_image(self, template_name: str) -> Optional[np.ndarray]:
+        template_path = self.get_path(template_name)
+        if template_path is None:
+            return None
+        return self.load(template_path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self.bytes_held = 0
+            self._dir_mtime = None
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._images),
+                "bytes_held": self.bytes_held,
+                "max_bytes": self.max_bytes,
+                "indexed_templates": len(self._index),
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_template_store(templates_dir: str) -> TemplateStore:
+    templates_dir = os.path.abspath(templates_dir)
+
+    with _stores_lock:
+        store = _stores.get(templates_dir)
+        if store is None:
+            store = TemplateStore(templates_dir)
+            _stores[templates_dir] = store
+            get_metrics().register_collector(f"template_store:{templates_dir}", store.get_stats)
+        return store
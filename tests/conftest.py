@@ -0,0 +1,14 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def photo() -> np.ndarray:
+    # усі рівні яскравості в кожному каналі, зокрема світлі, які сепія виводить за 255
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (64, 96, 3), dtype=np.uint8)
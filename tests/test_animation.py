@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from animation import render_animation
+
+
+def make_gif(path: str, durations, **options) -> None:
+    frames = [Image.fromarray(np.full((60, 80, 3), level, np.uint8)) for level in (0, 120, 240)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=list(durations), **options)
+
+
+@pytest.mark.parametrize("options, loop", [({}, None), ({"loop": 0}, 0), ({"loop": 3}, 3)])
+def test_gif_keeps_source_loop(tmp_path, options, loop):
+    source, output = str(tmp_path / "source.gif"), str(tmp_path / "out.gif")
+    make_gif(source, [40, 120, 200], **options)
+
+    render_animation(source, output, {"texts": ["мем"]}, workers=1)
+    with Image.open(output) as image:
+        assert image.info.get("loop") == loop
+        assert image.n_frames == 3
+
+
+def test_mp4_follows_variable_frame_delays(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    source, output = str(tmp_path / "source.gif"), str(tmp_path / "out.mp4")
+    make_gif(source, [40, 120, 200])
+
+    render_animation(source, output, {}, workers=1)
+    capture = cv2.VideoCapture(output)
+    if not capture.isOpened():
+        pytest.skip("OpenCV без кодека mp4v")
+    levels = []
+    while True:
+        success, frame = capture.read()
+        if not success:
+            break
+        levels.append(int(round(frame.mean() / 120)))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+
+    # спільний крок 40 мс: кадри по 40, 120 і 200 мс — це 1, 3 і 5 кадрів відео
+    assert fps == pytest.approx(25)
+    assert levels == [0] + [1] * 3 + [2] * 5
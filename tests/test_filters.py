@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from filters import FilterPipeline
+
+
+def max_diff(a: np.ndarray, b: np.ndarray) -> int:
+    return int(np.abs(a.astype(np.int16) - b.astype(np.int16)).max())
+
+
+@pytest.mark.parametrize("chain", [
+    ["Сепія", "Сепія"],
+    ["Сепія", "Чорно-білий"],
+    ["Сепія", "Негатив"],
+])
+def test_chain_after_sepia_matches_sequential(photo, chain):
+    # сепія виходить за [0, 255], тож після неї кроки не зливаються
+    fused = FilterPipeline(chain)
+    assert len(fused.steps) == len(chain)
+    assert np.array_equal(fused.apply(photo), FilterPipeline(chain, fuse=False).apply(photo))
+
+
+@pytest.mark.parametrize("chain", [
+    ["Чорно-білий", "Сепія"],
+    ["Негатив", "Сепія"],
+    ["Чорно-білий", "Сепія", "Негатив"],
+])
+def test_fused_chain_differs_only_by_rounding(photo, chain):
+    fused = FilterPipeline(chain)
+    assert len(fused.steps) < len(chain)
+    assert max_diff(fused.apply(photo), FilterPipeline(chain, fuse=False).apply(photo)) <= 1
+
+
+def test_vintage_replays_identically(photo):
+    # історія повторює операції замість збереження кадрів, тож шум мусить відтворюватись
+    assert np.array_equal(FilterPipeline(["Вінтаж"]).apply(photo), FilterPipeline(["Вінтаж"]).apply(photo))
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from image_processor import ImageProcessor
+from utils import TextPosition
+
+render_worker = pytest.importorskip("render_worker")
+
+
+def make_spec(top: str, bottom: str = "") -> dict:
+    layers = [{"text": text, "position": position, "font_size": 48}
+              for text, position in ((top, TextPosition.TOP), (bottom, TextPosition.BOTTOM)) if text]
+    return {"filters": [], "layers": layers}
+
+
+def ui_edit(processor: ImageProcessor, spec: dict, typed: str) -> np.ndarray:
+    # як у вікні: незафіксовані перегляди під час набору, потім перегляд з commit_pending
+    for length in range(1, len(typed)):
+        _, image, _, cost_ms = render_worker.render_preview(processor.document, make_spec(typed[:length]), 800, 600)
+        processor.set_rendered(make_spec(typed[:length]), image, record=False, cost_ms=cost_ms)
+
+    _, image, _, cost_ms = render_worker.render_preview(processor.document, spec, 800, 600)
+    processor.set_rendered(spec, image, record=True, cost_ms=cost_ms)
+    return image.copy()
+
+
+def test_ui_commits_store_deltas_not_frames(photo):
+    processor = ImageProcessor()
+    processor.enable_proxy(800, 600)
+    processor.set_image(np.ascontiguousarray(np.tile(photo, (8, 8, 1))))
+    committed = [processor.image.copy()]
+
+    for typed in ("Перший", "Другий", "Третій"):
+        committed.append(ui_edit(processor, make_spec(typed), typed))
+
+    stats = processor.history.get_stats()
+    assert stats["checkpoints"] == 0
+    assert stats["deltas"] == 3
+
+    # скасування повертає саме зафіксовані кадри, а не перегляди між ними
+    for expected in reversed(committed[:-1]):
+        assert processor.undo()
+        assert np.array_equal(processor.image, expected)
+    for expected in committed[1:]:
+        assert processor.redo()
+        assert np.array_equal(processor.image, expected)
+
+
+def test_slow_ui_commit_stores_frame(photo):
+    processor = ImageProcessor()
+    processor.set_image(photo)
+    _, image, _, _ = render_worker.render_preview(processor.document, make_spec("Повільно"), 800, 600)
+    processor.set_rendered(make_spec("Повільно"), image, record=True, cost_ms=processor.history.target_ms * 100)
+    assert processor.history.get_stats()["checkpoints"] == 1
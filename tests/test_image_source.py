@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+from image_source import ImageSource
+
+
+def test_source_from_array_is_ready(photo):
+    source = ImageSource.from_array(photo)
+    assert source.is_ready()
+    assert source.get() is photo
+    assert (source.width, source.height) == (96, 64)
+
+
+def test_source_decodes_in_background(tmp_path, photo):
+    image_path = str(tmp_path / "photo.png")
+    cv2.imwrite(image_path, photo)
+    source = ImageSource(image_path, size=(96, 64))
+    assert np.array_equal(source.get(), photo)
+    assert source.is_ready()
+
+
+def test_import_does_not_load_executor():
+    code = "import sys, image_source; print('concurrent.futures' in sys.modules)"
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=repo_dir)
+    assert output.stdout.strip() == "False"
@@ -0,0 +1,61 @@
+import cv2
+
+from image_processor import ImageProcessor
+from meme_generator import MemeGenerator
+from render_cache import RenderCache
+from utils import TextPosition
+
+
+def make_generator(tmp_path) -> MemeGenerator:
+    return MemeGenerator(ImageProcessor(), RenderCache(str(tmp_path / "cache")))
+
+
+def test_cached_generate_rejects_mismatched_positions(tmp_path, photo):
+    image_path = str(tmp_path / "photo.png")
+    cv2.imwrite(image_path, photo)
+    generator = make_generator(tmp_path)
+
+    assert not generator.generate_meme(image_path, ["раз", "два"], [TextPosition.TOP])
+    assert not generator.generate_meme(image_path, ["раз"], filter_name="Немає такого")
+
+
+def test_cached_generate_hides_previous_image(tmp_path, photo):
+    image_path = str(tmp_path / "photo.png")
+    cv2.imwrite(image_path, photo)
+    generator = make_generator(tmp_path)
+
+    assert generator.generate_meme(image_path, ["раз"])
+    assert generator.encode_meme() is not None
+    assert generator.image_processor.image is not None
+
+    # другий рендер відкладений: процесор не показує перший результат як новий
+    assert generator.generate_meme(image_path, ["два"])
+    assert generator.image_processor.image is None
+    assert generator.encode_meme() is not None
+
+
+def test_variants_reuse_pool_buffers(tmp_path, photo):
+    image_path = str(tmp_path / "photo.png")
+    cv2.imwrite(image_path, photo)
+    generator = MemeGenerator(ImageProcessor())
+    pool = generator.image_processor.buffer_pool
+    captions = [[f"варіант {index}"] for index in range(8)]
+
+    def run():
+        return list(generator.generate_variants(image_path, captions, filter_name="Розмиття",
+                                                image_format=".png", workers=2))
+
+    first = run()
+    stats = pool.get_stats()
+    second = run()
+
+    # основа, проміжні буфери фільтра й робочі копії варіантів повертаються в пул і вдруге беруться з нього
+    assert second == first
+    assert pool.get_stats()["bytes_allocated"] == stats["bytes_allocated"]
+    assert pool.get_stats()["hits"] - stats["hits"] > len(captions)
+    allocated = stats["bytes_allocated"]
+    assert allocated <= 4 * photo.nbytes
+
+    generator.image_processor.load_image(image_path)
+    assert generator.image_processor.apply_spec({"texts": captions[3], "filter": "Розмиття"})
+    assert generator.image_processor.encode_image(".png") == first[3]
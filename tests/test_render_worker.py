@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtCore = pytest.importorskip("PyQt5.QtCore")
+
+from image_source import ImageSource
+from render_worker import BackgroundWorker, save_full_image
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def pump(app, done, timeout: float = 10.0) -> bool:
+    end = time.time() + timeout
+    while time.time() < end:
+        app.processEvents()
+        if done():
+            return True
+        time.sleep(0.002)
+    return False
+
+
+def test_queued_saves_all_report(app, tmp_path, photo):
+    saver = BackgroundWorker(drop_stale=False)
+    saved, failed = [], []
+    saver.finished.connect(saved.append)
+    saver.failed.connect(failed.append)
+
+    paths = [str(tmp_path / f"meme{index}.png") for index in range(3)]
+    for path in paths:
+        saver.submit(save_full_image, ImageSource.from_array(photo), [], path)
+    saver.submit(save_full_image, ImageSource.from_array(photo), [], str(tmp_path / "missing" / "meme.png"))
+
+    assert pump(app, lambda: len(saved) + len(failed) == 4)
+    assert saved == paths
+    assert all(os.path.exists(path) for path in paths)
+    assert len(failed) == 1 and "missing" in failed[0]
+    assert not saver.busy
+
+
+def test_preview_worker_drops_stale_jobs(app):
+    worker = BackgroundWorker()
+    results = []
+    worker.finished.connect(results.append)
+
+    for index in range(5):
+        worker.submit(lambda value: (time.sleep(0.01), value)[1], index)
+
+    assert pump(app, lambda: not worker.busy)
+    worker.wait()
+    app.processEvents()
+    assert results == [4]
@@ -0,0 +1,120 @@
+import asyncio
+import base64
+import json
+
+import cv2
+import pytest
+
+from render_engine import get_spec_layers, render
+from server import MAX_BODY_SIZE, MAX_TEXTS, HttpError, RenderServer, build_render_spec
+
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+
+def build_json(spec: dict) -> dict:
+    return build_render_spec("", JSON_HEADERS, json.dumps(spec).encode("utf-8"))
+
+
+@pytest.mark.parametrize("spec", [
+    {"template": "Drake", "format": 5},
+    {"template": ["Drake"]},
+    {"template": "Drake", "font_size": "36"},
+    {"template": "Drake", "font_size": 100000},
+    {"template": "Drake", "font_size": 0},
+    {"template": "Drake", "texts": "Ні"},
+    {"template": "Drake", "texts": ["так"] * (MAX_TEXTS + 1)},
+    {"template": "Drake", "layers": [{"text": "так", "font_size": 100000}]},
+    {"image_base64": 5},
+])
+def test_bad_json_fields_are_rejected(spec):
+    with pytest.raises(HttpError) as error:
+        build_json(spec)
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize("query", [
+    "template=Drake&font_size=abc",
+    "template=Drake&outline_width=3px",
+    "template=Drake&max_lines=два",
+])
+def test_bad_query_numbers_are_rejected(query):
+    with pytest.raises(HttpError) as error:
+        build_render_spec(query, {}, b"")
+    assert error.value.status == 400
+
+
+def test_query_outline_and_max_lines_render(photo):
+    body = cv2.imencode(".png", photo)[1].tobytes()
+    spec = build_render_spec("texts=раз&texts=два&outline_width=3&max_lines=2&fit=1", {}, body)
+    assert spec["outline_width"] == 3 and spec["max_lines"] == 2
+    assert render(spec)[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_internal_keys_are_dropped():
+    spec = build_json({"template": "Drake", "scale": 50, "format": "jpg"})
+    assert "scale" not in spec
+    assert spec["format"] == ".jpg"
+
+
+def read_request(raw: bytes):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await RenderServer()._read_request(reader)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("length, status", [
+    ("abc", 400),
+    ("-1", 400),
+    ("+5", 400),
+    (str(MAX_BODY_SIZE + 1), 413),
+])
+def test_bad_content_length_is_rejected(length, status):
+    with pytest.raises(HttpError) as error:
+        read_request(f"POST /render HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+    assert error.value.status == status
+
+
+def test_content_length_reads_body():
+    request = read_request(b"POST /render HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc")
+    assert request[-1] == b"abc"
+
+
+@pytest.mark.parametrize("value, fit", [("false", False), ("0", False), ("true", True), ("1", True)])
+def test_query_fit_is_boolean(value, fit):
+    long_text = "дуже довгий підпис, який не вміщується в рамку шаблону " * 3
+    spec = build_render_spec(f"template=Drake&font_size=200&texts={long_text}&texts=так&fit={value}", {}, b"")
+    assert spec["fit"] is fit
+
+    layers = get_spec_layers(spec, (400, 300))
+    assert (layers[0]["font_size"] < 200) is fit
+
+
+@pytest.mark.parametrize("image_filter", [
+    {"name": "blur", "params": {"kernel_size": 4}},
+    {"name": "blur", "params": {"kernel_size": -3}},
+    {"name": "blur", "params": {"kernel_size": 100001}},
+    {"name": "blur", "params": {"kernel_size": 5.0}},
+    {"name": "Вінтаж", "params": {"noise": 10 ** 9}},
+    {"name": "Віньєтка", "params": {"strength": "сильно"}},
+    {"name": "sepia", "params": {"matrix": [[1, 0, 0]]}},
+    {"name": "Немає такого"},
+    {"name": 5},
+    5,
+])
+def test_bad_filter_params_are_rejected(image_filter):
+    with pytest.raises(HttpError) as error:
+        build_json({"template": "Drake", "filters": [image_filter]})
+    assert error.value.status == 400
+
+
+def test_bounded_filter_params_render(photo):
+    filters = [{"name": "blur", "params": {"kernel_size": 99}},
+               {"name": "Вінтаж", "params": {"hue": 0.5, "noise": 20, "blur": 5}},
+               {"name": "vignette", "params": {"strength": 0.3}}, "Оригінал"]
+    spec = build_json({"image_base64": base64.b64encode(cv2.imencode(".png", photo)[1]).decode("ascii"),
+                       "filters": filters})
+    assert render(spec)[:8] == b"\x89PNG\r\n\x1a\n"
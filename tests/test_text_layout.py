@@ -0,0 +1,27 @@
+from font_registry import get_font_registry
+from text_layout import fit_text, get_text_extent
+from text_renderer import measure_text
+from utils import DEFAULT_FONTS
+
+
+TEXT = "коли тест нарешті зелений, а реліз у п'ятницю"
+FONT = DEFAULT_FONTS[0]
+
+
+def fitted_width(text: str, size: int) -> int:
+    left, _, right, _ = measure_text(text, get_font_registry().get_font(FONT, size))
+    return right - left
+
+
+def test_explicit_outline_shrinks_fit():
+    default_text, default_size = fit_text(TEXT, FONT, 600, 200, 3, 120)
+    text, size = fit_text(TEXT, FONT, 600, 200, 3, 120, outline_width=60)
+
+    assert size < default_size
+    assert fitted_width(text, size) + 2 * 60 <= 600
+
+
+def test_shadow_counts_towards_fit():
+    text, size = fit_text(TEXT, FONT, 600, 200, 3, 120, shadow=True)
+    assert fitted_width(text, size) + get_text_extent(size, shadow=True) <= 600
+    assert get_text_extent(size, shadow=True) > get_text_extent(size)
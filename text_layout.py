@@ -0,0 +1,182 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from font_registry import get_font_registry
+from metrics import timed
+from text_renderer import LINE_SPACING, TEXT_MARGIN, get_outline_width, get_shadow_params, measure_text
+from utils import TextPosition
+
+
+FIT_MIN_FONT_SIZE = 12
+# частка висоти зображення під підпис і найбільше рядків для кожної позиції
+FIT_BOX_HEIGHT = {
+    TextPosition.TOP: 0.3,
+    TextPosition.BOTTOM: 0.3,
+    TextPosition.MIDDLE: 0.5,
+}
+FIT_MAX_LINES = {
+    TextPosition.TOP: 3,
+    TextPosition.BOTTOM: 3,
+    TextPosition.MIDDLE: 4,
+}
+# гліфи вимірюються один раз на цьому розмірі, на інших ширини масштабуються лінійно
+REFERENCE_SIZE = 200
+MAX_CACHED_WORDS = 4096
+
+
+class GlyphMetrics:
+    # ширини гліфів і кернінг пар одного шрифту на REFERENCE_SIZE;
+    # ширина слова — сума ширин гліфів і кернінгу сусідніх пар
+    def __init__(self, font):
+        self.font = font
+        self.advances = {}
+        self.kerning = {}
+        self.words = {}
+
+        ascent, descent = font.getmetrics()
+        self.line_height = ascent + descent
+        # Pillow зсуває кожен наступний рядок на низ рамки "A" плюс spacing
+        self.line_pitch = font.getbbox("A")[3]
+        self.space = self.advance(" ")
+
+    def advance(self, char: str) -> float:
+        width = self.advances.get(char)
+        if width is None:
+            width = self.advances[char] = self.font.getlength(char)
+        return width
+
+    def kern(self, pair: str) -> float:
+        value = self.kerning.get(pair)
+        if value is None:
+            value = self.kerning[pair] = self.font.getlength(pair) - self.advance(pair[0]) - self.advance(pair[1])
+        return value
+
+    def word_width(self, word: str) -> float:
+        width = self.words.get(word)
+        if width is None:
+            width = sum(self.advance(char) for char in word)
+            width += sum(self.kern(word[i:i + 2]) for i in range(len(word) - 1))
+            if len(self.words) >= MAX_CACHED_WORDS:
+                self.words.clear()
+            self.words[word] = width
+        return width
+
+
+_glyph_metrics = {}
+_glyph_metrics_lock = threading.Lock()
+
+
+def get_glyph_metrics(font_name: Optional[str]) -> GlyphMetrics:
+    registry = get_font_registry()
+    key = registry.resolve(font_name)
+
+    metrics = _glyph_metrics.get(key)
+    if metrics is None:
+        with _glyph_metrics_lock:
+            metrics = _glyph_metrics.get(key)
+            if metrics is None:
+                metrics = _glyph_metrics[key] = GlyphMetrics(registry.get_font(font_name, REFERENCE_SIZE))
+    return metrics
+
+
+def wrap_words(words: List[str], widths: List[float], space: float, limit: float) -> List[str]:
+    # жадібне перенесення; задовге слово займає окремий рядок
+    lines, current, current_width = [], [], 0.0
+    for word, width in zip(words, widths):
+        if current and current_width + space + width > limit:
+            lines.append(" ".join(current))
+            current, current_width = [], 0.0
+        current_width += space + width if current else width
+        current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def get_text_extent(font_size: int, outline_width: Optional[int] = None, shadow: bool = False) -> int:
+    # на скільки пікселів обведення й тінь розширюють рамку гліфів по кожній осі
+    if outline_width is None:
+        outline_width = get_outline_width(font_size)
+    extent = 2 * max(outline_width, 0)
+    if shadow:
+        offset, sigma = get_shadow_params(font_size)
+        extent += offset + int(math.ceil(sigma * 3))
+    return extent
+
+
+def layout_text(text: str, metrics: GlyphMetrics, font_size: int, max_width: int,
+                max_height: int, max_lines: int, outline_width: Optional[int] = None,
+                shadow: bool = False) -> Tuple[List[str], bool]:
+    scale = font_size / REFERENCE_SIZE
+    outline = get_text_extent(font_size, outline_width, shadow)
+    # ширини рахуються в одиницях REFERENCE_SIZE, тож масштабується лише межа
+    limit = (max_width - outline) / scale
+
+    lines, fits = [], True
+    for paragraph in text.split("\n"):
+        words = paragraph.split()
+        widths = [metrics.word_width(word) for word in words]
+        fits = fits and all(width <= limit for width in widths)
+        lines += wrap_words(words, widths, metrics.space, limit) or [""]
+
+    height = (len(lines) - 1) * (metrics.line_pitch * scale + LINE_SPACING) + metrics.line_height * scale + outline
+    return lines, fits and len(lines) <= max_lines and height <= max_height
+
+
+def _measure_fits(text: str, font_name: str, font_size: int, max_width: int, max_height: int,
+                  outline_width: Optional[int] = None, shadow: bool = False) -> bool:
+    left, top, right, bottom = measure_text(text, get_font_registry().get_font(font_name, font_size))
+    outline = get_text_extent(font_size, outline_width, shadow)
+    return right - left + outline <= max_width and bottom - top + outline <= max_height
+
+
+@timed("text.fit")
+def fit_text(text: str, font_name: str, max_width: int, max_height: int, max_lines: int,
+             max_size: int, min_size: int = FIT_MIN_FONT_SIZE, outline_width: Optional[int] = None,
+             shadow: bool = False) -> Tuple[str, int]:
+    # найбільший розмір до max_size, за якого перенесений текст уміщується в рамку;
+    # бісекція йде за кешованими ширинами, а textbbox викликається лише для результату
+    metrics = get_glyph_metrics(font_name)
+    min_size = min(min_size, max_size)
+
+    best = None
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        lines, fits = layout_text(text, metrics, size, max_width, max_height, max_lines, outline_width, shadow)
+        if fits:
+            best = size, lines
+            low = size + 1
+        else:
+            high = size - 1
+
+    if best is None:
+        # не вміщується навіть найменший розмір: переносимо без обмеження рядків
+        lines, _ = layout_text(text, metrics, min_size, max_width, max_height, max_lines, outline_width, shadow)
+        return "\n".join(lines), min_size
+
+    # хінтинг і виступи гліфів за межі ширини можуть додати кілька пікселів
+    size, lines = best
+    while size > min_size and not _measure_fits("\n".join(lines), font_name, size, max_width, max_height,
+                                                outline_width, shadow):
+        size -= 1
+        lines, _ = layout_text(text, metrics, size, max_width, max_height, max_lines, outline_width, shadow)
+    return "\n".join(lines), size
+
+
+def fit_layer(layer: Dict, image_width: int, image_height: int) -> None:
+    # розміри зображення в повній роздільності: проксі масштабує вже підібраний шрифт
+    position = layer["position"]
+    margin = layer.get("margin", TEXT_MARGIN)
+    max_width = image_width - 2 * margin
+    max_height = int(image_height * FIT_BOX_HEIGHT[position]) - margin
+    max_lines = layer.get("max_lines") or FIT_MAX_LINES[position]
+    if max_width <= 0 or max_height <= 0:
+        return
+
+    # явне обведення шару й тінь займають місце в рамці так само, як гліфи
+    layer["text"], layer["font_size"] = fit_text(layer["text"], layer["font"], max_width, max_height,
+                                                 max_lines, layer["font_size"],
+                                                 outline_width=layer.get("outline_width"),
+                                                 shadow=layer.get("shadow", False))
@@ -0,0 +1,186 @@
+import math
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from typing import List, Optional, Tuple
+from utils import TextPosition
+
+
+TEXT_MARGIN = 10
+SHADOW_OPACITY = 0.6
+# відступ між рядками багаторядкового підпису, як у Pillow за замовчуванням
+LINE_SPACING = 4
+
+_measure_draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+
+class TextSprite:
+    def __init__(self, layers: List[Tuple[np.ndarray, Tuple[int, int, int]]], left: int, top: int,
+                 text_width: int, text_height: int, text_left: int = 0, text_top: int = 0):
+        # шари (маска покриття, колір BGR) однакового розміру, знизу вгору:
+        # тінь, обведення, заливка; left/top зсувають їх відносно точки малювання,
+        # text_left/text_top — зсув рамки самих гліфів від неї.
+        # шари зводяться один раз у колір, уже помножений на покриття, і спільне покриття,
+        # тож накладання спрайта — одне змішування без Pillow
+        self.premultiplied, self.coverage = flatten_layers(layers)
+        self.left = left
+        self.top = top
+        self.text_width = text_width
+        self.text_height = text_height
+        self.text_left = text_left
+        self.text_top = text_top
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        height, width = self.coverage.shape
+        return width, height
+
+    @property
+    def nbytes(self) -> int:
+        return self.premultiplied.nbytes + self.coverage.nbytes
+
+
+def flatten_layers(layers: List[Tuple[np.ndarray, Tuple[int, int, int]]]) -> Tuple[np.ndarray, np.ndarray]:
+    if not layers:
+        return np.zeros((0, 0, 3), np.uint8), np.zeros((0, 0), np.uint8)
+
+    shape = layers[0][0].shape
+    premultiplied = np.zeros(shape + (3,), np.float32)
+    coverage = np.zeros(shape, np.float32)
+    for mask, color in layers:
+        alpha = mask.astype(np.float32) / 255
+        transparency = 1 - alpha
+        premultiplied *= transparency[..., None]
+        premultiplied += alpha[..., None] * np.array(color, np.float32)
+        coverage *= transparency
+        coverage += alpha
+
+    premultiplied = np.rint(premultiplied).astype(np.uint8)
+    coverage = np.rint(coverage * 255).astype(np.uint8)
+    # спрайт може лежати в кеші й накладатися з кількох потоків
+    premultiplied.setflags(write=False)
+    coverage.setflags(write=False)
+    return premultiplied, coverage
+
+
+def measure_text(text: str, font: ImageFont.ImageFont) -> Tuple[int, int, int, int]:
+    # центровані рядки багаторядкового тексту дають дробові межі
+    left, top, right, bottom = _measure_draw.textbbox((0, 0), text, font=font, spacing=LINE_SPACING, align="center")
+    return math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+
+
+def render_text_mask(text: str, font: ImageFont.ImageFont) -> Tuple[np.ndarray, int, int]:
+    left, top, right, bottom = measure_text(text, font)
+    width = max(right - left, 0)
+    height = max(bottom - top, 0)
+
+    canvas = Image.new("L", (width, height), 0)
+    if width and height:
+        ImageDraw.Draw(canvas).text((-left, -top), text, font=font, fill=255, spacing=LINE_SPACING, align="center")
+
+    return np.array(canvas), left, top
+
+
+def get_outline_width(font_size: int) -> int:
+    return max(2, font_size // 30)
+
+
+def get_shadow_params(font_size: int) -> Tuple[int, float]:
+    # зсув тіні вправо-вниз і розмиття; тінь виходить за обведення на зсув плюс 3 сигми
+    return max(2, font_size // 20), max(1.0, font_size / 40)
+
+
+def dilate_mask(mask: np.ndarray, radius: int) -> np.ndarray:
+    if radius <= 0:
+        return mask.copy()
+
+    # відстань до найближчого пікселя гліфа замість radius окремих зсувів:
+    # обведення рівне й без розривів за будь-якого розміру шрифту
+    _, outside = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY_INV)
+    distance = cv2.distanceTransform(outside, cv2.DIST_L2, 5)
+    np.subtract(radius + 0.5, distance, out=distance)
+    np.clip(distance, 0, 1, out=distance)
+    distance *= 255
+    return cv2.max(distance.astype(np.uint8), mask)
+
+
+def build_text_sprite(text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int],
+                      outline_width: int, outline_color: Tuple[int, int, int] = (0, 0, 0),
+                      shadow: bool = False, shadow_color: Tuple[int, int, int] = (0, 0, 0)) -> TextSprite:
+    glyphs, left, top = render_text_mask(text, font)
+    text_height, text_width = glyphs.shape
+
+    outline_width = max(outline_width, 0)
+    font_size = getattr(font, "size", 0)
+    shadow_offset, shadow_sigma = get_shadow_params(font_size) if shadow else (0, 0)
+    shadow_reach = shadow_offset + int(np.ceil(shadow_sigma * 3))
+    pad = outline_width + 1 + shadow_reach
+
+    mask = cv2.copyMakeBorder(glyphs, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=0)
+    layers = []
+
+    outline = dilate_mask(mask, outline_width) if outline_width else mask
+
+    if shadow:
+        shadow_mask = np.zeros_like(outline)
+        shadow_mask[shadow_offset:, shadow_offset:] = outline[:-shadow_offset, :-shadow_offset]
+        shadow_mask = cv2.GaussianBlur(shadow_mask, (0, 0), shadow_sigma)
+        shadow_mask = cv2.convertScaleAbs(shadow_mask, alpha=SHADOW_OPACITY)
+        layers.append((shadow_mask, tuple(shadow_color[::-1])))
+
+    if outline_width:
+        layers.append((outline, tuple(outline_color[::-1])))
+
+    layers.append((mask, tuple(color[::-1])))
+
+    return TextSprite(layers, left - pad, top - pad, text_width, text_height, left, top)
+
+
+def get_text_origin(image_width: int, image_height: int, sprite: TextSprite,
+                    position: TextPosition, margin: int = TEXT_MARGIN) -> Tuple[int, int]:
+    # вирівнюється рамка гліфів, а не точка малювання: інакше верхній виступ шрифту
+    # зсував нижній підпис за край зображення
+    x = (image_width - sprite.text_width) // 2 - sprite.text_left
+
+    if position == TextPosition.TOP:
+        y = margin
+    elif position == TextPosition.BOTTOM:
+        y = image_height - sprite.text_height - margin
+    else:
+        y = (image_height - sprite.text_height) // 2
+
+    return x, y - sprite.text_top
+
+
+def _clip_rect(x: int, y: int, width: int, height: int, image_width: int,
+               image_height: int) -> Optional[Tuple[int, int, int, int]]:
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, image_width), min(y + height, image_height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def get_sprite_rect(image: np.ndarray, sprite: TextSprite, x: int, y: int) -> Optional[Tuple[int, int, int, int]]:
+    image_height, image_width = image.shape[:2]
+    sprite_width, sprite_height = sprite.size
+    return _clip_rect(x + sprite.left, y + sprite.top, sprite_width, sprite_height, image_width, image_height)
+
+
+def composite_sprite(image: np.ndarray, sprite: TextSprite, x: int, y: int) -> Optional[Tuple[int, int, int, int]]:
+    sprite_x, sprite_y = x + sprite.left, y + sprite.top
+    dirty = get_sprite_rect(image, sprite, x, y)
+    if dirty is None:
+        return None
+
+    x0, y0, x1, y1 = dirty
+    roi = image[y0:y1, x0:x1]
+    rows = slice(y0 - sprite_y, y1 - sprite_y)
+    cols = slice(x0 - sprite_x, x1 - sprite_x)
+
+    # roi = спрайт + roi * (1 - покриття), на місці в самому кадрі
+    transparency = cv2.bitwise_not(sprite.coverage[rows, cols])
+    cv2.multiply(roi, cv2.merge([transparency] * 3), dst=roi, scale=1 / 255)
+    cv2.add(roi, sprite.premultiplied[rows, cols], dst=roi)
+    return dirty
@@ -0,0 +1,234 @@
+import argparse
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from filters import FilterSpec, FilterPipeline, ImageFilter, EdgesFilter
+from render_engine import get_spec_layers, draw_layers, NO_FILTER
+
+
+DEFAULT_TILE_SIZE = 1024
+
+
+def create_npy(npy_path: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.memmap:
+    return np.lib.format.open_memmap(npy_path, mode="w+", dtype=dtype, shape=shape)
+
+
+def open_npy(npy_path: str, writable: bool = False) -> np.memmap:
+    return np.load(npy_path, mmap_mode="r+" if writable else "r")
+
+
+def decode_to_npy(image_path: str, npy_path: str) -> np.memmap:
+    # декодер потребує цілого кадру один раз; далі кадр живе лише у файлі
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"не вдалося завантажити зображення: {image_path}")
+
+    buffer = create_npy(npy_path, image.shape)
+    buffer[:] = image
+    buffer.flush()
+    del image
+    return buffer
+
+
+def release_pages(buffers: Tuple[np.ndarray, ...]) -> None:
+    # сторінки memmap лишаються в кеші ОС, але перестають рахуватись у пам'ять процесу
+    for buffer in buffers:
+        mapping = getattr(buffer, "_mmap", None)
+        if mapping is not None and hasattr(mmap, "MADV_DONTNEED"):
+            mapping.madvise(mmap.MADV_DONTNEED)
+
+
+def iter_tiles(height: int, width: int, tile_size: int) -> Iterator[Tuple[int, int, int, int]]:
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield y0, min(y0 + tile_size, height), x0, min(x0 + tile_size, width)
+
+
+def iter_halo_tiles(height: int, width: int, tile_size: int, halo: int,
+                    buffers: Tuple[np.ndarray, ...] = ()) -> Iterator[Tuple[Tuple[int, int, int, int],
+                                                                          Tuple[slice, slice],
+                                                                          Tuple[slice, slice]]]:
+    # (прямокутник з ореолом, зрізи ореолу в кадрі, зрізи ядра всередині фрагмента);
+    # після кожного ряду тайлів сторінки buffers звільняються
+    for y0, y1, x0, x1 in iter_tiles(height, width, tile_size):
+        if x0 == 0 and y0 > 0:
+            release_pages(buffers)
+        yield get_halo_tile(height, width, (y0, y1, x0, x1), halo)
+    release_pages(buffers)
+
+
+def get_halo_tile(height: int, width: int, tile: Tuple[int, int, int, int],
+                  halo: int) -> Tuple[Tuple[int, int, int, int], Tuple[slice, slice], Tuple[slice, slice]]:
+    y0, y1, x0, x1 = tile
+    hy0, hx0 = max(0, y0 - halo), max(0, x0 - halo)
+    hy1, hx1 = min(height, y1 + halo), min(width, x1 + halo)
+    return ((hx0, hy0, hx1, hy1),
+            (slice(hy0, hy1), slice(hx0, hx1)),
+            (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0)))
+
+
+def _apply_local(src: np.ndarray, dst: np.ndarray, image_filter: ImageFilter, tile_size: int,
+                 temp_dir: str) -> None:
+    height, width = src.shape[:2]
+
+    for (x0, y0, _, _), region, core in iter_halo_tiles(height, width, tile_size, image_filter.halo,
+                                                        (src, dst)):
+        tile = np.ascontiguousarray(src[region])
+        result = image_filter.apply_region(tile, (x0, y0), (width, height))
+        dst[region][core] = result[core]
+
+
+def _apply_edges(src: np.ndarray, dst: np.ndarray, edges_filter: EdgesFilter, tile_size: int,
+                 temp_dir: str) -> None:
+    # Canny(low, high) — це 8-зв'язні компоненти Canny(low, low), які містять
+    # хоч один піксель Canny(high, high). Обидві карти локальні й рахуються по тайлах,
+    # а гістерезис поширюється між тайлами, доки карта країв не перестане змінюватись
+    height, width = src.shape[:2]
+    candidates = create_npy(os.path.join(temp_dir, "edges_candidates.npy"), (height, width))
+    edges = create_npy(os.path.join(temp_dir, "edges.npy"), (height, width))
+    low, high = edges_filter.low_threshold, edges_filter.high_threshold
+
+    for _, region, core in iter_halo_tiles(height, width, tile_size, edges_filter.halo,
+                                           (src, candidates, edges)):
+        gray = cv2.cvtColor(np.ascontiguousarray(src[region]), cv2.COLOR_BGR2GRAY)
+        candidates[region][core] = cv2.Canny(gray, low, low)[core]
+        edges[region][core] = cv2.Canny(gray, high, high)[core]
+
+    # тайл переглядається знову лише тоді, коли змінився хтось із сусідів
+    rows, columns = -(-height // tile_size), -(-width // tile_size)
+    pending = {(row, column) for row in range(rows) for column in range(columns)}
+    while pending:
+        changed = set()
+        last_row = None
+        for row, column in sorted(pending):
+            if row != last_row:
+                release_pages((candidates, edges))
+                last_row = row
+            y0, x0 = row * tile_size, column * tile_size
+            tile = (y0, min(y0 + tile_size, height), x0, min(x0 + tile_size, width))
+            _, region, core = get_halo_tile(height, width, tile, 1)
+
+            count, labels = cv2.connectedComponents(np.ascontiguousarray(candidates[region]), connectivity=8)
+            connected = np.zeros(count, dtype=bool)
+            connected[labels[edges[region] > 0]] = True
+            connected[0] = False
+
+            grown = connected[labels[core]]
+            current = edges[region][core]
+            if (grown != (current > 0)).any():
+                current[...] = np.where(grown, 255, 0)
+                changed.add((row, column))
+
+        pending = {(row + dy, column + dx) for row, column in changed for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                   if 0 <= row + dy < rows and 0 <= column + dx < columns and (dy or dx)}
+        release_pages((candidates, edges))
+
+    for _, region, core in iter_halo_tiles(height, width, tile_size, 0, (edges, dst)):
+        dst[region] = cv2.cvtColor(np.ascontiguousarray(edges[region]), cv2.COLOR_GRAY2BGR)
+
+
+# фільтри, яким не досить локального ореолу, мають власну тайлову реалізацію
+TILED_FILTERS: Dict[type, Callable[..., None]] = {
+    EdgesFilter: _apply_edges,
+}
+
+
+def apply_filter_tiled(src: np.ndarray, dst: np.ndarray, image_filter: ImageFilter,
+                       tile_size: int = DEFAULT_TILE_SIZE, temp_dir: Optional[str] = None) -> None:
+    tiled = TILED_FILTERS.get(type(image_filter), _apply_local)
+    tiled(src, dst, image_filter, tile_size, temp_dir or tempfile.gettempdir())
+
+
+def apply_filters_tiled(src: np.ndarray, filters: List[FilterSpec], dst_path: str,
+                        tile_size: int = DEFAULT_TILE_SIZE, scale: float = 1.0) -> np.memmap:
+    steps = FilterPipeline(filters, scale=scale).steps
+    temp_dir = tempfile.mkdtemp(prefix="meme_tiles_", dir=os.path.dirname(os.path.abspath(dst_path)))
+
+    try:
+        current = src
+        # кожен крок читає попередній буфер і пише наступний, у пам'яті лише тайли
+        for index, step in enumerate(steps):
+            is_last = index == len(steps) - 1
+            step_path = dst_path if is_last else os.path.join(temp_dir, f"step_{index}.npy")
+
+            output = create_npy(step_path, src.shape)
+            apply_filter_tiled(current, output, step, tile_size, temp_dir)
+            output.flush()
+            current = output
+
+        if not steps:
+            current = create_npy(dst_path, src.shape)
+            for _, region, _ in iter_halo_tiles(src.shape[0], src.shape[1], tile_size, 0, (src, current)):
+                current[region] = src[region]
+            current.flush()
+
+        return current
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def render_tiled(image_path: str, output_path: str, filters: List[FilterSpec], spec: Optional[Dict] = None,
+                 tile_size: int = DEFAULT_TILE_SIZE, keep_npy: bool = False) -> np.memmap:
+    base_path = os.path.splitext(output_path)[0]
+    source_path = base_path + ".source.npy"
+    result_path = base_path + ".npy"
+
+    if image_path.lower().endswith(".npy"):
+        source = open_npy(image_path)
+    else:
+        source = decode_to_npy(image_path, source_path)
+
+    try:
+        result = apply_filters_tiled(source, filters, result_path, tile_size)
+
+        # текст малюється лише в прямокутниках спрайтів, тож memmap годиться як є
+        layers = get_spec_layers(spec or {}, (result.shape[1], result.shape[0]))
+        if layers:
+            draw_layers(result, layers)
+            result.flush()
+
+        if not output_path.lower().endswith(".npy") and not cv2.imwrite(output_path, result):
+            raise ValueError(f"не вдалося зберегти {output_path}")
+        return result
+    finally:
+        del source
+        if not keep_npy and os.path.exists(source_path):
+            os.remove(source_path)
+        if not keep_npy and not output_path.lower().endswith(".npy") and os.path.exists(result_path):
+            os.remove(result_path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Фільтри для дуже великих зображень по тайлах через memmap")
+    parser.add_argument("image", help="вхідне зображення або .npy")
+    parser.add_argument("output", help="вихідне зображення або .npy")
+    parser.add_argument("--filter", action="append", default=[], dest="filters",
+                        help="фільтр (можна повторювати для ланцюжка)")
+    parser.add_argument("--text", action="append", default=[], dest="texts", help="текст мему")
+    parser.add_argument("--font-size", type=int, default=None)
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--keep-npy", action="store_true", help="не видаляти проміжні .npy буфери")
+    args = parser.parse_args(argv)
+
+    spec = {"texts": args.texts}
+    if args.font_size:
+        spec["font_size"] = args.font_size
+
+    filters = [f for f in args.filters if f != NO_FILTER]
+    try:
+        render_tiled(args.image, args.output, filters, spec, args.tile_size, args.keep_npy)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"помилка: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
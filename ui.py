@@ -4,13 +4,35 @@ from typing import Dict, Tuple, List, Optional
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QPushButton, QLabel, QLineEdit, QComboBox, QFileDialog,
                             QScrollArea, QGroupBox, QRadioButton, QSlider, QColorDialog,
-                            QMessageBox, QTabWidget, QSplitter, QFrame)
-from PyQt5.QtGui import QPixmap, QImage, QFont, QColor
-from PyQt5.QtCore import Qt, QSize
+                            QMessageBox, QTabWidget, QSplitter, QFrame, QProgressBar, QShortcut, QCheckBox)
+from PyQt5.QtGui import QFont, QColor, QKeySequence
+from PyQt5.QtCore import Qt, QSize, QTimer
 
 from image_processor import ImageProcessor
 from meme_generator import MemeGenerator
-from utils import TextPosition, MEME_COLORS, DEFAULT_FONTS, COLOR_PRIMARY, COLOR_SECONDARY, COLOR_ACCENT
+from metrics import span
+from filters import get_filter_names
+from render_engine import NO_FILTER
+from animation import ANIMATED_OUTPUTS, is_animation
+from preview_canvas import PreviewCanvas
+from render_worker import (BackgroundWorker, load_preview_source, render_preview, save_full_image, save_animation,
+                           to_preview)
+from utils import TextPosition, MEME_COLORS, DEFAULT_FONTS, COLOR_PRIMARY, COLOR_SECONDARY, COLOR_ACCENT, get_file_extension
+
+
+PREVIEW_WIDTH = 800
+PREVIEW_HEIGHT = 600
+# зміни тексту, шрифту й кольору частіше за цей інтервал зливаються в один рендер
+PREVIEW_DEBOUNCE_MS = 80
+
+
+# перетворення кольорів Qt живуть тут, щоб ядро рендерингу імпортувалося без PyQt5
+def rgb_to_qcolor(rgb: Tuple[int, int, int]) -> QColor:
+    return QColor(rgb[0], rgb[1], rgb[2])
+
+
+def qcolor_to_rgb(qcolor: QColor) -> Tuple[int, int, int]:
+    return (qcolor.red(), qcolor.green(), qcolor.blue())
 
 
 class MemeGeneratorUI(QMainWindow):
@@ -18,7 +40,30 @@ class MemeGeneratorUI(QMainWindow):
         super().__init__()
         
         self.image_processor = ImageProcessor()
+        self.image_processor.enable_proxy(PREVIEW_WIDTH, PREVIEW_HEIGHT)
         self.meme_generator = MemeGenerator(self.image_processor)
+        self.active_filter = NO_FILTER
+        # наступний готовий перегляд потрапить в історію змін
+        self.commit_pending = False
+        
+        # завантаження, попередній перегляд і збереження виконуються поза потоком GUI
+        self.loader = BackgroundWorker(self)
+        self.loader.finished.connect(self.on_image_loaded)
+        self.loader.failed.connect(self.on_image_load_failed)
+        
+        self.renderer = BackgroundWorker(self)
+        self.renderer.finished.connect(self.on_preview_rendered)
+        self.renderer.failed.connect(self.on_preview_failed)
+        
+        # збереження не скасовують одне одного: кожен файл пишеться і про кожен є звіт
+        self.saver = BackgroundWorker(self, drop_stale=False)
+        self.saver.finished.connect(self.on_image_saved)
+        self.saver.failed.connect(self.on_image_save_failed)
+        
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.render_preview_now)
         
         self.setWindowTitle("Генератор мемів")
         self.setGeometry(100, 100, 1000, 700)
@@ -62,6 +107,9 @@ class MemeGeneratorUI(QMainWindow):
         """)
         
         self.init_ui()
+        
+        for worker in (self.loader, self.renderer, self.saver):
+            worker.busy_changed.connect(self.update_busy_indicator)
     
     def init_ui(self):
         main_widget = QWidget()
@@ -85,6 +133,7 @@ class MemeGeneratorUI(QMainWindow):
         top_text_layout = QVBoxLayout()
         self.top_text_input = QLineEdit()
         self.top_text_input.setPlaceholderText("Введіть верхній текст")
+        self.top_text_input.textChanged.connect(self.schedule_preview)
         top_text_layout.addWidget(self.top_text_input)
         top_text_group.setLayout(top_text_layout)
         text_layout.addWidget(top_text_group)
@@ -93,6 +142,7 @@ class MemeGeneratorUI(QMainWindow):
         bottom_text_layout = QVBoxLayout()
         self.bottom_text_input = QLineEdit()
         self.bottom_text_input.setPlaceholderText("Введіть нижній текст")
+        self.bottom_text_input.textChanged.connect(self.schedule_preview)
         bottom_text_layout.addWidget(self.bottom_text_input)
         bottom_text_group.setLayout(bottom_text_layout)
         text_layout.addWidget(bottom_text_group)
@@ -103,6 +153,7 @@ class MemeGeneratorUI(QMainWindow):
         font_label = QLabel("Шрифт:")
         self.font_combo = QComboBox()
         self.font_combo.addItems(DEFAULT_FONTS)
+        self.font_combo.currentTextChanged.connect(self.schedule_preview)
         
         size_label = QLabel("Розмір шрифту:")
         self.font_size_slider = QSlider(Qt.Horizontal)
@@ -113,11 +164,18 @@ class MemeGeneratorUI(QMainWindow):
         self.font_size_slider.valueChanged.connect(
             lambda value: self.font_size_label.setText(str(value))
         )
+        self.font_size_slider.valueChanged.connect(self.schedule_preview)
+        
+        # розмір зі слайдера стає найбільшим, текст переноситься й зменшується під зображення
+        self.fit_checkbox = QCheckBox("Вмістити текст у зображення")
+        self.fit_checkbox.setChecked(True)
+        self.fit_checkbox.toggled.connect(self.schedule_preview)
         
         color_label = QLabel("Колір:")
         self.color_combo = QComboBox()
         for color_name in MEME_COLORS.keys():
             self.color_combo.addItem(color_name)
+        self.color_combo.currentTextChanged.connect(self.schedule_preview)
         
         custom_color_btn = QPushButton("Користувацький колір")
         custom_color_btn.clicked.connect(self.choose_custom_color)
@@ -128,6 +186,7 @@ class MemeGeneratorUI(QMainWindow):
         font_layout.addWidget(size_label)
         font_layout.addWidget(self.font_size_slider)
         font_layout.addWidget(self.font_size_label)
+        font_layout.addWidget(self.fit_checkbox)
         font_layout.addWidget(color_label)
         font_layout.addWidget(self.color_combo)
         font_layout.addWidget(custom_color_btn)
@@ -148,10 +207,7 @@ class MemeGeneratorUI(QMainWindow):
         filters_group_layout = QVBoxLayout()
         
         self.filters_combo = QComboBox()
-        self.filters_combo.addItems([
-            "Оригінал", "Чорно-білий", "Розмиття", "Різкість", 
-            "Сепія", "Виділення країв", "Негатив", "Вінтаж"
-        ])
+        self.filters_combo.addItems([NO_FILTER] + get_filter_names())
         
         apply_filter_btn = QPushButton("Застосувати фільтр")
         apply_filter_btn.clicked.connect(self.apply_filter)
@@ -179,6 +235,21 @@ class MemeGeneratorUI(QMainWindow):
         
         left_layout.addLayout(nav_buttons_layout)
         
+        history_layout = QHBoxLayout()
+        
+        self.undo_btn = QPushButton("Скасувати")
+        self.undo_btn.clicked.connect(self.undo)
+        history_layout.addWidget(self.undo_btn)
+        
+        self.redo_btn = QPushButton("Повторити")
+        self.redo_btn.clicked.connect(self.redo)
+        history_layout.addWidget(self.redo_btn)
+        
+        QShortcut(QKeySequence.Undo, self, activated=self.undo)
+        QShortcut(QKeySequence.Redo, self, activated=self.redo)
+        
+        left_layout.addLayout(history_layout)
+        
         buttons_layout = QHBoxLayout()
         
         self.reset_btn = QPushButton("Скинути")
@@ -198,7 +269,7 @@ class MemeGeneratorUI(QMainWindow):
         preview_label = QLabel("Попередній перегляд:")
         right_layout.addWidget(preview_label)
         
-        self.image_label = QLabel()
+        self.image_label = PreviewCanvas()
         self.image_label.setAlignment(Qt.AlignCenter)
         self.image_label.setMinimumSize(400, 400)
         self.image_label.setStyleSheet("border: 2px dashed #888888;")
@@ -218,31 +289,137 @@ class MemeGeneratorUI(QMainWindow):
         main_layout.addWidget(splitter)
         main_widget.setLayout(main_layout)
         self.setCentralWidget(main_widget)
+        
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setMaximumWidth(150)
+        self.busy_bar.hide()
+        self.statusBar().addPermanentWidget(self.busy_bar)
+    
+    def update_busy_indicator(self):
+        busy = self.loader.busy or self.renderer.busy or self.saver.busy
+        self.busy_bar.setVisible(busy)
+        self.statusBar().showMessage("Обробка..." if busy else "")
     
     def load_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Відкрити зображення", "", "Image Files (*.png *.jpg *.jpeg *.bmp)"
+            self, "Відкрити зображення", "", "Image Files (*.png *.jpg *.jpeg *.bmp *.gif *.webp *.mp4)"
         )
         
         if file_path:
-            if self.image_processor.load_image(file_path):
-                self.update_preview()
-                print(f"Зображення успішно завантажено: {file_path}")
-            else:
-                QMessageBox.critical(self, "Помилка", "Не вдалося завантажити зображення")
+            # результат рендерингу старого зображення вже не потрібен
+            self.preview_timer.stop()
+            self.renderer.cancel()
+            self.loader.submit(load_preview_source, file_path, self.image_processor.proxy_size)
+    
+    def on_image_loaded(self, result):
+        source, preview = result
+        self.image_processor.set_source(source, preview)
+        self.render_preview_now()
+    
+    def on_image_load_failed(self, message: str):
+        QMessageBox.critical(self, "Помилка", "Не вдалося завантажити зображення")
+    
+    def get_preview_spec(self) -> Dict:
+        font = self.font_combo.currentText()
+        font_size = self.font_size_slider.value()
+        color = self.get_selected_color()
+        fit = self.fit_checkbox.isChecked()
+        
+        layers = []
+        for text, position in ((self.top_text_input.text(), TextPosition.TOP),
+                               (self.bottom_text_input.text(), TextPosition.BOTTOM)):
+            if text:
+                layers.append({"text": text, "position": position, "font": font,
+                               "font_size": font_size, "color": color, "fit": fit})
+        
+        filters = [self.active_filter] if self.active_filter != NO_FILTER else []
+        return {"filters": filters, "layers": layers}
+    
+    def schedule_preview(self, *args):
+        if self.image_processor.original_image is not None:
+            self.preview_timer.start()
+    
+    def render_preview_now(self):
+        self.preview_timer.stop()
+        # поки йде завантаження, рендер запуститься після нього
+        if self.image_processor.original_image is None or self.loader.busy:
+            return
+        
+        self.renderer.submit(render_preview, self.image_processor.document, self.get_preview_spec(),
+                             PREVIEW_WIDTH, PREVIEW_HEIGHT)
+    
+    def on_preview_rendered(self, result):
+        spec, image, preview, cost_ms = result
+        self.image_processor.set_rendered(spec, image, record=self.commit_pending, cost_ms=cost_ms)
+        self.commit_pending = False
+        self.show_preview(preview)
+    
+    def set_panel_from_spec(self, spec: Dict):
+        widgets = (self.top_text_input, self.bottom_text_input, self.font_combo,
+                   self.font_size_slider, self.fit_checkbox, self.color_combo)
+        for widget in widgets:
+            widget.blockSignals(True)
+        
+        filters = spec.get("filters") or [NO_FILTER]
+        self.active_filter = filters[0]
+        self.filters_combo.setCurrentText(self.active_filter)
+        
+        texts = {TextPosition.TOP: "", TextPosition.BOTTOM: ""}
+        for layer in spec.get("layers", []):
+            texts[layer["position"]] = layer["text"]
+            self.font_combo.setCurrentText(layer["font"])
+            self.font_size_slider.setValue(layer["font_size"])
+            self.font_size_label.setText(str(layer["font_size"]))
+            self.fit_checkbox.setChecked(layer.get("fit", False))
+            
+            color_name = next((name for name, rgb in MEME_COLORS.items() if rgb == layer["color"]), None)
+            if color_name is None:
+                self.custom_color = rgb_to_qcolor(layer["color"])
+                color_name = "Користувацький"
+                if self.color_combo.findText(color_name) == -1:
+                    self.color_combo.addItem(color_name)
+            self.color_combo.setCurrentText(color_name)
+        
+        self.top_text_input.setText(texts[TextPosition.TOP])
+        self.bottom_text_input.setText(texts[TextPosition.BOTTOM])
+        
+        for widget in widgets:
+            widget.blockSignals(False)
+    
+    def undo(self):
+        self.restore_history_step(self.image_processor.undo)
+    
+    def redo(self):
+        self.restore_history_step(self.image_processor.redo)
+    
+    def restore_history_step(self, step):
+        if self.image_processor.image is None:
+            return
+        
+        self.preview_timer.stop()
+        self.renderer.cancel()
+        self.commit_pending = False
+        
+        if step():
+            operations = self.image_processor.operations
+            self.set_panel_from_spec(operations[-1] if operations else {})
+            self.update_preview()
+    
+    def on_preview_failed(self, message: str):
+        print(f"Помилка оновлення попереднього перегляду: {message}")
+        self.statusBar().showMessage(f"Помилка рендерингу: {message}")
+    
+    def show_preview(self, image):
+        # image — BGR розміру перегляду; перемальовується лише змінена область
+        with span("preview.show"):
+            self.image_label.show_image(image)
+        self.image_label.setMinimumSize(1, 1)
     
     def update_preview(self):
         if self.image_processor.image is not None:
             try:
-                rgb_image = self.image_processor.resize_image(800, 600)
-                
-                h, w, ch = rgb_image.shape
-                q_img = QImage(rgb_image.data, w, h, ch * w, QImage.Format_RGB888)
-                
-                pixmap = QPixmap.fromImage(q_img)
-                self.image_label.setPixmap(pixmap)
-                self.image_label.setMinimumSize(1, 1)
-                print("Попередній перегляд оновлено")
+                self.show_preview(to_preview(self.image_processor.image, PREVIEW_WIDTH, PREVIEW_HEIGHT))
             except Exception as e:
                 print(f"Помилка оновлення попереднього перегляду: {e}")
                 QMessageBox.critical(self, "Помилка", f"Помилка оновлення попереднього перегляду: {e}")
@@ -253,7 +430,7 @@ class MemeGeneratorUI(QMainWindow):
         if color_name in MEME_COLORS:
             return MEME_COLORS[color_name]
         
-        return (self.custom_color.red(), self.custom_color.green(), self.custom_color.blue())
+        return qcolor_to_rgb(self.custom_color)
     
     def choose_custom_color(self):
         color = QColorDialog.getColor(initial=self.custom_color, parent=self)
@@ -267,6 +444,8 @@ class MemeGeneratorUI(QMainWindow):
                 self.color_combo.setCurrentIndex(self.color_combo.count() - 1)
             else:
                 self.color_combo.setCurrentIndex(custom_index)
+            
+            self.schedule_preview()
     
     def add_text(self):
         if self.image_processor.image is None:
@@ -280,48 +459,32 @@ class MemeGeneratorUI(QMainWindow):
             QMessageBox.warning(self, "Попередження", "Введіть текст для додавання")
             return
         
-        self.image_processor.reset_image()
-        
-        font = self.font_combo.currentText()
-        font_size = self.font_size_slider.value()
-        color = self.get_selected_color()
-        
-        self.meme_generator.add_caption(
-            top_text=top_text,
-            bottom_text=bottom_text,
-            font_path=font,
-            font_size=font_size,
-            color=color
-        )
-        
-        self.update_preview()
+        self.commit_pending = True
+        self.render_preview_now()
     
     def apply_filter(self):
         if self.image_processor.image is None:
             QMessageBox.warning(self, "Попередження", "Спочатку завантажте зображення")
             return
         
-        filter_name = self.filters_combo.currentText()
-        print(f"Застосовую фільтр: {filter_name}")
-        
-        self.image_processor.reset_image()
-        
-        if filter_name != "Оригінал":
-            success = self.image_processor.apply_filter(filter_name)
-            if success:
-                print(f"Фільтр {filter_name} успішно застосовано")
-            else:
-                print(f"Помилка застосування фільтру {filter_name}")
-                QMessageBox.warning(self, "Помилка", f"Не вдалося застосувати фільтр {filter_name}")
-                return
-        
-        self.update_preview()
+        self.active_filter = self.filters_combo.currentText()
+        self.commit_pending = True
+        self.render_preview_now()
     
     def reset_image(self):
         if self.image_processor.image is not None:
+            self.preview_timer.stop()
+            self.renderer.cancel()
+            self.commit_pending = False
+            self.active_filter = NO_FILTER
+            
+            for text_input in (self.top_text_input, self.bottom_text_input):
+                text_input.blockSignals(True)
+                text_input.clear()
+                text_input.blockSignals(False)
+            
             self.image_processor.reset_image()
             self.update_preview()
-            print("Зображення скинуто до оригінального")
     
     def save_image(self):
         if self.image_processor.image is None:
@@ -329,13 +492,22 @@ class MemeGeneratorUI(QMainWindow):
             return
         
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "Зберегти зображення", "", "PNG (*.png);;JPEG (*.jpg *.jpeg);;All Files (*)"
+            self, "Зберегти зображення", "",
+            "PNG (*.png);;JPEG (*.jpg *.jpeg);;WebP (*.webp);;GIF (*.gif);;MP4 (*.mp4);;All Files (*)"
         )
         
         if file_path:
-            if self.image_processor.save_image(file_path):
-                QMessageBox.information(self, "Успіх", "Зображення успішно збережено")
-                print(f"Зображення збережено: {file_path}")
-            else:
-                QMessageBox.critical(self, "Помилка", "Не вдалося зберегти зображення")
-                print(f"Помилка збереження зображення: {file_path}") 
\ No newline at end of file
+            # зберігаємо те, що зараз вибрано в панелі, навіть якщо перегляд ще не встиг оновитись
+            source_path = self.image_processor.source.image_path
+            if source_path and is_animation(source_path) and get_file_extension(file_path) in ANIMATED_OUTPUTS:
+                self.saver.submit(save_animation, source_path, self.get_preview_spec(), file_path)
+                return
+            operations = [self.get_preview_spec()]
+            self.saver.submit(save_full_image, self.image_processor.source, operations, file_path)
+    
+    def on_image_saved(self, file_path: str):
+        QMessageBox.information(self, "Успіх", f"Зображення успішно збережено: {file_path}")
+    
+    def on_image_save_failed(self, message: str):
+        QMessageBox.critical(self, "Помилка", f"Не вдалося зберегти зображення:\n{message}")
+        print(f"Помилка збереження зображення: {message}") 
\ No newline at end of file
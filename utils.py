@@ -1,7 +1,6 @@
 import os
 from enum import Enum
-from typing import Tuple
-from PyQt5.QtGui import QColor
+from typing import List, Tuple
 
 
 class TextPosition(Enum):
@@ -49,12 +48,33 @@ MEME_TEMPLATES = {
 }
 
 
-def rgb_to_qcolor(rgb: Tuple[int, int, int]) -> QColor:
-    return QColor(rgb[0], rgb[1], rgb[2])
+def parse_color(value) -> Tuple[int, int, int]:
+    if isinstance(value, str):
+        if value in MEME_COLORS:
+            return MEME_COLORS[value]
+        hex_value = value.lstrip("#")
+        if len(hex_value) != 6:
+            raise ValueError(f"невідомий колір: {value}")
+        return tuple(int(hex_value[i:i + 2], 16) for i in (0, 2, 4))
 
+    if len(value) != 3:
+        raise ValueError(f"невідомий колір: {value}")
+    return tuple(int(channel) for channel in value)
 
-def qcolor_to_rgb(qcolor: QColor) -> Tuple[int, int, int]:
-    return (qcolor.red(), qcolor.green(), qcolor.blue())
+
+def parse_position(value) -> TextPosition:
+    if isinstance(value, TextPosition):
+        return value
+    return TextPosition[str(value).upper()]
+
+
+def get_default_positions(count: int) -> List[TextPosition]:
+    if count == 0:
+        return []
+    if count == 1:
+        return [TextPosition.BOTTOM]
+    
+    return [TextPosition.TOP] + [TextPosition.MIDDLE] * (count - 2) + [TextPosition.BOTTOM]
 
 
 def get_file_extension(filename: str) -> str: